@@ -1,162 +1,66 @@
-from csv import DictReader
-from datetime import datetime
-import logging
+import os
 from pathlib import Path
-import pickle
-from pprint import pprint
-import sys
-from time import sleep
 
 import click
-import requests
 from rich.console import Console
-from rich.logging import RichHandler
-from rich.prompt import Confirm, Prompt
 from rich.progress import Progress, BarColumn
-from rich.status import Status
-from tabulate import tabulate
-
-from MapItFastLib.Projects import Project
-from MapItFastLib.Points import Points
-
-
-def main():
+from rich.table import Table
+
+from MapItFastLib import Utils
+from MapItFastLib.Backup import BackupArchive
+
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+
+
+@click.command("BackupDataPoints", context_settings=CONTEXT_SETTINGS,
+               help=f"Back up the points of every project to an append-only archive")
+@click.option("--username", default=lambda: os.environ.get("AGTERRAUSER", ""))
+@click.option("--password", hide_input=True, default=lambda: os.environ.get("AGTERRAPASS", ""), show_default=False)
+@click.option("--cache-path", type=click.Path(exists=False, file_okay=False, dir_okay=True, writable=True,
+                                              readable=True, resolve_path=True), callback=Utils.validate_cache_folder,
+              default="/tmp/agterra/cache/")
+@click.option("--backup-path", type=click.Path(file_okay=False, dir_okay=True, writable=True, resolve_path=True),
+              default="/tmp/agterra/backup/", show_default=True, help="Folder holding the archive and its manifest")
+@click.option("--run-id", default=None,
+              help="Name of this backup run, today's date by default. Re-using one resumes that run")
+@click.option("--full", is_flag=True, default=False,
+              help="Back up every project, not only the ones whose LastChildUpdate moved")
+@click.option("--max-workers", type=click.INT, default=8, show_default=True,
+              help="Projects to download at the same time")
+def main(username, password, cache_path, backup_path, run_id, full, max_workers):
     """
-    Get last changed time for projects
-
-    - Check if Pickle exists
-    - - If not, get projects and save to Pickle
-    - Determine if Projects hold a 'last modified' time
-    - - If not, get points, sort them by last modified time, check for the newest point
-    - Check if the project has been modified in the last 6 months
+    Nightly backup
+    - Get a fresh project list
+    - Download the projects that changed since their last backup, several at a time
+    - Append each one to the archive as it arrives, data already on disk is never rewritten
     """
-
-    # Create the console
-    console = Console()
-
-    # Should we show off the good code that's been written
-    show_off_mode = True
-
-    # Create the console for making fancy graphics
     console = Console()
-
-    # Creds
-    username = lambda: os.environ.get("AGTERRAUSER", "")
-    password = lambda: os.environ.get("AGTERRAPASS", "")
-
-    # Pickle Path
-    pickle_path_project = Path("/tmp/agterra_project.pickle.py")
-    pickle_path_points = Path("/tmp/agerra_project_points.pickle.py")
-    if pickle_path_project.exists():
-        console.log(f"Pickle found at {pickle_path_project}")
-        projects_list = pickle.load(open(pickle_path_project, "rb"))
-    else:
-        # Get projects and save to pickle
-        with requests.Session() as sess:
-            sess.auth = (username, password)
-            console.log(f"Requesting Project List From Server to Populate Pickle")
-            if show_off_mode:
-                sleep(0.7)
-            projects_list = get_projects(console=console, sess=sess)
-        if show_off_mode:
-            sleep(0.5)
-        console.log(f"Pickle dumped to {pickle_path_project}")
-        pickle.dump(projects_list, open(pickle_path_project, "wb"))
-
-
-    if pickle_path_points.exists():
-        console.log(f"Points Pickle Found at {pickle_path_points}")
-        points_by_project_id = pickle.load(open(pickle_path_points, "rb"))
-
-    else:
-        # Get points for each project and cache them too
-        with Progress("[progress.description]{task.description}", BarColumn(), "{task.completed} of {task.total}",
-                      console=console) as progress:
-
-            task = progress.add_task(f"[green]Downloading Points For Existing Projects", total=len(projects_list))
-            points_by_project_id = dict()
-            for project in projects_list:
-                # Get projects and save to pickle
-                with requests.Session() as sess:
-                    sess.auth = (username, password)
-
-                    # Get all points
-                    points_for_project = get_points(sess=sess, console=console, projectID=project.ProjectId)
-
-                    # Append points by project ID to dict
-                    points_by_project_id.update({project.ProjectId: points_for_project})
-
-                    progress.update(task, advance=1)
-
-                    pickle.dump(points_by_project_id, open(pickle_path_points, "wb"))
-
-                    # sleep(2)
-
-    pprint(points_by_project_id)
-    # for proj_id, points in points_by_project_id.items():
-    #     pprint(points)
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-def get_points(sess: requests.Session, console: Console, projectID: int, includePoints: bool = True,
-               status: Status = None):
-    """
-    Get all exisiting points in a project
-    """
-    base_url = f"https://mapitfast.agterra.com/api/Points"
-    resp = sess.get(base_url, params={"projectId": projectID, "includePoints": includePoints})
-
-    points_obj_list = list()
-    for raw_resp in resp.json():
-        points_obj_list.append(Points(raw_data=raw_resp))
-
-    return points_obj_list
-
-def get_projects(console: Console, sess: requests.Session, url: str = f"https://mapitfast.agterra.com/api/Projects", status: Status = None):
-    """
-    Helper function to get projects list
-    """
-    # Get the folder list
-    raw_resp = get_url(sess=sess, url=url)
-    if raw_resp.status_code != 200 and raw_resp.status_code != 201:
-        console.log(f"[red][!] Log in failed")
-        json_data = raw_resp.json()
-        console.log(f"Message: [red]{json_data.get('Message')}")
-
-    json_data = raw_resp.json()
-
-    # Turn each project from JSON into an object we can actually use
-    proj_obj_list = list()
-    for raw_proj_dict in json_data:
-        proj_obj_list.append(Project(raw_data=raw_proj_dict))
-
-    return proj_obj_list
-
-
-def get_url(sess: requests.Session, url: str):
-    """
-    Basic function to make getting various URLs easier
-    """
-    return sess.get(url=url)
+    project_pickle_path = Path(os.path.join(cache_path, "project_cache.pickle.py"))
+
+    proj_obj_list = Utils.AgTerraWrapper.get_projects(username=username, password=password, console=console,
+                                                      cache_path=project_pickle_path, show_off_mode=False,
+                                                      refresh_cache=True)
+
+    archive = BackupArchive(backup_path)
+    # Unchanged projects are skipped without advancing the bar, only count the ones that get downloaded
+    todo_count = len(archive.projects_to_back_up(proj_obj_list, run_id=run_id, full=full))
+    with Progress("[progress.description]{task.description}", BarColumn(), "{task.completed} of {task.total}",
+                  console=console, transient=True) as progress:
+        task = progress.add_task(f"[green]Backing Up Projects", total=todo_count)
+        report = archive.backup(username=username, password=password, projects=proj_obj_list, run_id=run_id,
+                                full=full, max_workers=max_workers, console=console,
+                                progress_callback=lambda project_id, entry: progress.update(task, advance=1))
+
+    table = Table(title=f"Backup {report.run_id}")
+    table.add_column("Projects Backed Up", justify="center", style="green")
+    table.add_column("Projects Unchanged", justify="center", style="white")
+    table.add_column("Points Written", justify="center", style="cyan")
+    table.add_column("Bytes Written", justify="center", style="magenta")
+    table.add_row(str(len(report.backed_up_project_ids)), str(len(report.skipped_project_ids)),
+                  str(report.point_count), str(report.bytes_written))
+    console.print(table)
+    console.log(f"Archive at {archive.archive_path}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
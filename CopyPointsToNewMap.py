@@ -26,6 +26,8 @@ from MapItFastLib.Projects import Project
 from MapItFastLib.Points import Points
 from MapItFastLib.Pictures import Picture
 from MapItFastLib import Utils
+from MapItFastLib.Clustering import PointClusterer
+from MapItFastLib.Uploader import PointUploader
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 
@@ -39,8 +41,14 @@ CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 @click.option("--cache-path", type=click.Path(exists=False, file_okay=False, dir_okay=True, writable=True,
                                               readable=True, resolve_path=True), callback=Utils.validate_cache_folder,
               default="/tmp/agterra/cache/")
+@click.option("--tolerance-m", type=click.FLOAT, default=0.0, show_default=True,
+              help="Treat points within this many metres of each other as the same pin. 0 only skips exact matches")
+@click.option("--min-title-similarity", type=click.FLOAT, default=1.0, show_default=True,
+              help="How alike titles must be (0 to 1) for nearby points to count as the same pin")
+@click.option("--upload", is_flag=True, default=False,
+              help="Post the new points to the destination project, without it nothing is written")
 @click.pass_context
-def main(ctx, refresh_cache, password, username, cache_path):
+def main(ctx, refresh_cache, password, username, cache_path, tolerance_m, min_title_similarity, upload):
     """
     Application to copy pictures to a new project OR copy points to a new project
     """
@@ -55,10 +63,6 @@ def main(ctx, refresh_cache, password, username, cache_path):
     # {Title, Desc, Lat, Long, IconID}
     final_points_list = list()
     intermediate_list = list()
-    # Set duplicate_point flag
-    duplicate_point = False
-    count = 0
-    time_sleep = 60
 
     icon_id_dict = {71: "tractor_marker", 3: "point", 60: "red_point"}
 
@@ -80,43 +84,43 @@ def main(ctx, refresh_cache, password, username, cache_path):
             intermediate_list.append(point)
 
     console.log(len(intermediate_list))
-    if len(intermediate_list) > 0 and len(dest_point_obj_list) == 0:
-        # Only enter this block if the dest list is empty and the src list has at least one item it in
-        dest_point_obj_list.append(intermediate_list[0])
-
-    for src_point in intermediate_list:
-        duplicate = True
-        for dest_point in dest_point_obj_list:
-            if dest_point.Title == src_point.Title and dest_point.Latitude == src_point.Latitude and \
-                    dest_point.Longitude == src_point.Longitude:
-                duplicate = True
+    # Compare every source point with every destination point (and the source points already accepted), not just
+    # the last destination point
+    clusterer = PointClusterer(tolerance_m=tolerance_m, min_title_similarity=min_title_similarity)
+    new_point_list = clusterer.filter_new(intermediate_list, existing=dest_point_obj_list)
+    console.log(f"{len(intermediate_list) - len(new_point_list)} of {len(intermediate_list)} points are already on "
+                f"the destination map")
+
+    def build_upload_dicts():
+        for point in new_point_list:
+            if point.IconId == 71 or point.IconId == 3:
+                # Only post data if it's unchanged
+                icon_id = point.IconId
             else:
-                duplicate = False
-        if not duplicate:
-            dest_point_obj_list.append(src_point)
+                icon_id = 3
+            yield PointUploader.build_point_dict(project_id=project_id_dst, icon_id=icon_id, title=point.Title,
+                                                 description=point.Description, longitude=point.Longitude,
+                                                 latitude=point.Latitude)
+
+    if not upload:
+        console.log(f"Would upload {len(new_point_list)} points to project {project_id_dst}, "
+                    f"pass --upload to post them")
+        return
 
     with Progress("[progress.description]{task.description}", BarColumn(), "{task.completed} of {task.total}",
                   console=console) as progress:
-        task = progress.add_task(f"[green]Uploading deduplicated points", total=len(dest_point_obj_list))
-        for point in dest_point_obj_list:
-            count += 1
-            if point.IconId == 71 or point.IconId == 3:
-                # Only post data if it's unchanged
-                data_dict = {"ProjectID": project_id_dst, "IconID": point.IconId, "Title": point.Title,
-                             "Description": point.Description, "Longitude": point.Longitude, "Latitude": point.Latitude,
-                             "ItemTime": datetime.now().strftime("%Y-%m-%dT%H:%M:%S"), "Elevation": 0}
-            else:
-                data_dict = {"ProjectID": project_id_dst, "IconID": 3, "Title": point.Title,
-                             "Description": point.Description, "Longitude": point.Longitude, "Latitude": point.Latitude,
-                             "ItemTime": datetime.now().strftime("%Y-%m-%dT%H:%M:%S"), "Elevation": 0}
-
-            # console.log(type(point.Latitude))
-            # response_obj = Utils.AgTerraWrapper.post_points(username=username, password=password, console=console,
-            #                                                 project_id=project_id_dst, data_dict=data_dict)
-            # progress.update(task, advance=1)
-            # if count % 100 == 0:
-            #     console.log(f"Sleeping for {time_sleep} seconds so the server can catch up")
-            #     sleep(time_sleep)
+        task = progress.add_task(f"[green]Uploading deduplicated points", total=len(new_point_list))
+        # The uploader backs off when the server pushes back, no need to sleep every 100 points
+        with requests.Session() as sess:
+            sess.auth = (username, password)
+            uploader = PointUploader(sess=sess, console=progress.console)
+            upload_result_list = uploader.upload(build_upload_dicts(),
+                                                 progress_callback=lambda result: progress.update(task, advance=1))
+
+    failed_result_list = [result for result in upload_result_list if not result.ok]
+    console.log(f"Uploaded {len(upload_result_list) - len(failed_result_list)} of {len(upload_result_list)} points")
+    for result in failed_result_list:
+        console.log(f"Failed to add {result.point_dict.get('Title')}: {result.status_code} {result.error}")
 
 
 
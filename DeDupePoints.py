@@ -1,6 +1,7 @@
 from csv import DictReader
 from datetime import datetime
 import logging
+import os
 from pprint import pprint
 import sys
 from time import sleep
@@ -14,8 +15,12 @@ from rich.progress import Progress
 from rich.status import Status
 from tabulate import tabulate
 
-from MapItFastLib.Projects import Project
+from MapItFastLib.CsvImport import DEFAULT_DESTINATION, ColumnMapping, ImportPipeline, ImportReport
+from MapItFastLib import Utils
+from MapItFastLib.ProjectDirectory import ProjectDirectory
 from MapItFastLib.Points import Points
+from MapItFastLib.PointIndex import PointIndex
+from MapItFastLib.Retry import DEFAULT_TIMEOUT
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 
@@ -25,19 +30,18 @@ CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 @click.option("--project-name", type=click.STRING, required=True)
 @click.option("--username", default=lambda: os.environ.get("AGTERRAUSER", ""))
 @click.option("--password", hide_input=True, default=lambda: os.environ.get("AGTERRAPASS", ""), show_default=False)
-@click.option("--project-name", required=True, type=click.STRING)
+@click.option("--cache-path", type=click.Path(exists=False, file_okay=False, dir_okay=True, writable=True,
+                                              readable=True, resolve_path=True), callback=Utils.validate_cache_folder,
+              default="/tmp/agterra/cache/")
+@click.option("--tolerance-m", type=click.FLOAT, default=0.0, show_default=True,
+              help="Treat points within this many metres as duplicates. 0 only skips exact matches")
 @click.pass_context
-def main(ctx, csv_file, project_name, username, password):
+def main(ctx, csv_file, project_name, username, password, cache_path, tolerance_m):
     """
     Same as last script, but this time check if the points exist first, and skip it if there is an exact LAT & LONG
     match
     """
 
-    # List of projects
-    proj_obj_list = list()
-    # If the given project is found, set to True
-    proj_title_found = False
-
     # Create the console
     console = Console()
 
@@ -60,27 +64,24 @@ def main(ctx, csv_file, project_name, username, password):
     with requests.Session() as sess:
         sess.auth = (username, password)
         with Status("[magenta]Connecting", console=console, spinner='arrow3') as status:
-            status.update(f"Requesting Project List From Server")
-            if show_off_mode:
-                sleep(0.7)
-
-            proj_obj_list = get_projects(sess=sess)
-
-            # Look for project by title
-            for proj in proj_obj_list:
-                if proj.Title == project_name:
-                    # Project found, we can move on
-                    # Save the object for later
-                    project_by_name = proj
-                    console.log(f"Project {project_name} has been found")
-                    proj_title_found = True
+            status.update(f"Loading Project List")
+            project_directory = ProjectDirectory.load(username=username, password=password, console=console,
+                                                      cache_path=cache_path, sess=sess)
 
+            # Look for project by title, exactly first, then ignoring case
+            project_list = project_directory.find(project_name) or project_directory.find(project_name,
+                                                                                          ignore_case=True)
             # If project not found, print error and exit
-            if not proj_title_found:
-                console.log(f"Project '{project_name}' wasn't found as an option")
-                for proj in proj_obj_list:
-                    console.log(f"{proj.Title}")
+            if len(project_list) != 1:
+                console.log(f"Project '{project_name}' wasn't found as an option" if not project_list else
+                            f"{len(project_list)} projects are called '{project_name}'")
+                # The ambiguous ones, or the ones starting with the same word, or every project
+                suggestion_list = project_list or project_directory.find_prefix(project_name.split(" ")[0])
+                for proj in suggestion_list or project_directory:
+                    console.log(f"{proj.Title} ({proj.ProjectId})")
                 sys.exit(1)
+            project_by_name = project_list[0]
+            console.log(f"Project {project_name} has been found")
 
             # Get existing points
             points_obj_list = get_points(sess=sess, console=console, status=status,
@@ -89,44 +90,24 @@ def main(ctx, csv_file, project_name, username, password):
             status.update(f"Opening CSV File")
             if show_off_mode:
                 sleep(2)
-            with open(csv_file, 'r') as f:
-                csv_dict = DictReader(f)
-
-                for row_dict in csv_dict:
-                    new_lat = float(row_dict.get("Latitude"))
-                    new_long = float(row_dict.get("Longitude"))
-
-                    # Loop over every existing point for each row in the CSV
-                    skip_point = False
-                    for point in points_obj_list:
-                        # If both coords match, error out, otherwise continue to posting the new points
-                        if new_lat == point.Latitude and new_long == point.Longitude:
-                            console.log(f"Looks like the points at Latitude {point.Latitude} and Longitude "
-                                        f"{point.Longitude} already exists")
-                            skip_point = True
-                            break
-
-                    if not skip_point:
-                        if "Title" in row_dict:
-                            # If the title column exists, append it to the request
-                            # console.log(f"Found Title!")
-                            title = row_dict.get("Title")
-                        else:
-                            title = ""
-
-                        if "Description" in row_dict:
-                            description = row_dict.get("Description")
-                        else:
-                            description = ""
-
-                        console.log(f"Adding Lat: {new_lat} and Long: {new_long}")
-                        # post_coordinates(sess=sess, console=console, status=status, lat=new_lat, long=new_long,
-                        #                  projectID=project_by_name.ProjectId, title=title, description=description)
-                        if show_off_mode:
-                            sleep(1)
-
-
-
+            # Index the existing points once instead of looping over all of them for every row
+            point_index = PointIndex.from_points(points_obj_list, tolerance_m=tolerance_m)
+
+            # If the coords match (or are within the tolerance), skip it, otherwise continue to posting
+            pipeline = ImportPipeline(mapping=ColumnMapping())
+            report = ImportReport()
+            on_duplicate = lambda row: console.log(f"Looks like the points at Latitude {row.Latitude} and Longitude "
+                                                   f"{row.Longitude} already exists")
+            for import_row in pipeline.iter_new_rows(csv_file, point_indexes={DEFAULT_DESTINATION: point_index},
+                                                     report=report, on_duplicate=on_duplicate):
+                console.log(f"Adding Lat: {import_row.Latitude} and Long: {import_row.Longitude}")
+                # post_coordinates(sess=sess, console=console, status=status, lat=import_row.Latitude,
+                #                  long=import_row.Longitude, projectID=project_by_name.ProjectId,
+                #                  title=import_row.Title, description=import_row.Description)
+                if show_off_mode:
+                    sleep(1)
+            for row_error in report.errors:
+                console.log(f"[red]Line {row_error.line_number}: {row_error.message}")
 
             # for point in points_obj_list:
             #     console.log(f"Latitude: {point.Latitude}\nLongitude: {point.Longitude}")
@@ -137,7 +118,7 @@ def get_points(sess: requests.Session, console: Console, status: Status, project
     Get all exisiting points in a project
     """
     base_url = f"https://mapitfast.agterra.com/api/Points"
-    resp = sess.get(base_url, params={"projectId": projectID})
+    resp = sess.get(base_url, params={"projectId": projectID}, timeout=DEFAULT_TIMEOUT)
 
     points_obj_list = list()
     for raw_resp in resp.json():
@@ -162,7 +143,7 @@ def post_coordinates(sess: requests.Session, console: Console, status: Status, l
                       "Longitude": long,
                       "Elevation": elevation}
 
-    resp = sess.post(base_url, data=post_data_dict)
+    resp = sess.post(base_url, data=post_data_dict, timeout=DEFAULT_TIMEOUT)
 
     if resp.status_code == 201:
         # console.log(f"Added coordinates to project")
@@ -195,28 +176,5 @@ def get_csv_coordinates(path: str):
     return csv_dict
 
 
-def get_projects(sess: requests.Session, url: str = f"https://mapitfast.agterra.com/api/Projects"):
-    """
-    Helper function to get projects list
-    """
-    # Get the folder list
-    raw_resp = get_url(sess=sess, url=url)
-
-    json_data = raw_resp.json()
-
-    # Turn each project from JSON into an object we can actually use
-    proj_obj_list = list()
-    for raw_proj_dict in json_data:
-        proj_obj_list.append(Project(raw_data=raw_proj_dict))
-
-    return proj_obj_list
-
-
-def get_url(sess: requests.Session, url: str):
-    """
-    Basic function to make getting various URLs easier
-    """
-    return sess.get(url=url)
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
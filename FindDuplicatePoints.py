@@ -0,0 +1,85 @@
+import os
+from pathlib import Path
+
+import click
+from rich.console import Console
+from rich.progress import Progress, BarColumn
+from rich.table import Table
+
+from MapItFastLib import Utils
+from MapItFastLib.Clustering import PointClusterer
+
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+
+
+@click.command("FindDuplicatePoints", context_settings=CONTEXT_SETTINGS,
+               help=f"Report groups of near-duplicate pins and which one of each group to keep")
+@click.option("--refresh-cache", "-r", type=click.BOOL, default=False, help="Force a cache refresh", is_flag=True)
+@click.option("--username", default=lambda: os.environ.get("AGTERRAUSER", ""))
+@click.option("--password", hide_input=True, default=lambda: os.environ.get("AGTERRAPASS", ""), show_default=False)
+@click.option("--cache-path", type=click.Path(exists=False, file_okay=False, dir_okay=True, writable=True,
+                                              readable=True, resolve_path=True), callback=Utils.validate_cache_folder,
+              default="/tmp/agterra/cache/")
+@click.option("--project-title", "project_title_list", multiple=True, required=True,
+              help="Project to check, give it more than once to find duplicates across projects")
+@click.option("--tolerance-m", type=click.FLOAT, default=5.0, show_default=True,
+              help="Points within this many metres of each other can be duplicates")
+@click.option("--min-title-similarity", type=click.FLOAT, default=0.8, show_default=True,
+              help="How alike titles must be (0 to 1), 0 ignores titles")
+@click.option("--csv-report", type=click.Path(dir_okay=False, writable=True, resolve_path=True), default=None,
+              help="Also write every duplicate group to this CSV file")
+@click.pass_context
+def main(ctx, refresh_cache, username, password, cache_path, project_title_list, tolerance_m, min_title_similarity,
+         csv_report):
+    """
+    Nothing is deleted, the report is for a person to review
+    """
+    console = Console()
+    project_pickle_path = Path(os.path.join(cache_path, "project_cache.pickle.py"))
+    proj_obj_list = Utils.AgTerraWrapper.get_projects(username=username, password=password, console=console,
+                                                      cache_path=project_pickle_path, refresh_cache=refresh_cache)
+    proj_obj_dict = {proj_obj.ProjectId: proj_obj for proj_obj in proj_obj_list}
+    project_id_list = [proj_obj.ProjectId for proj_obj in proj_obj_list if proj_obj.Title in project_title_list]
+    if not project_id_list:
+        console.log(f"None of the projects {', '.join(project_title_list)} were found")
+        raise SystemExit(1)
+
+    point_obj_list = list()
+    with Progress("[progress.description]{task.description}", BarColumn(), "{task.completed} of {task.total}",
+                  console=console, transient=True) as progress:
+        task = progress.add_task(f"[green]Project Points Loaded", total=len(project_id_list))
+        for proj_id, proj_points in Utils.AgTerraWrapper.get_points_many(username=username, password=password,
+                                                                         console=progress.console,
+                                                                         project_ids=project_id_list,
+                                                                         cache_path=cache_path,
+                                                                         refresh_cache=refresh_cache):
+            point_obj_list.extend(proj_points)
+            progress.update(task, advance=1)
+
+    clusterer = PointClusterer(tolerance_m=tolerance_m, min_title_similarity=min_title_similarity)
+    report = clusterer.cluster(point_obj_list)
+
+    table = Table(title=f"Duplicate Pins ({len(report.groups)} groups, {report.duplicate_count} extra pins)",
+                  show_lines=True)
+    table.add_column("Group", justify="right", style="white")
+    table.add_column("Keep", justify="left", style="green")
+    table.add_column("Duplicates", justify="left", style="red")
+    table.add_column("Project", justify="center", style="magenta")
+    table.add_column("Spread (m)", justify="right", style="cyan")
+    for group_number, group in enumerate(report.groups, start=1):
+        survivor = group.survivor
+        project_title_set = {proj_obj_dict.get(point.ProjectId).Title for point in group.points
+                             if point.ProjectId in proj_obj_dict}
+        table.add_row(str(group_number), f"{survivor.Title} ({survivor.PointId})",
+                      "\n".join(f"{point.Title} ({point.PointId})" for point in group.duplicates),
+                      "\n".join(sorted(project_title_set)), f"{group.max_distance_m:.1f}")
+    console.print(table)
+    console.log(f"{report.duplicate_count} of {report.point_count} points are duplicates")
+
+    if csv_report is not None:
+        report.write_csv(csv_report)
+        console.log(f"Report written to {csv_report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,134 +1,68 @@
-from csv import DictReader
-from datetime import datetime
-import logging
+import os
 from pathlib import Path
-import pickle
-from pprint import pprint
-import sys
-from time import sleep
 
 import click
-import requests
 from rich.console import Console
-from rich.logging import RichHandler
-from rich.prompt import Confirm, Prompt
-from rich.progress import Progress, BarColumn
 from rich.status import Status
-from tabulate import tabulate
 
-from MapItFastLib.Projects import Project
-from MapItFastLib.Points import Points
-
-def main():
+from MapItFastLib.FormDedupe import DEFAULT_SKIP_FIELDS, FormDeduper
+from MapItFastLib.Forms import FormCursorStore, FormsClient, iter_records_file
+from MapItFastLib.Utils import AgTerraAPI
+
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+
+
+@click.command("FormDeDupe", context_settings=CONTEXT_SETTINGS, help=f"Count duplicate form submissions on Strider")
+@click.option("--username", default=lambda: os.environ.get("AGTERRAUSER", ""))
+@click.option("--password", hide_input=True, default=lambda: os.environ.get("AGTERRAPASS", ""), show_default=False)
+@click.option("--form-name", default="General_Record_2020v2.0", show_default=True, help="Form to deduplicate")
+@click.option("--data-path", type=click.Path(file_okay=False), default="/tmp/agterra_forms", show_default=True,
+              help="Folder the downloaded records and the paging cursor are kept in")
+@click.option("--cursor-mode", type=click.Choice(["offset", "id"]), default="offset", show_default=True,
+              help="Whether the number after GetAll/ counts records read or is the last _ID seen")
+@click.option("--full", is_flag=True, default=False, help="Forget the saved records and cursor and download everything")
+@click.option("--skip-field", "skip_field_list", multiple=True, default=DEFAULT_SKIP_FIELDS, show_default=True,
+              help="Field to ignore when comparing records, can be given more than once")
+def main(username, password, form_name, data_path, cursor_mode, full, skip_field_list):
     """
     Deduplicate forms on Strider
-    - Get Forms from website
-    - Store in pickle
-    - Compare every entry against every other entry
+    - Fetch the records submitted since the last run, page by page, and append them to a local JSON lines file
+    - Hash every stored record once and group the identical ones
+    - Count the duplicates per customer name
     """
 
-    # Create the console
-    console = Console()
-
-    # Should we show off the good code that's been written
-    show_off_mode = True
-
     # Create the console for making fancy graphics
     console = Console()
 
-    # Creds
-    username = lambda: os.environ.get("AGTERRAUSER", "")
-    password = lambda: os.environ.get("AGTERRAPASS", "")
+    data_path = Path(data_path)
+    records_path = data_path.joinpath(f"{form_name}.jsonl")
+    cursor_store = FormCursorStore(data_path.joinpath("form_cursors.json"))
+    if full:
+        records_path.unlink(missing_ok=True)
+        cursor_store.reset(form_name)
+
+    with AgTerraAPI.build_session(username=username, password=password) as sess:
+        forms_client = FormsClient(sess=sess, form_id=form_name, cursor_mode=cursor_mode, cursor_store=cursor_store)
+        with Status(f"[magenta]Requesting new {form_name} records", console=console, spinner='arrow3') as status:
+            new_count = forms_client.sync_to_file(
+                records_path,
+                progress_callback=lambda count: status.update(f"[magenta]Requesting new {form_name} records "
+                                                              f"[white]({count} so far)"))
+    console.log(f"{new_count} new records, saved to {records_path}")
+
+    form_deduper = FormDeduper(skip_fields=skip_field_list)
+    with Status(f"[magenta]Deduplicating {form_name}", console=console, spinner='arrow3'):
+        group_list = form_deduper.exact_groups(iter_records_file(records_path))
 
     duplicate_record_counter_dict = dict()
-
-    # Pickle Path
-    pickle_path_strider = Path("/tmp/agterra_strider_form.pickle.py")
-
-    if pickle_path_strider.exists():
-        console.log(f"Pickle found at {pickle_path_strider}")
-        raw_forms_resp = pickle.load(open(pickle_path_strider, "rb"))
-    else:
-        # Get projects and save to pickle
-        with requests.Session() as sess:
-            sess.auth = (username, password)
-            console.log(f"Requesting Forms From Server to Populate Pickle")
-            if show_off_mode:
-                sleep(0.7)
-            raw_forms_resp = get_forms(console=console, sess=sess)
-        if show_off_mode:
-            sleep(0.5)
-        console.log(f"Pickle dumped to {pickle_path_strider}")
-        pickle.dump(raw_forms_resp, open(pickle_path_strider, "wb"))
-
-    for k, v in raw_forms_resp.items():
-        # For each App record, check all other app records
-        if k == "General_Record_2020v2.0":
-            with Progress("[progress.description]{task.description}", BarColumn(), "{task.completed} of {task.total}",
-                          console=console, transient=True) as progress:
-                overall_task = progress.add_task(f"[green]Overall Progress", total=len(v))
-                print(type(overall_task))
-                # check_against_other_forms_task = progress.add_task(f"[white]Checking Against Other Projects",
-                #                                                    total=len(v))
-                # for test_app_record in v:
-                #     progress.update(overall_task, advance=1)
-                #     for other_app_record in v:
-                #         duplicate_record = True
-                #         # progress.update(check_against_other_forms_task, advance=1)
-                #         # The record matchs another name. Check all fields
-                #         if test_app_record.get("Cust_Name") == other_app_record.get("Cust_Name"):
-                #             # progress.console.print(f"Duplicate with name with {test_app_record.get('Cust_Name')}")
-                #             for key, value in test_app_record.items():
-                #                 if key in other_app_record:
-                #                     if value == other_app_record.get(key):
-                #                         # Values match, continue
-                #                         pass
-                #                     else:
-                #                         # Break loop on first failure and move on. It's not duplicate at that point
-                #                         duplicate_record = False
-                #                         break
-
-                        # if duplicate_record:
-                        #     # progress.console.log(f"Record {test_app_record.get('_ID')} is duplicate")
-                        #     if test_app_record.get("Cust_Name") in duplicate_record_counter_dict:
-                        #         count = duplicate_record_counter_dict.get(test_app_record.get("Cust_Name"))
-                        #         count += 1
-                        #         duplicate_record_counter_dict.update({test_app_record.get("Cust_Name"): count})
-                        #     else:
-                        #         duplicate_record_counter_dict.update({test_app_record.get("Cust_Name"): 1})
+    for group in group_list:
+        cust_name = group.survivor.get("Cust_Name")
+        duplicate_record_counter_dict.update({cust_name: duplicate_record_counter_dict.get(cust_name, 0) +
+                                              len(group.duplicates)})
 
     console.log(f"Duplicates:")
     console.log(duplicate_record_counter_dict)
 
 
-
-
-
-
-
-
-def get_forms(console: Console, sess: requests.Session, form_id: str = "General_Record_2020v2.0"):
-    """
-    Method to get every form for a given FormID
-    """
-    raw_resp = get_url(url=f"https://forms.agterra.com/api/{form_id}/GetAll/0", sess=sess)
-
-    if raw_resp.status_code != 200:
-        console.log(f"[red] Something went wrong, we got status [white]{raw_resp.status_code}")
-        json_data = raw_resp.json()
-        console.log(f"Message Data: {json_data}")
-
-    json_data = raw_resp.json()
-
-    return json_data
-
-
-def get_url(sess: requests.Session, url: str):
-    """
-    Basic function to make getting various URLs easier
-    """
-    return sess.get(url=url)
-
-
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
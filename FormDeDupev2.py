@@ -1,6 +1,7 @@
 from csv import DictReader
 from datetime import datetime
 import logging
+import os
 from pathlib import Path
 import pickle
 from pprint import pprint
@@ -14,36 +15,43 @@ from rich.logging import RichHandler
 from rich.prompt import Confirm, Prompt
 from rich.progress import Progress, BarColumn
 from rich.status import Status
-from tabulate import tabulate
+from rich.table import Table
 
+from MapItFastLib.FormDedupe import DEFAULT_SKIP_FIELDS, FormDeduper
 from MapItFastLib.Projects import Project
 from MapItFastLib.Points import Points
-
-def main():
+from MapItFastLib.Retry import DEFAULT_TIMEOUT
+
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+
+
+@click.command("FormDeDupe", context_settings=CONTEXT_SETTINGS, help=f"Find duplicate form submissions on Strider")
+@click.option("--username", default=lambda: os.environ.get("AGTERRAUSER", ""))
+@click.option("--password", hide_input=True, default=lambda: os.environ.get("AGTERRAPASS", ""), show_default=False)
+@click.option("--form-name", default="General_Record_2020v2.0", show_default=True, help="Form to deduplicate")
+@click.option("--skip-field", "skip_field_list", multiple=True, default=DEFAULT_SKIP_FIELDS, show_default=True,
+              help="Field to ignore when comparing records, can be given more than once")
+@click.option("--near", is_flag=True, default=False,
+              help="Also group records that are nearly the same (MinHash), not just identical ones")
+@click.option("--threshold", type=click.FLOAT, default=0.8, show_default=True,
+              help="Share of field values two records must have in common to be near duplicates")
+@click.option("--normalize", is_flag=True, default=False, help="Ignore case and extra whitespace in answers")
+def main(username, password, form_name, skip_field_list, near, threshold, normalize):
     """
     Deduplicate forms on Strider
     - Get Forms from website
     - Store in pickle
-    - Compare every entry against every other entry
+    - Hash every record once and group the identical ones, no record is compared against every other one
     """
 
-    # Create the console
-    console = Console()
-
     # Should we show off the good code that's been written
     show_off_mode = True
 
     # Create the console for making fancy graphics
     console = Console()
 
-    # Creds
-    username = lambda: os.environ.get("AGTERRAUSER", "")
-    password = lambda: os.environ.get("AGTERRAPASS", "")
-
-    duplicate_record_counter_dict = dict()
-
-    # Pickle Path
-    pickle_path_strider = Path("/tmp/agterra_strider_form.pickle.py")
+    # Pickle Path, one per form so one form's records are never read back for another
+    pickle_path_strider = Path(f"/tmp/agterra_strider_form_{form_name}.pickle.py")
 
     if pickle_path_strider.exists():
         console.log(f"Pickle found at {pickle_path_strider}")
@@ -55,65 +63,29 @@ def main():
             console.log(f"Requesting Forms From Server to Populate Pickle")
             if show_off_mode:
                 sleep(0.7)
-            raw_forms_resp = get_forms(console=console, sess=sess)
+            raw_forms_resp = get_forms(console=console, sess=sess, form_id=form_name)
         if show_off_mode:
             sleep(0.5)
         console.log(f"Pickle dumped to {pickle_path_strider}")
         pickle.dump(raw_forms_resp, open(pickle_path_strider, "wb"))
 
-
-    # Set up ProgressBar
-    with Progress("[progress.description]{task.description}", BarColumn(), "{task.completed} of {task.total}",
-                  console=console, transient=False) as progress:
-
-        # BEGIN DEDUPE PROCESS #
-        for form_name, form_data_list in raw_forms_resp.items():
-            overall_task = progress.add_task(f"[green]DeDupe Progress", total=len(form_data_list))
-            # Start with the general form, for sanity
-            if form_name == "General_Record_2020v2.0":
-                progress.update(overall_task, advance=1)
-                for golden_form_submitted in form_data_list:
-                    check_against_all_others(progress_bar=progress, golden_form=golden_form_submitted,
-                                             form_data_list=form_data_list, prog_bar_task=overall_task)
-            #         break
-            # break
-
-
-def check_against_all_others(progress_bar: Progress, prog_bar_task: int, golden_form: dict, form_data_list: list):
-    """
-    Function to check if golden_form is duplicated anywhere else
-    - EXCLUDE SOME FIELDS LIKE _ID
-    - Maintain list of duplicated form IDs for quick look ups
-    :return: A dictionary with the golden form as a key, value is a list of forms which are duplicated against the golden one
-    """
-    duplicate_form_ids = list()
-    final_dict = dict() # {GoldenFormID: ListOfDuplicateForms}
-    field_skip_list = ["_ID"]
-
-    # single_form_dedupe_task = progress_bar.add_task(f"[magenta]Single Form DeDupe", total=len(form_data_list))
-
-    for count, test_form in enumerate(form_data_list):
-        # Reset if the form is a Match or not each loop
-        match = True
-        if test_form.get("_ID") == golden_form.get("_ID"):
-            # The golden form, we can skip deduplicating this one
-            pass # progress_bar.console.log(f"Golden Form")
+    form_data_list = raw_forms_resp.get(form_name, list())
+    form_deduper = FormDeduper(skip_fields=skip_field_list, normalize_strings=normalize)
+    with Status(f"[magenta]Deduplicating {len(form_data_list)} records", console=console, spinner='arrow3'):
+        if near:
+            group_list = form_deduper.near_groups(form_data_list, threshold=threshold)
         else:
-            # Not the golden form
-            for form_field_key, form_field_value in test_form.items():
-                if form_field_key in field_skip_list:
-                    pass
-                else:
-                    if golden_form.get(form_field_key) == test_form.get(form_field_key):
-                        # Match!
-                        pass
-                    else:
-                        # No match!
-                        match = False
-                        break
-
-    progress_bar.update(prog_bar_task, advance=1)
+            group_list = form_deduper.exact_groups(form_data_list)
 
+    table = Table(title=f"Duplicate {form_name} Records", show_lines=True)
+    table.add_column("Keep", justify="left", style="green")
+    table.add_column("Duplicate IDs", justify="left", style="red")
+    table.add_column("Copies", justify="right", style="cyan")
+    for group in group_list:
+        table.add_row(str(group.survivor.get("_ID")), ", ".join(str(form_id) for form_id in group.duplicate_ids),
+                      str(len(group)))
+    console.print(table)
+    console.log(f"{sum(len(group) - 1 for group in group_list)} of {len(form_data_list)} records are duplicates")
 
 
 def get_forms(console: Console, sess: requests.Session, form_id: str = "General_Record_2020v2.0"):
@@ -136,7 +108,7 @@ def get_url(sess: requests.Session, url: str):
     """
     Basic function to make getting various URLs easier
     """
-    return sess.get(url=url)
+    return sess.get(url=url, timeout=DEFAULT_TIMEOUT)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,90 @@
+from datetime import datetime
+
+import click
+from rich.console import Console
+from rich.table import Table
+
+from MapItFastLib import Utils
+from MapItFastLib.CacheManager import CacheManager
+
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+
+
+def cache_path_option(func):
+    return click.option("--cache-path", type=click.Path(exists=False, file_okay=False, dir_okay=True, writable=True,
+                                                        readable=True, resolve_path=True),
+                        callback=Utils.validate_cache_folder, default="/tmp/agterra/cache/")(func)
+
+
+def human_bytes(size: int):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def human_time(timestamp: float):
+    if timestamp is None:
+        return "-"
+    return datetime.fromtimestamp(timestamp).strftime("%m/%d/%Y, %H:%M:%S")
+
+
+@click.group("cache", context_settings=CONTEXT_SETTINGS, help=f"Inspect and clean up the local AgTerra cache")
+def cache():
+    pass
+
+
+@cache.command("stats", help=f"Show what's in the cache folder")
+@cache_path_option
+def stats(cache_path):
+    """
+    One row per entity type with counts, sizes and how many entries are stale
+    """
+    console = Console()
+    cache_manager = CacheManager(cache_path=cache_path)
+
+    table = Table(title=f"Cache at {cache_path}", show_lines=True)
+    table.add_column("Type", justify="left", style="cyan")
+    table.add_column("Entries", justify="right", style="magenta")
+    table.add_column("Size", justify="right", style="green")
+    table.add_column("Stale", justify="right", style="red")
+    table.add_column("Oldest", justify="right", style="white")
+    table.add_column("Newest", justify="right", style="white")
+    for entity_type, type_dict in cache_manager.stats().items():
+        table.add_row(entity_type, str(type_dict.get("count")), human_bytes(type_dict.get("bytes")),
+                      str(type_dict.get("stale")), human_time(type_dict.get("oldest")),
+                      human_time(type_dict.get("newest")))
+    console.print(table)
+
+
+@cache.command("prune", help=f"Delete stale entries, then least recently used ones until the cache fits")
+@cache_path_option
+@click.option("--max-size-mb", type=click.FLOAT, default=None, help="Total size the cache folder may use")
+@click.option("--points-max-age-hours", type=click.FLOAT, default=None, help="Max age of cached points")
+@click.option("--projects-max-age-hours", type=click.FLOAT, default=None,
+              help="Max age of cached projects and project folders")
+@click.option("--dry-run", is_flag=True, default=False, help="Only show what would be deleted")
+def prune(cache_path, max_size_mb, points_max_age_hours, projects_max_age_hours, dry_run):
+    """
+    Enforce the age limits and the size budget on the cache folder
+    """
+    console = Console()
+    max_age_dict = dict()
+    if points_max_age_hours is not None:
+        max_age_dict.update({"points": points_max_age_hours * 3600})
+    if projects_max_age_hours is not None:
+        max_age_dict.update({"projects": projects_max_age_hours * 3600,
+                             "project_folders": projects_max_age_hours * 3600})
+    max_bytes = None if max_size_mb is None else int(max_size_mb * 1024 * 1024)
+
+    cache_manager = CacheManager(cache_path=cache_path, max_age_dict=max_age_dict, max_bytes=max_bytes)
+    removed_list = cache_manager.prune(dry_run=dry_run)
+    for entry in removed_list:
+        console.log(f"{'Would remove' if dry_run else 'Removed'} {entry.path.name} ({human_bytes(entry.size)})")
+    console.log(f"[bold]{'Would free' if dry_run else 'Freed'} "
+                f"{human_bytes(sum(entry.size for entry in removed_list))} across {len(removed_list)} entries")
+
+
+if __name__ == "__main__":
+    cache()
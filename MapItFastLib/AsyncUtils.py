@@ -0,0 +1,79 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from rich.console import Console
+
+from .Utils import AgTerraAPI
+
+
+class AsyncAgTerraAPI(object):
+    """
+    asyncio flavoured version of AgTerraAPI
+    Every call shares one pooled keep-alive session, so the TCP+TLS handshake is paid once per connection instead of
+    once per request. max_concurrency caps how many requests are in flight at the same time.
+
+    Usage:
+    async with AsyncAgTerraAPI(username=username, password=password, console=console) as api:
+        projects = await api.get_projects()
+        points = await asyncio.gather(*[api.get_points(projectID=proj.ProjectId) for proj in projects])
+    """
+    def __init__(self, username: str, password: str, console: Console, max_concurrency: int = 16,
+                 pool_maxsize: int = None):
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}")
+        self.console = console
+        self.max_concurrency = max_concurrency
+        # One connection per worker by default, so no request ever waits on the pool itself
+        self.sess = AgTerraAPI.build_session(username=username, password=password,
+                                             pool_maxsize=pool_maxsize or max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="agterra")
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Release the worker threads and every pooled connection
+        """
+        self._executor.shutdown(wait=True)
+        self.sess.close()
+
+    async def _run(self, func, **kwargs):
+        """
+        Run a blocking AgTerraAPI call on the worker pool, never more than max_concurrency at once
+        """
+        if self._semaphore is None:
+            # Created lazily so it binds to the running loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, partial(func, sess=self.sess, **kwargs))
+
+    async def get_projects(self, url: str = f"https://mapitfast.agterra.com/api/Projects"):
+        """
+        Helper function to get projects list
+        """
+        return await self._run(AgTerraAPI.get_projects, console=self.console, url=url)
+
+    async def get_points(self, projectID: int, url: str = f"https://mapitfast.agterra.com/api/Points"):
+        """
+        Get all exisiting points in a project
+        """
+        return await self._run(AgTerraAPI.get_points, console=self.console, projectID=projectID, url=url)
+
+    async def get_project_folders(self):
+        """
+        Get every ProjectFolder object
+        """
+        return await self._run(AgTerraAPI.get_project_folders)
+
+    async def post_points(self, point_dict: dict, url: str = f"https://mapitfast.agterra.com/api/Points"):
+        """
+        Post a single point to a project
+        """
+        return await self._run(AgTerraAPI.post_points, console=self.console, point_dict=point_dict, url=url)
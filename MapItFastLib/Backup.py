@@ -0,0 +1,257 @@
+from datetime import datetime
+import gzip
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from rich.console import Console
+
+from .Points import Points
+from .Utils import AgTerraWrapper
+
+ARCHIVE_FILE_NAME = "points.archive.gz"
+MANIFEST_FILE_NAME = "manifest.jsonl"
+
+
+def default_run_id():
+    """
+    Name of a backup run nobody named, today's date
+    """
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+class BackupEntry(object):
+    """
+    One project's points as written to the archive by one backup run
+    """
+    __slots__ = ("run_id", "project_id", "title", "last_child_update", "offset", "length", "count", "sha256",
+                 "written_at")
+
+    def __init__(self, run_id: str, project_id: int, title: str, last_child_update: str, offset: int, length: int,
+                 count: int, sha256: str, written_at: str):
+        self.run_id = run_id
+        self.project_id = project_id
+        self.title = title
+        self.last_child_update = last_child_update
+        self.offset = offset
+        self.length = length
+        self.count = count
+        self.sha256 = sha256
+        self.written_at = written_at
+
+    @classmethod
+    def from_dict(cls, entry_dict: dict):
+        return cls(**{name: entry_dict.get(name) for name in cls.__slots__})
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @property
+    def end(self):
+        return self.offset + self.length
+
+    def __repr__(self):
+        return f"<BackupEntry run={self.run_id} project={self.project_id} points={self.count}>"
+
+
+class BackupReport(object):
+    """
+    What a backup run did
+    """
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.backed_up_project_ids = list()
+        self.skipped_project_ids = list()
+        self.point_count = 0
+        self.bytes_written = 0
+
+    def __repr__(self):
+        return (f"<BackupReport run={self.run_id} backed_up={len(self.backed_up_project_ids)} "
+                f"skipped={len(self.skipped_project_ids)} points={self.point_count} bytes={self.bytes_written}>")
+
+
+class BackupArchive(object):
+    """
+    Append-only points backup in a folder
+    - points.archive.gz holds one gzip member per project per run, each a JSON line per point. Members are only ever
+      appended, so the file as a whole is also a valid gzip stream (zcat works on it)
+    - manifest.jsonl has one line per member: which project and run it's from and where it sits in the archive
+    A member is fsynced before its manifest line is written, so the manifest never points at data that isn't there.
+    Bytes after the last member the manifest knows about are left over from an interrupted run and are cut off before
+    the next append. Nothing the manifest refers to is ever rewritten.
+    """
+    def __init__(self, backup_path: Path):
+        self.backup_path = Path(backup_path)
+        self.archive_path = self.backup_path.joinpath(ARCHIVE_FILE_NAME)
+        self.manifest_path = self.backup_path.joinpath(MANIFEST_FILE_NAME)
+        self._entry_list = None
+
+    def entries(self):
+        """
+        Every manifest entry in the order they were written. A half written last line is ignored
+        """
+        if self._entry_list is None:
+            entry_list = list()
+            try:
+                with open(self.manifest_path, 'r', encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            entry_list.append(BackupEntry.from_dict(json.loads(line)))
+                        except ValueError:
+                            continue
+            except FileNotFoundError:
+                pass
+            self._entry_list = entry_list
+        return self._entry_list
+
+    def latest_entries(self):
+        """
+        {project_id: BackupEntry} of the newest backup of every project in the archive
+        """
+        return {entry.project_id: entry for entry in self.entries()}
+
+    def run_ids(self):
+        return list(dict.fromkeys(entry.run_id for entry in self.entries()))
+
+    def entries_for_run(self, run_id: str):
+        """
+        {project_id: BackupEntry} of the projects as they were when run_id finished, older runs fill in projects
+        run_id didn't need to back up
+        """
+        run_list = self.run_ids()
+        if run_id not in run_list:
+            raise KeyError(f"No backup run {run_id!r} in {self.backup_path}")
+        keep_run_set = set(run_list[:run_list.index(run_id) + 1])
+        entry_dict = dict()
+        for entry in self.entries():
+            if entry.run_id in keep_run_set:
+                entry_dict.update({entry.project_id: entry})
+        return entry_dict
+
+    def needs_backup(self, project, run_id: str, full: bool = False, latest_entry_dict: dict = None):
+        """
+        False if project is already in the archive as it is now. With full every project needs it, except one run_id
+        already backed up (an interrupted run being resumed) that hasn't changed since
+        latest_entry_dict is latest_entries(), pass it in when checking many projects so it's only built once
+        """
+        if latest_entry_dict is None:
+            latest_entry_dict = self.latest_entries()
+        entry = latest_entry_dict.get(project.ProjectId)
+        if entry is None:
+            return True
+        if project.LastChildUpdate is None:
+            return entry.run_id != run_id
+        if entry.last_child_update != project.LastChildUpdate:
+            return True
+        # Unchanged since its latest backup, full still wants a copy in this run
+        return full and entry.run_id != run_id
+
+    def projects_to_back_up(self, projects: list, run_id: str = None, full: bool = False):
+        """
+        The projects backup() would download, in the order given. run_id defaults to today's date like backup()
+        """
+        if run_id is None:
+            run_id = default_run_id()
+        latest_entry_dict = self.latest_entries()
+        return [project for project in projects
+                if self.needs_backup(project, run_id=run_id, full=full, latest_entry_dict=latest_entry_dict)]
+
+    def _open_for_append(self):
+        """
+        Archive opened for appending, with anything past the last manifested member cut off
+        """
+        self.backup_path.mkdir(parents=True, exist_ok=True)
+        end = max((entry.end for entry in self.entries()), default=0)
+        archive_f = open(self.archive_path, 'ab')
+        if archive_f.tell() > end:
+            archive_f.truncate(end)
+            archive_f.seek(end)
+        return archive_f
+
+    def _append_manifest(self, entry: BackupEntry):
+        with open(self.manifest_path, 'ab') as f:
+            # A crash mid line leaves it without a newline, start on a fresh one
+            if f.tell() > 0:
+                with open(self.manifest_path, 'rb') as read_f:
+                    read_f.seek(-1, os.SEEK_END)
+                    if read_f.read(1) != b"\n":
+                        f.write(b"\n")
+            f.write(json.dumps(entry.to_dict()).encode("utf-8") + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.entries().append(entry)
+
+    def append_project(self, archive_f, run_id: str, project, points: list, compresslevel: int = 6):
+        """
+        Write one project's points as a new member and record it in the manifest
+        """
+        body = b"".join(json.dumps(point.to_dict(), separators=(",", ":")).encode("utf-8") + b"\n"
+                        for point in points)
+        member = gzip.compress(body, compresslevel=compresslevel)
+        offset = archive_f.tell()
+        archive_f.write(member)
+        archive_f.flush()
+        os.fsync(archive_f.fileno())
+        entry = BackupEntry(run_id=run_id, project_id=project.ProjectId, title=project.Title,
+                            last_child_update=project.LastChildUpdate, offset=offset, length=len(member),
+                            count=len(points), sha256=hashlib.sha256(member).hexdigest(),
+                            written_at=datetime.now().isoformat(timespec="seconds"))
+        self._append_manifest(entry)
+        return entry
+
+    def backup(self, username: str, password: str, projects: list, run_id: str = None, full: bool = False,
+               max_workers: int = 8, max_per_host: int = 4, console: Console = None, progress_callback=None,
+               sess=None):
+        """
+        Back up the points of every project that changed since it was last archived
+        Projects are downloaded max_workers at a time and appended as each one arrives, by this thread only.
+        Re-running with the same run_id (today's date by default) skips whatever that run already wrote, so an
+        interrupted backup picks up where it stopped. full backs up every project, changed or not.
+        progress_callback, if given, is called with (project_id, entry) after each project is written.
+        """
+        if run_id is None:
+            run_id = default_run_id()
+        report = BackupReport(run_id=run_id)
+        project_dict = {project.ProjectId: project for project in projects}
+        todo_id_list = [project.ProjectId for project in self.projects_to_back_up(projects, run_id=run_id, full=full)]
+        todo_id_set = set(todo_id_list)
+        report.skipped_project_ids.extend(project.ProjectId for project in projects
+                                          if project.ProjectId not in todo_id_set)
+        if not todo_id_list:
+            return report
+
+        with self._open_for_append() as archive_f:
+            for project_id, point_list in AgTerraWrapper.get_points_many(username=username, password=password,
+                                                                         console=console, project_ids=todo_id_list,
+                                                                         max_workers=max_workers,
+                                                                         max_per_host=max_per_host, sess=sess):
+                entry = self.append_project(archive_f, run_id=run_id, project=project_dict.get(project_id),
+                                            points=point_list)
+                report.backed_up_project_ids.append(project_id)
+                report.point_count += entry.count
+                report.bytes_written += entry.length
+                if progress_callback is not None:
+                    progress_callback(project_id, entry)
+        return report
+
+    def read_member(self, entry: BackupEntry, verify: bool = True):
+        """
+        Point dictionaries stored in one member
+        """
+        with open(self.archive_path, 'rb') as f:
+            f.seek(entry.offset)
+            member = f.read(entry.length)
+        if verify and hashlib.sha256(member).hexdigest() != entry.sha256:
+            raise ValueError(f"Backup of project {entry.project_id} from run {entry.run_id} is corrupt")
+        return [json.loads(line) for line in gzip.decompress(member).splitlines() if line]
+
+    def read_points(self, project_id: int, run_id: str = None, verify: bool = True):
+        """
+        Points of a project from the latest backup, or as of run_id. None if the project isn't in the archive
+        """
+        entry_dict = self.latest_entries() if run_id is None else self.entries_for_run(run_id)
+        entry = entry_dict.get(project_id)
+        if entry is None:
+            return None
+        return [Points(raw_data=point_dict) for point_dict in self.read_member(entry, verify=verify)]
@@ -0,0 +1,265 @@
+from abc import ABC, abstractmethod
+import os
+from pathlib import Path
+import pickle
+import sqlite3
+import threading
+from time import time
+
+
+class CacheBackend(ABC):
+    """
+    Interface for somewhere AgTerraWrapper can keep projects, folders and points between runs
+    Every get_* returns None on a miss (nothing cached, or the entry expired) so callers can tell "not cached" from
+    "cached and empty". ttl is in seconds, None means the entry never expires.
+    Backends are opt-in: pass one as cache_backend to AgTerraWrapper or AgTerraClient, without one the wrapper keeps
+    using its pickle files in cache_path.
+    """
+    @abstractmethod
+    def get_projects(self):
+        pass
+
+    @abstractmethod
+    def put_projects(self, projects: list, ttl: float = None):
+        pass
+
+    @abstractmethod
+    def get_project_folders(self):
+        pass
+
+    @abstractmethod
+    def put_project_folders(self, project_folders: list, ttl: float = None):
+        pass
+
+    @abstractmethod
+    def get_points(self, project_id: int):
+        pass
+
+    @abstractmethod
+    def put_points(self, project_id: int, points: list, ttl: float = None):
+        pass
+
+    @abstractmethod
+    def invalidate_points(self, project_id: int):
+        pass
+
+    def close(self):
+        pass
+
+
+class PickleCacheBackend(CacheBackend):
+    """
+    The original one-pickle-per-entity cache folder, behind the CacheBackend interface
+    Files are written atomically and a corrupt or half written pickle counts as a miss instead of crashing the run.
+    A ttl is kept in a small "<file>.expires" file next to the pickle.
+    """
+    def __init__(self, cache_path: Path, project_file_name: str = "project_cache.pickle.py",
+                 project_folder_file_name: str = "project_folder_cache.pickle.py"):
+        self.cache_path = Path(cache_path)
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+        self.project_file_path = Path(os.path.join(self.cache_path, project_file_name))
+        self.project_folder_file_path = Path(os.path.join(self.cache_path, project_folder_file_name))
+
+    def points_file_path(self, project_id: int):
+        return Path(os.path.join(self.cache_path, f"points_cache_{project_id}"))
+
+    def _load(self, path: Path):
+        expires_path = Path(f"{path}.expires")
+        try:
+            if expires_path.exists() and float(expires_path.read_text()) < time():
+                return None
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (EOFError, ValueError, pickle.UnpicklingError):
+            # Half written or corrupt, treat it like it isn't there
+            return None
+
+    def _store(self, path: Path, obj, ttl: float = None):
+        tmp_path = Path(f"{path}.tmp")
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        expires_path = Path(f"{path}.expires")
+        if ttl is None:
+            expires_path.unlink(missing_ok=True)
+        else:
+            expires_path.write_text(str(time() + ttl))
+
+    def get_projects(self):
+        return self._load(self.project_file_path)
+
+    def put_projects(self, projects: list, ttl: float = None):
+        self._store(self.project_file_path, projects, ttl=ttl)
+
+    def get_project_folders(self):
+        return self._load(self.project_folder_file_path)
+
+    def put_project_folders(self, project_folders: list, ttl: float = None):
+        self._store(self.project_folder_file_path, project_folders, ttl=ttl)
+
+    def get_points(self, project_id: int):
+        return self._load(self.points_file_path(project_id))
+
+    def put_points(self, project_id: int, points: list, ttl: float = None):
+        self._store(self.points_file_path(project_id), points, ttl=ttl)
+
+    def invalidate_points(self, project_id: int):
+        self.points_file_path(project_id).unlink(missing_ok=True)
+        Path(f"{self.points_file_path(project_id)}.expires").unlink(missing_ok=True)
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Cache backed by a single SQLite database
+    - Projects, folders and points are stored as indexed rows, so queries like "points of project X with a title
+      LIKE ?" are answered without loading the rest of the tenant
+    - Every write happens in one transaction, a crash never leaves a project half cached
+    - Each project's points, the project list and the folder list carry their own expiry time
+    Safe to share between threads.
+    """
+    _schema = """
+    CREATE TABLE IF NOT EXISTS cache_entries (
+        entry_key TEXT PRIMARY KEY,
+        fetched_at REAL NOT NULL,
+        expires_at REAL
+    );
+    CREATE TABLE IF NOT EXISTS projects (
+        project_id INTEGER PRIMARY KEY,
+        title TEXT,
+        project_folder_id INTEGER,
+        last_child_update TEXT,
+        data BLOB NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS projects_title ON projects (title);
+    CREATE TABLE IF NOT EXISTS project_folders (
+        project_folder_id INTEGER PRIMARY KEY,
+        parent_folder_id INTEGER,
+        folder_name TEXT,
+        data BLOB NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS points (
+        project_id INTEGER NOT NULL,
+        point_id INTEGER NOT NULL,
+        title TEXT,
+        latitude REAL,
+        longitude REAL,
+        item_time TEXT,
+        data BLOB NOT NULL,
+        PRIMARY KEY (project_id, point_id)
+    );
+    CREATE INDEX IF NOT EXISTS points_title ON points (title);
+    CREATE INDEX IF NOT EXISTS points_coordinates ON points (latitude, longitude);
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        with self._lock, self._conn:
+            # WAL lets other processes read while a sync is writing
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(self._schema)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _is_fresh(self, entry_key: str):
+        row = self._conn.execute("SELECT expires_at FROM cache_entries WHERE entry_key = ?", (entry_key,)).fetchone()
+        return row is not None and (row[0] is None or row[0] >= time())
+
+    def _mark_fetched(self, entry_key: str, ttl: float = None):
+        now = time()
+        self._conn.execute("INSERT OR REPLACE INTO cache_entries (entry_key, fetched_at, expires_at) VALUES (?, ?, ?)",
+                           (entry_key, now, None if ttl is None else now + ttl))
+
+    def get_projects(self):
+        with self._lock:
+            if not self._is_fresh("projects"):
+                return None
+            return [pickle.loads(data) for (data,) in
+                    self._conn.execute("SELECT data FROM projects ORDER BY project_id")]
+
+    def put_projects(self, projects: list, ttl: float = None):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM projects")
+            self._conn.executemany("INSERT INTO projects (project_id, title, project_folder_id, last_child_update, "
+                                   "data) VALUES (?, ?, ?, ?, ?)",
+                                   ((project.ProjectId, project.Title, project.ProjectFolderId,
+                                     project.LastChildUpdate, pickle.dumps(project, protocol=pickle.HIGHEST_PROTOCOL))
+                                    for project in projects))
+            self._mark_fetched("projects", ttl=ttl)
+
+    def get_project_folders(self):
+        with self._lock:
+            if not self._is_fresh("project_folders"):
+                return None
+            return [pickle.loads(data) for (data,) in
+                    self._conn.execute("SELECT data FROM project_folders ORDER BY project_folder_id")]
+
+    def put_project_folders(self, project_folders: list, ttl: float = None):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM project_folders")
+            self._conn.executemany("INSERT INTO project_folders (project_folder_id, parent_folder_id, folder_name, "
+                                   "data) VALUES (?, ?, ?, ?)",
+                                   ((folder.ProjectFolderId, folder.ParentFolderId, folder.FolderName,
+                                     pickle.dumps(folder, protocol=pickle.HIGHEST_PROTOCOL))
+                                    for folder in project_folders))
+            self._mark_fetched("project_folders", ttl=ttl)
+
+    def get_points(self, project_id: int):
+        with self._lock:
+            if not self._is_fresh(f"points:{project_id}"):
+                return None
+            return [pickle.loads(data) for (data,) in
+                    self._conn.execute("SELECT data FROM points WHERE project_id = ? ORDER BY point_id",
+                                       (project_id,))]
+
+    def put_points(self, project_id: int, points: list, ttl: float = None):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM points WHERE project_id = ?", (project_id,))
+            self._conn.executemany("INSERT OR REPLACE INTO points (project_id, point_id, title, latitude, longitude, "
+                                   "item_time, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                   ((project_id, point.PointId, point.Title, point.Latitude, point.Longitude,
+                                     point.RawItemTime, pickle.dumps(point, protocol=pickle.HIGHEST_PROTOCOL))
+                                    for point in points))
+            self._mark_fetched(f"points:{project_id}", ttl=ttl)
+
+    def invalidate_points(self, project_id: int):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM points WHERE project_id = ?", (project_id,))
+            self._conn.execute("DELETE FROM cache_entries WHERE entry_key = ?", (f"points:{project_id}",))
+
+    def search_points(self, project_id: int = None, title_like: str = None, include_expired: bool = False):
+        """
+        Cached points matching every filter given, straight from the index
+        title_like uses SQL LIKE syntax, e.g. "%Battery%"
+        """
+        query = "SELECT points.data FROM points"
+        where_list = list()
+        param_list = list()
+        if not include_expired:
+            query += " JOIN cache_entries ON cache_entries.entry_key = 'points:' || points.project_id"
+            where_list.append("(cache_entries.expires_at IS NULL OR cache_entries.expires_at >= ?)")
+            param_list.append(time())
+        if project_id is not None:
+            where_list.append("points.project_id = ?")
+            param_list.append(project_id)
+        if title_like is not None:
+            where_list.append("points.title LIKE ?")
+            param_list.append(title_like)
+        if where_list:
+            query += " WHERE " + " AND ".join(where_list)
+        with self._lock:
+            return [pickle.loads(data) for (data,) in self._conn.execute(query, param_list)]
+
+    def find_project(self, title: str):
+        """
+        Cached Project with exactly this title, or None
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM projects WHERE title = ?", (title,)).fetchone()
+        return None if row is None else pickle.loads(row[0])
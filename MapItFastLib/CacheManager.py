@@ -0,0 +1,183 @@
+import os
+from pathlib import Path
+from time import time, time_ns
+
+# Seconds before a cached entity is considered stale, by entity type
+DEFAULT_MAX_AGE_DICT = {"points": 7 * 24 * 3600, "projects": 24 * 3600, "project_folders": 24 * 3600,
+                        "http": 7 * 24 * 3600}
+# Leftover temporary files older than this are from a crashed write
+STALE_TMP_AGE = 3600
+
+
+def entity_type_for(path: Path):
+    """
+    Which kind of cached entity a file in the cache folder holds, from its name
+    """
+    name = Path(path).name
+    if name.endswith(".tmp"):
+        return "tmp"
+    if name.endswith(".expires"):
+        return "sidecar"
+    if name.startswith("http_cache_"):
+        return "http"
+    if name.startswith("points_cache_"):
+        return "points"
+    if name.startswith("project_folder_cache"):
+        return "project_folders"
+    if name.startswith("project_cache"):
+        return "projects"
+    return "other"
+
+
+def is_fresh(path: Path, max_age: float = None):
+    """
+    True if path exists and was written less than max_age seconds ago. No max_age means any age will do
+    """
+    try:
+        modified_at = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return False
+    return max_age is None or time() - modified_at <= max_age
+
+
+def mark_used(path: Path):
+    """
+    Record a cache hit for LRU eviction. Only the access time moves, the modified time still dates the data
+    Times are set in nanoseconds, a float would round st_mtime_ns and look like a new version of the file
+    """
+    try:
+        stat_result = os.stat(path)
+        os.utime(path, ns=(time_ns(), stat_result.st_mtime_ns))
+    except FileNotFoundError:
+        pass
+
+
+def mark_verified(path: Path):
+    """
+    Record that the data at path was checked against the server and is still current, restarting its max age
+    """
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+class CacheEntry(object):
+    """
+    One file in the cache folder
+    """
+    def __init__(self, path: Path, stat_result: os.stat_result):
+        self.path = path
+        self.entity_type = entity_type_for(path)
+        self.size = stat_result.st_size
+        self.modified_at = stat_result.st_mtime
+        # Explicit utime calls keep this current even on noatime/relatime mounts
+        self.last_used = max(stat_result.st_atime, stat_result.st_mtime)
+
+    @property
+    def sidecar_paths(self):
+        return [Path(f"{self.path}.expires")]
+
+
+class CacheManager(object):
+    """
+    Keep the pickle cache folder from growing forever
+    - Entries older than the max age for their entity type are stale and get pruned
+    - If the folder is still over max_bytes, least recently used entries go next
+    Files the manager doesn't recognise (an SQLite cache, say) are counted but never deleted.
+    """
+    def __init__(self, cache_path: Path, max_age_dict: dict = None, max_bytes: int = None):
+        self.cache_path = Path(cache_path)
+        self.max_age_dict = dict(DEFAULT_MAX_AGE_DICT)
+        if max_age_dict is not None:
+            self.max_age_dict.update(max_age_dict)
+        self.max_bytes = max_bytes
+
+    def entries(self):
+        """
+        Every file in the cache folder as a CacheEntry
+        """
+        entry_list = list()
+        if not self.cache_path.exists():
+            return entry_list
+        with os.scandir(self.cache_path) as dir_iter:
+            for dir_entry in dir_iter:
+                if dir_entry.is_file(follow_symlinks=False):
+                    entry_list.append(CacheEntry(path=Path(dir_entry.path), stat_result=dir_entry.stat()))
+        return entry_list
+
+    def is_stale(self, entry: CacheEntry, now: float = None):
+        if now is None:
+            now = time()
+        if entry.entity_type == "tmp":
+            return now - entry.modified_at > STALE_TMP_AGE
+        max_age = self.max_age_dict.get(entry.entity_type)
+        return max_age is not None and now - entry.modified_at > max_age
+
+    def stats(self):
+        """
+        {entity_type: {"count", "bytes", "stale", "oldest", "newest"}} plus a "total" row
+        """
+        now = time()
+        stats_dict = dict()
+        total_dict = {"count": 0, "bytes": 0, "stale": 0, "oldest": None, "newest": None}
+        for entry in self.entries():
+            for type_dict in (stats_dict.setdefault(entry.entity_type, {"count": 0, "bytes": 0, "stale": 0,
+                                                                         "oldest": None, "newest": None}),
+                              total_dict):
+                type_dict["count"] += 1
+                type_dict["bytes"] += entry.size
+                if self.is_stale(entry, now=now):
+                    type_dict["stale"] += 1
+                if type_dict["oldest"] is None or entry.modified_at < type_dict["oldest"]:
+                    type_dict["oldest"] = entry.modified_at
+                if type_dict["newest"] is None or entry.modified_at > type_dict["newest"]:
+                    type_dict["newest"] = entry.modified_at
+        stats_dict.update({"total": total_dict})
+        return stats_dict
+
+    def prune(self, dry_run: bool = False):
+        """
+        Delete stale entries, then evict least recently used entries until the folder fits in max_bytes
+        Returns the list of CacheEntry objects removed (or that would be, with dry_run)
+        """
+        now = time()
+        removed_list = list()
+        entry_list = self.entries()
+        # Sidecars go with the entry they describe
+        live_entry_list = [entry for entry in entry_list if entry.entity_type != "sidecar"]
+        sidecar_size_dict = {entry.path: entry.size for entry in entry_list if entry.entity_type == "sidecar"}
+
+        def entry_size(entry: CacheEntry):
+            return entry.size + sum(sidecar_size_dict.get(sidecar, 0) for sidecar in entry.sidecar_paths)
+
+        for entry in entry_list:
+            if entry.entity_type == "sidecar" and not Path(str(entry.path)[:-len(".expires")]).exists():
+                # The entry it described is already gone
+                removed_list.append(entry)
+
+        kept_list = list()
+        for entry in live_entry_list:
+            if self.is_stale(entry, now=now):
+                removed_list.append(entry)
+            else:
+                kept_list.append(entry)
+
+        if self.max_bytes is not None:
+            total_bytes = sum(entry_size(entry) for entry in kept_list)
+            evictable_list = sorted((entry for entry in kept_list if entry.entity_type in self.max_age_dict),
+                                    key=lambda entry: entry.last_used)
+            for entry in evictable_list:
+                if total_bytes <= self.max_bytes:
+                    break
+                removed_list.append(entry)
+                total_bytes -= entry_size(entry)
+
+        if not dry_run:
+            for entry in removed_list:
+                for path in [entry.path] + entry.sidecar_paths:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+        return removed_list
@@ -0,0 +1,107 @@
+import os
+from pathlib import Path
+
+from rich.console import Console
+
+from .Cache import CacheBackend
+from .Uploader import PointUploader
+from .Utils import AgTerraAPI, AgTerraWrapper
+
+class AgTerraClient(object):
+    """
+    Stateful version of AgTerraWrapper
+    One authenticated session, and with it one keep-alive connection pool, lives as long as the client does. Every
+    call reuses it, so a run that makes thousands of requests pays for the TLS handshakes once instead of per call.
+    With http_cache_path, GETs are conditional and unchanged responses come from disk (see CachingHTTPAdapter).
+    Use it as a context manager, or call close() when done.
+    """
+    def __init__(self, username: str, password: str, console: Console = None, cache_path: Path = None,
+                 pool_maxsize: int = 10, headless: bool = False, cache_backend: CacheBackend = None,
+                 http_cache_path: Path = None):
+        self.username = username
+        self.password = password
+        self.console = console
+        self.cache_path = None if cache_path is None else Path(cache_path)
+        self.pool_maxsize = pool_maxsize
+        self.headless = headless or console is None
+        self.cache_backend = cache_backend
+        self.sess = AgTerraAPI.build_session(username=username, password=password, pool_maxsize=pool_maxsize,
+                                             http_cache_path=http_cache_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def close(self):
+        self.sess.close()
+
+    def _wrapper_kwargs(self, kwargs: dict, cached: bool = True):
+        """
+        Fill in everything the wrapper needs that the client already knows
+        cached is False for wrapper calls that skip the cache and take no cache_backend
+        """
+        wrapper_kwargs = {"username": self.username, "password": self.password, "console": self.console,
+                          "sess": self.sess}
+        if cached and self.cache_backend is not None:
+            wrapper_kwargs.update({"cache_backend": self.cache_backend})
+        wrapper_kwargs.update(kwargs)
+        return wrapper_kwargs
+
+    def _ui_kwargs(self, kwargs: dict):
+        wrapper_kwargs = self._wrapper_kwargs(kwargs)
+        wrapper_kwargs.setdefault("headless", self.headless)
+        return wrapper_kwargs
+
+    def get_projects(self, cache_path: Path = None, **kwargs):
+        """
+        AgTerraWrapper.get_projects, cached in the client's cache folder unless cache_path is given. A client without
+        a cache folder always asks the server
+        """
+        if cache_path is None and self.cache_path is not None:
+            cache_path = Path(os.path.join(self.cache_path, "project_cache.pickle.py"))
+        return AgTerraWrapper.get_projects(cache_path=cache_path, **self._ui_kwargs(kwargs))
+
+    def get_project_folders(self, **kwargs):
+        return AgTerraWrapper.get_project_folders(cache_path=self.cache_path, **self._ui_kwargs(kwargs))
+
+    def get_points(self, project_id: int, **kwargs):
+        return AgTerraWrapper.get_points(project_id=project_id, cache_path=self.cache_path, **self._ui_kwargs(kwargs))
+
+    def get_points_many(self, project_ids: list, **kwargs):
+        """
+        AgTerraWrapper.get_points_many over the client's session. Concurrency is capped by the pool size
+        """
+        kwargs.setdefault("cache_path", self.cache_path)
+        kwargs.setdefault("max_per_host", self.pool_maxsize)
+        return AgTerraWrapper.get_points_many(project_ids=project_ids, **self._wrapper_kwargs(kwargs))
+
+    def iter_points(self, project_id: int, **kwargs):
+        return AgTerraWrapper.iter_points(project_id=project_id, **self._wrapper_kwargs(kwargs, cached=False))
+
+    def post_points(self, project_id: int, title: str, description: str, longitude: float, latitude: float,
+                    itemtime: str = None, elevation: int = 0, icon_id: int = 3,
+                    url: str = f"https://mapitfast.agterra.com/api/Points"):
+        """
+        Post a single point over the client's session
+        """
+        point_dict = PointUploader.build_point_dict(project_id=project_id, title=title, latitude=latitude,
+                                                    longitude=longitude, description=description, icon_id=icon_id,
+                                                    elevation=elevation, itemtime=itemtime)
+        return AgTerraAPI.post_points(sess=self.sess, console=self.console, point_dict=point_dict, url=url)
+
+    def uploader(self, **kwargs):
+        """
+        PointUploader sharing the client's session. max_in_flight defaults to the pool size so no upload waits on a
+        connection
+        """
+        kwargs.setdefault("max_in_flight", self.pool_maxsize)
+        return PointUploader(sess=self.sess, console=self.console, **kwargs)
+
+    def upload_points(self, point_dicts, progress_callback=None, **kwargs):
+        """
+        Upload many points at once, see PointUploader.upload
+        """
+        return self.uploader(**kwargs).upload(point_dicts, progress_callback=progress_callback)
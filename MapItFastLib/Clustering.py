@@ -0,0 +1,189 @@
+import csv
+from datetime import datetime
+from difflib import SequenceMatcher
+import re
+
+from .PointIndex import PointIndex, haversine_m
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_title(title: str):
+    """
+    Lower case with runs of whitespace collapsed, "Smith  #12 " and "smith #12" are the same pin
+    """
+    if not title:
+        return ""
+    return _WHITESPACE_RE.sub(" ", title).strip().lower()
+
+
+def title_similarity(title_1: str, title_2: str):
+    """
+    0.0 (nothing in common) to 1.0 (same title once normalised)
+    """
+    title_1 = normalize_title(title_1)
+    title_2 = normalize_title(title_2)
+    if title_1 == title_2:
+        return 1.0
+    if not title_1 or not title_2:
+        return 0.0
+    return SequenceMatcher(None, title_1, title_2).ratio()
+
+
+def default_survivor_key(point):
+    """
+    Which point of a duplicate group to keep: the one with the most forms filled in, then the most recent, then the
+    one with the longest description, then the oldest PointId
+    """
+    try:
+        item_time = point.ItemTime or datetime.min
+    except (TypeError, ValueError):
+        item_time = datetime.min
+    return (len(point.Forms or ()), item_time, len(point.Description or ""),
+            -(point.PointId if point.PointId is not None else 0))
+
+
+class DuplicateGroup(object):
+    """
+    Points that are all the same pin, and the one suggested to keep
+    """
+    def __init__(self, points: list, survivor):
+        self.points = points
+        self.survivor = survivor
+
+    @property
+    def duplicates(self):
+        """
+        Every point in the group except the survivor
+        """
+        return [point for point in self.points if point is not self.survivor]
+
+    @property
+    def max_distance_m(self):
+        """
+        Distance from the survivor to the furthest point of the group
+        """
+        return max(haversine_m(self.survivor.Latitude, self.survivor.Longitude, point.Latitude, point.Longitude)
+                   for point in self.points)
+
+    def __len__(self):
+        return len(self.points)
+
+    def __repr__(self):
+        return f"<DuplicateGroup size={len(self.points)} survivor={self.survivor.PointId}>"
+
+
+class DuplicateReport(object):
+    """
+    Result of a clustering run
+    """
+    def __init__(self, groups: list, point_count: int):
+        self.groups = groups
+        self.point_count = point_count
+
+    @property
+    def duplicate_count(self):
+        """
+        Points that could be removed if every group was reduced to its survivor
+        """
+        return sum(len(group) - 1 for group in self.groups)
+
+    def rows(self):
+        """
+        One dictionary per point in a group, survivor first
+        """
+        for group_number, group in enumerate(self.groups, start=1):
+            for point in [group.survivor] + group.duplicates:
+                yield {"Group": group_number, "Keep": point is group.survivor, "PointId": point.PointId,
+                       "ProjectId": point.ProjectId, "Title": point.Title, "Latitude": point.Latitude,
+                       "Longitude": point.Longitude, "ItemTime": point.RawItemTime,
+                       "DistanceFromSurvivorM": round(haversine_m(group.survivor.Latitude, group.survivor.Longitude,
+                                                                  point.Latitude, point.Longitude), 2)}
+
+    def write_csv(self, csv_path: str):
+        with open(csv_path, 'w', newline="") as csv_f:
+            writer = csv.DictWriter(csv_f, fieldnames=["Group", "Keep", "PointId", "ProjectId", "Title", "Latitude",
+                                                       "Longitude", "ItemTime", "DistanceFromSurvivorM"])
+            writer.writeheader()
+            writer.writerows(self.rows())
+
+
+class PointClusterer(object):
+    """
+    Group near-duplicate points
+    Two points are duplicates when they're within tolerance_m metres of each other and their titles are at least
+    min_title_similarity alike (0 ignores titles). Groups are joined transitively, if A matches B and B matches C all
+    three are one group. Neighbours are found through a PointIndex grid, so the work grows with the number of points,
+    not the square of it.
+    """
+    def __init__(self, tolerance_m: float = 5.0, min_title_similarity: float = 0.8, survivor_key=None):
+        if tolerance_m < 0:
+            raise ValueError(f"tolerance_m can't be negative, got {tolerance_m}")
+        self.tolerance_m = tolerance_m
+        self.min_title_similarity = min_title_similarity
+        self.survivor_key = default_survivor_key if survivor_key is None else survivor_key
+
+    def is_match(self, point_1, point_2):
+        if self.min_title_similarity <= 0:
+            return True
+        return title_similarity(point_1.Title, point_2.Title) >= self.min_title_similarity
+
+    def _nearby(self, point_index: PointIndex, point):
+        if self.tolerance_m == 0:
+            return point_index.find_exact(point.Latitude, point.Longitude)
+        return [item for distance_m, item in point_index.find_nearby(point.Latitude, point.Longitude)]
+
+    def cluster(self, points):
+        """
+        DuplicateReport of every group of two or more near-duplicate points, biggest group first
+        Points without coordinates are never duplicates
+        """
+        points = list(points)
+        point_list = [point for point in points if point.Latitude is not None and point.Longitude is not None]
+        point_index = PointIndex(tolerance_m=self.tolerance_m)
+        for position, point in enumerate(point_list):
+            point_index.add(position, latitude=point.Latitude, longitude=point.Longitude)
+
+        # Union-find over list positions
+        parent_list = list(range(len(point_list)))
+
+        def find(position: int):
+            while parent_list[position] != position:
+                parent_list[position] = parent_list[parent_list[position]]
+                position = parent_list[position]
+            return position
+
+        for position, point in enumerate(point_list):
+            for other_position in self._nearby(point_index, point):
+                # Each pair only needs checking once
+                if other_position <= position:
+                    continue
+                root, other_root = find(position), find(other_position)
+                if root != other_root and self.is_match(point, point_list[other_position]):
+                    parent_list[other_root] = root
+
+        member_dict = dict()
+        for position, point in enumerate(point_list):
+            member_dict.setdefault(find(position), list()).append(point)
+        group_list = [DuplicateGroup(points=members, survivor=max(members, key=self.survivor_key))
+                      for members in member_dict.values() if len(members) > 1]
+        group_list.sort(key=lambda group: -len(group))
+        return DuplicateReport(groups=group_list, point_count=len(points))
+
+    def filter_new(self, candidates, existing):
+        """
+        The candidates that don't duplicate a point in existing or a candidate already accepted, in order
+        """
+        point_index = PointIndex(tolerance_m=self.tolerance_m)
+        for point in existing:
+            point_index.add(point)
+        new_list = list()
+        for candidate in candidates:
+            if candidate.Latitude is None or candidate.Longitude is None:
+                new_list.append(candidate)
+                continue
+            if any(self.is_match(candidate, point) for point in self._nearby(point_index, candidate)):
+                continue
+            new_list.append(candidate)
+            point_index.add(candidate)
+        return new_list
@@ -0,0 +1,394 @@
+from csv import DictReader
+from math import isfinite
+import queue
+import threading
+
+from rich.console import Console
+
+from .PointIndex import PointIndex
+from .Uploader import PointUploader
+
+# Destination every row goes to when no router is given
+DEFAULT_DESTINATION = "default"
+# Row errors kept on the report, the count keeps going past it
+MAX_KEPT_ERRORS = 1000
+
+
+class ColumnMapping(object):
+    """
+    Which CSV column holds which point field
+    latitude and longitude are required, every other column is optional and left blank (or at the point default)
+    when it's None or missing from the file.
+    """
+    def __init__(self, latitude: str = "Latitude", longitude: str = "Longitude", title: str = "Title",
+                 description: str = "Description", icon_id: str = None, elevation: str = None, itemtime: str = None):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.title = title
+        self.description = description
+        self.icon_id = icon_id
+        self.elevation = elevation
+        self.itemtime = itemtime
+
+    @classmethod
+    def from_dict(cls, mapping_dict: dict):
+        return cls(**mapping_dict)
+
+    def missing_columns(self, fieldnames):
+        """
+        Required columns the CSV header doesn't have
+        """
+        fieldname_set = set(fieldnames or ())
+        return [column for column in (self.latitude, self.longitude) if column not in fieldname_set]
+
+    def __repr__(self):
+        return f"<ColumnMapping latitude={self.latitude!r} longitude={self.longitude!r} title={self.title!r}>"
+
+
+class ImportRow(object):
+    """
+    A CSV row that passed validation, with its point fields pulled out and the destination it was routed to
+    """
+    __slots__ = ("line_number", "Latitude", "Longitude", "Title", "Description", "IconId", "Elevation", "ItemTime",
+                 "raw", "destination")
+
+    def __init__(self, line_number: int, latitude: float, longitude: float, title: str = "", description: str = "",
+                 icon_id: int = 3, elevation: int = 0, itemtime: str = None, raw: dict = None,
+                 destination=DEFAULT_DESTINATION):
+        self.line_number = line_number
+        self.Latitude = latitude
+        self.Longitude = longitude
+        self.Title = title
+        self.Description = description
+        self.IconId = icon_id
+        self.Elevation = elevation
+        self.ItemTime = itemtime
+        self.raw = raw
+        self.destination = destination
+
+    def to_point_dict(self, project_id: int):
+        return PointUploader.build_point_dict(project_id=project_id, title=self.Title, latitude=self.Latitude,
+                                              longitude=self.Longitude, description=self.Description,
+                                              icon_id=self.IconId, elevation=self.Elevation, itemtime=self.ItemTime)
+
+    def __repr__(self):
+        return f"<ImportRow line={self.line_number} title={self.Title!r} destination={self.destination!r}>"
+
+
+class RowError(object):
+    """
+    A CSV row that was rejected, or failed to upload, and why
+    """
+    __slots__ = ("line_number", "message", "raw")
+
+    def __init__(self, line_number: int, message: str, raw: dict = None):
+        self.line_number = line_number
+        self.message = message
+        self.raw = raw
+
+    def __repr__(self):
+        return f"<RowError line={self.line_number} {self.message!r}>"
+
+
+class DestinationStats(object):
+    """
+    Counts for one destination of an import
+    """
+    __slots__ = ("routed", "duplicates", "uploaded", "failed")
+
+    def __init__(self):
+        self.routed = 0
+        self.duplicates = 0
+        self.uploaded = 0
+        self.failed = 0
+
+    def __repr__(self):
+        return (f"<DestinationStats routed={self.routed} duplicates={self.duplicates} uploaded={self.uploaded} "
+                f"failed={self.failed}>")
+
+
+class ImportReport(object):
+    """
+    What an import did with every row of the file
+    """
+    def __init__(self):
+        self.row_count = 0
+        self.invalid_count = 0
+        self.unrouted_count = 0
+        self.errors = list()
+        self.destinations = dict()
+
+    def stats(self, destination):
+        stats = self.destinations.get(destination)
+        if stats is None:
+            stats = DestinationStats()
+            self.destinations.update({destination: stats})
+        return stats
+
+    def add_error(self, row_error: RowError, invalid: bool = True):
+        """
+        Keep row_error for the report. invalid counts it as a rejected row, upload failures are counted by
+        DestinationStats.failed instead
+        """
+        if invalid:
+            self.invalid_count += 1
+        if len(self.errors) < MAX_KEPT_ERRORS:
+            self.errors.append(row_error)
+
+    def __repr__(self):
+        return (f"<ImportReport rows={self.row_count} invalid={self.invalid_count} unrouted={self.unrouted_count} "
+                f"destinations={self.destinations}>")
+
+
+class PrefixRouter(object):
+    """
+    Route rows by what a column starts with, optionally only rows whose other columns hold one of a set of values
+    Usage, the Chevron split:
+    PrefixRouter("REPORT CENTER", {"4": "priority_3", "8": "batteries"},
+                 where={"JOB STATUS": ("SCHEDULED", "AWAITING SCHEDULE")})
+    Rows matching no prefix, or filtered out by where, route to None and are skipped.
+    """
+    def __init__(self, column: str, prefix_dict: dict, where: dict = None):
+        self.column = column
+        # Longest prefix first, so "41" wins over "4"
+        self.prefix_list = sorted(prefix_dict.items(), key=lambda item: -len(item[0]))
+        self.where = {column: frozenset(values) for column, values in (where or dict()).items()}
+
+    def __call__(self, row: dict):
+        for column, value_set in self.where.items():
+            if row.get(column) not in value_set:
+                return None
+        value = (row.get(self.column) or "").strip()
+        for prefix, destination in self.prefix_list:
+            if value.startswith(prefix):
+                return destination
+        return None
+
+
+def _parse_coordinate(value, low: float, high: float):
+    """
+    Float between low and high, None if value isn't one
+    """
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not isfinite(number) or number < low or number > high:
+        return None
+    return number
+
+
+class ImportPipeline(object):
+    """
+    Stream a CSV of pins through mapping, validation, routing and de-duplication into PointUploader
+    - A background thread parses the file chunk_size rows at a time into a queue at most queue_chunks deep
+    - The caller's thread validates, routes and checks each row against its destination's PointIndex
+    - PointUploader pulls rows from that generator as upload slots free up
+    All three stages run at once and only a few chunks are ever held in memory, however big the file is.
+    router is any callable taking the raw row dictionary and returning a destination (None skips the row).
+    validators are callables taking the raw row dictionary and returning an error message, or None if it's fine.
+    """
+    def __init__(self, mapping: ColumnMapping = None, router=None, validators=(), chunk_size: int = 500,
+                 queue_chunks: int = 4, allow_null_island: bool = False, encoding: str = "utf-8-sig"):
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size must be at least 1, got {chunk_size}")
+        self.mapping = ColumnMapping() if mapping is None else mapping
+        self.router = router
+        self.validators = tuple(validators)
+        self.chunk_size = chunk_size
+        self.queue_chunks = queue_chunks
+        self.allow_null_island = allow_null_island
+        self.encoding = encoding
+
+    def iter_chunks(self, csv_path: str):
+        """
+        Lists of (line_number, row dictionary), chunk_size long, read straight from the file
+        Raises ValueError if the header is missing a required column
+        """
+        with open(csv_path, 'r', encoding=self.encoding, newline="") as csv_f:
+            dict_reader = DictReader(csv_f)
+            missing_list = self.mapping.missing_columns(dict_reader.fieldnames)
+            if missing_list:
+                raise ValueError(f"{csv_path} has no {', '.join(missing_list)} column, "
+                                 f"it has {', '.join(dict_reader.fieldnames or ())}")
+            chunk = list()
+            for row in dict_reader:
+                chunk.append((dict_reader.line_num, row))
+                if len(chunk) >= self.chunk_size:
+                    yield chunk
+                    chunk = list()
+            if chunk:
+                yield chunk
+
+    def _iter_chunks_in_background(self, csv_path: str):
+        """
+        iter_chunks run on its own thread, so parsing the next chunks overlaps with working on this one
+        """
+        chunk_queue = queue.Queue(maxsize=self.queue_chunks)
+        stop_event = threading.Event()
+        done = object()
+
+        def put(item):
+            # Give up if the consumer went away, rather than block on a full queue forever
+            while not stop_event.is_set():
+                try:
+                    chunk_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def parse():
+            try:
+                for chunk in self.iter_chunks(csv_path):
+                    if not put(chunk):
+                        return
+                put(done)
+            except Exception as e:
+                put(e)
+
+        parse_thread = threading.Thread(target=parse, name="csv-import-parse", daemon=True)
+        parse_thread.start()
+        try:
+            while True:
+                item = chunk_queue.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop_event.set()
+            parse_thread.join()
+
+    def to_import_row(self, line_number: int, row: dict):
+        """
+        ImportRow for a raw row, or a RowError if it doesn't pass validation
+        """
+        mapping = self.mapping
+        latitude = _parse_coordinate(row.get(mapping.latitude), -90.0, 90.0)
+        if latitude is None:
+            return RowError(line_number, f"Bad latitude {row.get(mapping.latitude)!r}", raw=row)
+        longitude = _parse_coordinate(row.get(mapping.longitude), -180.0, 180.0)
+        if longitude is None:
+            return RowError(line_number, f"Bad longitude {row.get(mapping.longitude)!r}", raw=row)
+        if latitude == 0 and longitude == 0 and not self.allow_null_island:
+            return RowError(line_number, f"Coordinates are 0, 0", raw=row)
+        for validator in self.validators:
+            message = validator(row)
+            if message:
+                return RowError(line_number, message, raw=row)
+
+        import_row = ImportRow(line_number=line_number, latitude=latitude, longitude=longitude, raw=row)
+        if mapping.title is not None:
+            import_row.Title = (row.get(mapping.title) or "").strip()
+        if mapping.description is not None:
+            import_row.Description = row.get(mapping.description) or ""
+        try:
+            if mapping.icon_id is not None and row.get(mapping.icon_id):
+                import_row.IconId = int(row.get(mapping.icon_id))
+            if mapping.elevation is not None and row.get(mapping.elevation):
+                import_row.Elevation = float(row.get(mapping.elevation))
+        except ValueError as e:
+            return RowError(line_number, f"Bad number, {e}", raw=row)
+        if mapping.itemtime is not None and row.get(mapping.itemtime):
+            import_row.ItemTime = row.get(mapping.itemtime)
+        return import_row
+
+    def iter_rows(self, csv_path: str, report: ImportReport = None):
+        """
+        Every row that passes validation and routes somewhere, as ImportRow objects, in file order
+        """
+        if report is None:
+            report = ImportReport()
+        for chunk in self._iter_chunks_in_background(csv_path):
+            for line_number, row in chunk:
+                report.row_count += 1
+                import_row = self.to_import_row(line_number, row)
+                if isinstance(import_row, RowError):
+                    report.add_error(import_row)
+                    continue
+                destination = DEFAULT_DESTINATION if self.router is None else self.router(row)
+                if destination is None:
+                    report.unrouted_count += 1
+                    continue
+                import_row.destination = destination
+                report.stats(destination).routed += 1
+                yield import_row
+
+    def iter_new_rows(self, csv_path: str, point_indexes: dict, report: ImportReport = None, on_duplicate=None):
+        """
+        iter_rows without the rows that are already in their destination
+        point_indexes is {destination: PointIndex of what's already there}, a destination without one isn't checked.
+        Rows let through are added to their index, so a pin listed twice in the file is only kept once.
+        on_duplicate, if given, is called with each ImportRow that's skipped.
+        """
+        if report is None:
+            report = ImportReport()
+        for import_row in self.iter_rows(csv_path, report=report):
+            point_index = point_indexes.get(import_row.destination)
+            if point_index is not None:
+                if point_index.contains(import_row.Latitude, import_row.Longitude):
+                    report.stats(import_row.destination).duplicates += 1
+                    if on_duplicate is not None:
+                        on_duplicate(import_row)
+                    continue
+                point_index.add(import_row)
+            yield import_row
+
+    def upload(self, csv_path: str, destinations: dict, sess, console: Console, point_indexes: dict = None,
+               dry_run: bool = False, progress_callback=None, on_duplicate=None, **uploader_kwargs):
+        """
+        Import the whole file, returns an ImportReport
+        destinations is {destination: project ID}, rows routed anywhere else count as unrouted.
+        point_indexes is as for iter_new_rows. With dry_run nothing is uploaded, rows that would be are counted as
+        uploaded. progress_callback, if given, is called with each UploadResult, or each ImportRow on a dry run.
+        """
+        report = ImportReport()
+        point_indexes = dict() if point_indexes is None else point_indexes
+
+        def point_dict_iter():
+            for import_row in self.iter_new_rows(csv_path, point_indexes=point_indexes, report=report,
+                                                 on_duplicate=on_duplicate):
+                project_id = destinations.get(import_row.destination)
+                if project_id is None:
+                    report.stats(import_row.destination).routed -= 1
+                    report.unrouted_count += 1
+                    continue
+                if dry_run:
+                    report.stats(import_row.destination).uploaded += 1
+                    if progress_callback is not None:
+                        progress_callback(import_row)
+                    continue
+                yield import_row.to_point_dict(project_id)
+
+        if dry_run:
+            for _ in point_dict_iter():
+                pass
+            return report
+
+        destination_by_project_id = {project_id: destination for destination, project_id in destinations.items()}
+
+        def on_result(result):
+            stats = report.stats(destination_by_project_id.get(result.point_dict.get("ProjectID")))
+            if result.ok:
+                stats.uploaded += 1
+            else:
+                stats.failed += 1
+                report.add_error(RowError(None, f"Upload of {result.point_dict.get('Title')!r} failed with status "
+                                                f"{result.status_code}: {result.error}", raw=result.point_dict),
+                                 invalid=False)
+            if progress_callback is not None:
+                progress_callback(result)
+
+        uploader = PointUploader(sess=sess, console=console, **uploader_kwargs)
+        uploader.upload(point_dict_iter(), progress_callback=on_result, keep_results=False)
+        return report
+
+
+def build_point_indexes(points_by_destination: dict, tolerance_m: float = 0.0):
+    """
+    {destination: PointIndex} from {destination: [Points]}
+    """
+    return {destination: PointIndex.from_points(points, tolerance_m=tolerance_m)
+            for destination, points in points_by_destination.items()}
@@ -0,0 +1,190 @@
+import hashlib
+import json
+
+import numpy as np
+
+# Fields that differ between copies of the same submission
+DEFAULT_SKIP_FIELDS = ("_ID",)
+# splitmix64 constants, used to derive one independent hash function per MinHash permutation
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+
+def _canonical_value(value, normalize_strings: bool):
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold() if normalize_strings else value
+    if isinstance(value, (dict, list)):
+        # Nested answers (repeating sections, photo lists) compare by content, key order doesn't matter
+        return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return value
+
+
+def _mix64(value: np.ndarray):
+    """
+    splitmix64 finaliser, spreads every input bit over the whole 64 bit output. Wraps around on purpose
+    """
+    with np.errstate(over="ignore"):
+        value = (value ^ (value >> np.uint64(30))) * _MIX_1
+        value = (value ^ (value >> np.uint64(27))) * _MIX_2
+    return value ^ (value >> np.uint64(31))
+
+
+def canonicalize(record: dict, skip_fields=DEFAULT_SKIP_FIELDS, normalize_strings: bool = False):
+    """
+    Record as a sorted tuple of (field, value) pairs, ready to compare or hash
+    Skipped fields and empty (None) answers are left out, a missing field and a blank one are the same answer.
+    """
+    return tuple(sorted((key, _canonical_value(value, normalize_strings)) for key, value in record.items()
+                        if key not in skip_fields and value is not None))
+
+
+def record_hash(record: dict, skip_fields=DEFAULT_SKIP_FIELDS, normalize_strings: bool = False):
+    """
+    Digest of the canonical record, two records with the same digest are duplicates
+    """
+    canonical_text = json.dumps(canonicalize(record, skip_fields=skip_fields, normalize_strings=normalize_strings),
+                                separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonical_text.encode("utf-8"), digest_size=16).digest()
+
+
+class FormDuplicateGroup(object):
+    """
+    Form records that are copies of each other. survivor is the one to keep, the first submitted
+    """
+    def __init__(self, records: list, id_field: str = "_ID"):
+        self.records = records
+        self.id_field = id_field
+        self.survivor = records[0]
+
+    @property
+    def duplicates(self):
+        return self.records[1:]
+
+    @property
+    def duplicate_ids(self):
+        return [record.get(self.id_field) for record in self.duplicates]
+
+    def __len__(self):
+        return len(self.records)
+
+    def __repr__(self):
+        return f"<FormDuplicateGroup size={len(self.records)} survivor={self.survivor.get(self.id_field)}>"
+
+
+class FormDeduper(object):
+    """
+    Find duplicate form submissions without comparing every record with every other one
+    - exact_groups hashes each canonical record once and groups equal hashes, one pass over the records
+    - near_groups uses MinHash signatures over each record's field=value pairs and locality sensitive hashing to only
+      compare records likely to be alike, for copies where a field or two was edited
+    Records are put in submission order (by id_field, when every record has a numeric one) so the first one submitted
+    ends up as each group's survivor.
+    """
+    def __init__(self, skip_fields=DEFAULT_SKIP_FIELDS, id_field: str = "_ID", normalize_strings: bool = False):
+        self.skip_fields = frozenset(skip_fields)
+        self.id_field = id_field
+        self.normalize_strings = normalize_strings
+
+    def _sorted_records(self, records):
+        """
+        Records in submission order if they carry an ID, otherwise as given
+        """
+        record_list = list(records)
+        if record_list and all(isinstance(record.get(self.id_field), (int, float)) for record in record_list):
+            record_list.sort(key=lambda record: record.get(self.id_field))
+        return record_list
+
+    def exact_groups(self, records):
+        """
+        Groups of two or more records identical apart from the skipped fields, biggest first
+        """
+        group_dict = dict()
+        for record in self._sorted_records(records):
+            digest = record_hash(record, skip_fields=self.skip_fields, normalize_strings=self.normalize_strings)
+            group_dict.setdefault(digest, list()).append(record)
+        group_list = [FormDuplicateGroup(records=group_records, id_field=self.id_field)
+                      for group_records in group_dict.values() if len(group_records) > 1]
+        group_list.sort(key=lambda group: -len(group))
+        return group_list
+
+    def _shingles(self, record: dict):
+        return {f"{key}={value}" for key, value in
+                canonicalize(record, skip_fields=self.skip_fields, normalize_strings=self.normalize_strings)}
+
+    @staticmethod
+    def _shingle_hashes(shingle_set: set):
+        return np.fromiter((int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(),
+                                           "little") for shingle in shingle_set),
+                           dtype=np.uint64, count=len(shingle_set))
+
+    def near_groups(self, records, threshold: float = 0.8, num_perm: int = 64, bands: int = 16, seed: int = 1):
+        """
+        Groups of records whose field=value sets overlap by at least threshold (Jaccard), biggest first
+        num_perm must be a multiple of bands. More bands catch more pairs below the threshold at the cost of more
+        candidate checks, every candidate pair is verified exactly before it's grouped.
+        """
+        if num_perm % bands != 0:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        record_list = self._sorted_records(records)
+        # Exact copies are collapsed first, each distinct record goes through the LSH once however many copies it
+        # has, so a bucket can't fill up with the same record over and over
+        # [[record position]] per distinct record, in order of first submission
+        copy_position_list = list()
+        distinct_dict = dict()
+        for position, record in enumerate(record_list):
+            digest = record_hash(record, skip_fields=self.skip_fields, normalize_strings=self.normalize_strings)
+            distinct_position = distinct_dict.get(digest)
+            if distinct_position is None:
+                distinct_dict[digest] = len(copy_position_list)
+                copy_position_list.append([position])
+            else:
+                copy_position_list[distinct_position].append(position)
+        shingle_list = [self._shingles(record_list[position_list[0]]) for position_list in copy_position_list]
+
+        # One hash function per permutation: mix the shingle hash with a per-permutation random seed
+        perm_seed = np.random.default_rng(seed).integers(0, np.iinfo(np.uint64).max, size=num_perm, dtype=np.uint64,
+                                                         endpoint=True)
+        rows = num_perm // bands
+        # {(band, band signature bytes): [distinct record position]}
+        bucket_dict = dict()
+        for position, shingle_set in enumerate(shingle_list):
+            if not shingle_set:
+                continue
+            hash_array = self._shingle_hashes(shingle_set)
+            signature = _mix64(hash_array[:, np.newaxis] ^ perm_seed).min(axis=0)
+            for band in range(bands):
+                bucket_dict.setdefault((band, signature[band * rows:(band + 1) * rows].tobytes()),
+                                       list()).append(position)
+
+        parent_list = list(range(len(shingle_list)))
+
+        def find(position: int):
+            while parent_list[position] != position:
+                parent_list[position] = parent_list[parent_list[position]]
+                position = parent_list[position]
+            return position
+
+        # Pairs already found to be too different, pairs that were joined are skipped by the root check instead
+        rejected_set = set()
+        for position_list in bucket_dict.values():
+            for i, position in enumerate(position_list):
+                for other_position in position_list[i + 1:]:
+                    root, other_root = find(position), find(other_position)
+                    if root == other_root or (position, other_position) in rejected_set:
+                        continue
+                    shingle_set, other_shingle_set = shingle_list[position], shingle_list[other_position]
+                    jaccard = len(shingle_set & other_shingle_set) / len(shingle_set | other_shingle_set)
+                    if jaccard >= threshold:
+                        # Keep the earliest record as the root so it ends up first in the group
+                        parent_list[max(root, other_root)] = min(root, other_root)
+                    else:
+                        rejected_set.add((position, other_position))
+
+        member_dict = dict()
+        for distinct_position, position_list in enumerate(copy_position_list):
+            member_dict.setdefault(find(distinct_position), list()).extend(position_list)
+        group_list = [FormDuplicateGroup(records=[record_list[position] for position in sorted(position_list)],
+                                         id_field=self.id_field)
+                      for position_list in member_dict.values() if len(position_list) > 1]
+        group_list.sort(key=lambda group: -len(group))
+        return group_list
@@ -0,0 +1,226 @@
+import json
+import os
+from pathlib import Path
+
+import requests
+
+from .FormDedupe import record_hash
+from .JsonStream import iter_json_records
+from .Retry import RetryPolicy
+from .Utils import AgTerraAPI
+
+
+class FormCursor(object):
+    """
+    How far through a form's submissions a client has read
+    offset counts the records read, last_id is the highest id seen. Either one can go after GetAll/, depending on what
+    the endpoint pages by
+    """
+    def __init__(self, offset: int = 0, last_id=None):
+        self.offset = offset
+        self.last_id = last_id
+
+    @classmethod
+    def from_dict(cls, cursor_dict: dict):
+        return cls(offset=cursor_dict.get("offset", 0), last_id=cursor_dict.get("last_id"))
+
+    def to_dict(self):
+        return {"offset": self.offset, "last_id": self.last_id}
+
+    def is_new(self, record_id):
+        """
+        False for a record that's already been read, judged by its id. Records without a numeric id always count
+        """
+        if self.last_id is None or not isinstance(record_id, (int, float)):
+            return True
+        return record_id > self.last_id
+
+    def advance(self, record_id):
+        self.offset += 1
+        if isinstance(record_id, (int, float)) and (self.last_id is None or record_id > self.last_id):
+            self.last_id = record_id
+
+    def __repr__(self):
+        return f"<FormCursor offset={self.offset} last_id={self.last_id}>"
+
+
+class FormCursorStore(object):
+    """
+    Where the cursor of each form lives between runs, a small JSON file {form_id: {"offset": n, "last_id": n}}
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return dict()
+
+    def get(self, form_id: str):
+        return FormCursor.from_dict(self.load().get(form_id, dict()))
+
+    def set(self, form_id: str, cursor: FormCursor):
+        """
+        Save the cursor atomically, a crash mid write leaves the previous file in place
+        """
+        cursor_dict = self.load()
+        cursor_dict.update({form_id: cursor.to_dict()})
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = Path(f"{self.path}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(cursor_dict, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def reset(self, form_id: str):
+        self.set(form_id, FormCursor())
+
+
+class FormsClient(object):
+    """
+    Page through a form's submissions on the Forms API, one record at a time
+    GetAll/{n} is requested repeatedly and each page is decoded as it downloads. What n is depends on cursor_mode:
+    - "offset": how many records have been read so far
+    - "id": the highest id_field value seen so far
+    Records with an id at or below the highest one already seen are skipped either way, so an endpoint that pages by
+    the other scheme, or ignores n and always sends everything, still only yields each record once. Paging stops at a
+    page with nothing new in it.
+    With a cursor_store the cursor is saved between runs and only new submissions are fetched.
+    """
+    def __init__(self, sess: requests.Session, form_id: str, base_url: str = "https://forms.agterra.com/api",
+                 cursor_mode: str = "offset", id_field: str = "_ID", cursor_store: FormCursorStore = None,
+                 retry_policy: RetryPolicy = None, chunk_size: int = 65536):
+        if cursor_mode not in ("offset", "id"):
+            raise ValueError(f"cursor_mode must be 'offset' or 'id', got {cursor_mode!r}")
+        self.sess = sess
+        self.form_id = form_id
+        self.base_url = base_url.rstrip("/")
+        self.cursor_mode = cursor_mode
+        self.id_field = id_field
+        self.cursor_store = cursor_store
+        self.retry_policy = retry_policy
+        self.chunk_size = chunk_size
+
+    def page_url(self, cursor: FormCursor):
+        if self.cursor_mode == "id":
+            page_number = cursor.last_id if cursor.last_id is not None else 0
+        else:
+            page_number = cursor.offset
+        return f"{self.base_url}/{self.form_id}/GetAll/{page_number}"
+
+    def _iter_page(self, cursor: FormCursor):
+        """
+        Records of one page, decoded while they download
+        The page is either a JSON array of records or, like GetAll usually sends, an object with the records under the
+        form ID. Both are streamed
+        """
+        raw_resp = AgTerraAPI.get_url(sess=self.sess, url=self.page_url(cursor), retry_policy=self.retry_policy,
+                                      stream=True)
+        with raw_resp:
+            raw_resp.raise_for_status()
+            yield from iter_json_records(raw_resp.iter_content(chunk_size=self.chunk_size), key=self.form_id)
+
+    def iter_records(self, cursor: FormCursor = None):
+        """
+        Every record after cursor. cursor is advanced in place as records are yielded
+        """
+        if cursor is None:
+            cursor = FormCursor()
+        # record_key of the first record of every page so far
+        first_key_set = set()
+        while True:
+            new_count = 0
+            for position, record in enumerate(self._iter_page(cursor)):
+                record_id = record.get(self.id_field)
+                if position == 0:
+                    # A page starting with a record another page started with, the endpoint isn't paging. Keyed by
+                    # record_key, so records without an id can't keep the loop going either
+                    first_key = self.record_key(record)
+                    if first_key in first_key_set:
+                        return
+                    first_key_set.add(first_key)
+                if not cursor.is_new(record_id):
+                    continue
+                cursor.advance(record_id)
+                new_count += 1
+                yield record
+            if new_count == 0:
+                return
+
+    def load_cursor(self):
+        return self.cursor_store.get(self.form_id) if self.cursor_store is not None else FormCursor()
+
+    def save_cursor(self, cursor: FormCursor):
+        if self.cursor_store is not None:
+            self.cursor_store.set(self.form_id, cursor)
+
+    def new_records(self):
+        """
+        Every record submitted since the cursor saved by the last run
+        The cursor is saved once the caller has taken the last record, stopping early reads them again next time.
+        """
+        cursor = self.load_cursor()
+        yield from self.iter_records(cursor=cursor)
+        self.save_cursor(cursor)
+
+    def record_key(self, record: dict):
+        """
+        What makes a record the same record on the next run, its id or, without one, a hash of the whole record
+        """
+        record_id = record.get(self.id_field)
+        return record_id if record_id is not None else record_hash(record, skip_fields=())
+
+    def sync_to_file(self, records_path: Path, progress_callback=None):
+        """
+        Append every new record to a JSON lines file and advance the saved cursor
+        The file is flushed before the cursor is saved, a crash can repeat records but never lose one.
+        The cursor can't tell if a record without a numeric id was read before, those are checked against the keys
+        (see record_key) of the records already in the file instead.
+        progress_callback, if given, is called with the number of records appended so far.
+        Returns how many records were appended.
+        """
+        records_path = Path(records_path)
+        records_path.parent.mkdir(parents=True, exist_ok=True)
+        cursor = self.load_cursor()
+        appended = 0
+        # Only read the file if a record needs it
+        seen_key_set = None
+        with open(records_path, 'a', encoding="utf-8") as f:
+            for record in self.iter_records(cursor=cursor):
+                if not isinstance(record.get(self.id_field), (int, float)):
+                    if seen_key_set is None:
+                        f.flush()
+                        seen_key_set = {self.record_key(old_record) for old_record in iter_records_file(records_path)}
+                    record_key = self.record_key(record)
+                    if record_key in seen_key_set:
+                        continue
+                    seen_key_set.add(record_key)
+                f.write(json.dumps(record, separators=(",", ":")))
+                f.write("\n")
+                appended += 1
+                if appended % 1000 == 0:
+                    f.flush()
+                    os.fsync(f.fileno())
+                    self.save_cursor(cursor)
+                if progress_callback is not None:
+                    progress_callback(appended)
+            f.flush()
+            os.fsync(f.fileno())
+        self.save_cursor(cursor)
+        return appended
+
+
+def iter_records_file(records_path: Path):
+    """
+    Read back a JSON lines file written by FormsClient.sync_to_file, one record at a time
+    """
+    try:
+        with open(records_path, 'r', encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    except FileNotFoundError:
+        return
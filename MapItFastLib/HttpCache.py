@@ -0,0 +1,101 @@
+import hashlib
+import os
+from pathlib import Path
+import pickle
+import threading
+
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+# Negotiated explicitly so a bare urllib3/requests upgrade can't quietly change what the server sends us
+ACCEPT_ENCODING = "gzip, deflate"
+# Headers describing the encoded body on the wire, meaningless for the decoded body kept on disk
+_WIRE_HEADERS = ("Content-Encoding", "Content-Length", "Transfer-Encoding")
+
+
+def http_cache_file_name(key: str):
+    return f"http_cache_{key}"
+
+
+class CachingHTTPAdapter(HTTPAdapter):
+    """
+    Transport adapter that revalidates GETs instead of downloading them again
+    - A 200 carrying an ETag or Last-Modified header is saved (decoded) in cache_path
+    - The next GET for the same URL and credentials sends If-None-Match / If-Modified-Since
+    - A 304 is answered from disk as an ordinary 200 with from_cache set, callers can't tell the difference
+    Streamed responses are served from disk on a 304 but not written, saving them would mean buffering the body.
+    """
+    def __init__(self, cache_path: Path, **kwargs):
+        super().__init__(**kwargs)
+        self.cache_path = Path(cache_path)
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+
+    def _cache_file(self, request):
+        # Credentials are part of the key, two accounts never share a cached body
+        key_text = f"{request.url}\n{request.headers.get('Authorization', '')}"
+        key = hashlib.sha256(key_text.encode("utf-8")).hexdigest()[:32]
+        return Path(os.path.join(self.cache_path, http_cache_file_name(key)))
+
+    @staticmethod
+    def _load(cache_file: Path):
+        try:
+            with open(cache_file, 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (EOFError, ValueError, pickle.UnpicklingError):
+            # Half written or corrupt, treat it like it isn't there
+            return None
+
+    @staticmethod
+    def _store(cache_file: Path, entry_dict: dict):
+        tmp_path = Path(f"{cache_file}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(entry_dict, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_file)
+
+    def send(self, request, stream=False, **kwargs):
+        if request.method != "GET":
+            return super().send(request, stream=stream, **kwargs)
+
+        request.headers.setdefault("Accept-Encoding", ACCEPT_ENCODING)
+        cache_file = self._cache_file(request)
+        entry_dict = self._load(cache_file)
+        if entry_dict is not None:
+            if entry_dict.get("etag") is not None:
+                request.headers["If-None-Match"] = entry_dict.get("etag")
+            if entry_dict.get("last_modified") is not None:
+                request.headers["If-Modified-Since"] = entry_dict.get("last_modified")
+
+        response = super().send(request, stream=stream, **kwargs)
+
+        if response.status_code == 304 and entry_dict is not None:
+            # Nothing but headers came over the wire, hand the connection back before replacing the response
+            response.content
+            response.close()
+            return self._cached_response(request, entry_dict)
+
+        if response.status_code == 200 and not stream:
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if etag is not None or last_modified is not None:
+                headers = {name: value for name, value in response.headers.items() if name not in _WIRE_HEADERS}
+                self._store(cache_file, {"url": request.url, "etag": etag, "last_modified": last_modified,
+                                         "headers": headers, "encoding": response.encoding,
+                                         "body": response.content})
+        return response
+
+    @staticmethod
+    def _cached_response(request, entry_dict: dict):
+        response = Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.url = request.url
+        response.request = request
+        response.headers = CaseInsensitiveDict(entry_dict.get("headers"))
+        response.encoding = entry_dict.get("encoding")
+        response._content = entry_dict.get("body")
+        response._content_consumed = True
+        response.from_cache = True
+        return response
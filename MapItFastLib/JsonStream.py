@@ -0,0 +1,133 @@
+import codecs
+import json
+
+# Whitespace allowed between JSON tokens
+_WHITESPACE = " \t\n\r"
+# Characters that can continue a number, "1." or "-1.5e" at the end of a chunk decodes, but as the wrong number
+_NUMBER_CHARACTERS = "0123456789.eE+-"
+
+
+class _ChunkReader(object):
+    """
+    JSON tokens read off an iterable of chunks, keeping only the text that hasn't been decoded yet
+    """
+    def __init__(self, chunks, encoding: str = "utf-8-sig"):
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder(encoding)()
+        self.chunk_iter = iter(chunks)
+        self.buffer = ""
+        self.pos = 0
+        self.exhausted = False
+
+    def read_more(self):
+        for chunk in self.chunk_iter:
+            text = chunk if isinstance(chunk, str) else self.text_decoder.decode(chunk)
+            if text:
+                # Drop what's already been decoded so the buffer doesn't grow with the response
+                self.buffer = self.buffer[self.pos:] + text
+                self.pos = 0
+                return True
+        self.buffer = self.buffer[self.pos:] + self.text_decoder.decode(b"", final=True)
+        self.pos = 0
+        self.exhausted = True
+        return False
+
+    def peek(self):
+        """
+        Next character that isn't whitespace, None once the stream has run out
+        """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.exhausted or not self.read_more():
+                return None
+
+    def expect(self, expected: str, message: str):
+        char = self.peek()
+        if char is None:
+            raise json.JSONDecodeError("Response ended before the JSON was closed", self.buffer, self.pos)
+        if char != expected:
+            raise json.JSONDecodeError(message, self.buffer, self.pos)
+        self.pos += 1
+
+    def decode_value(self):
+        """
+        The whole JSON value starting at the next token
+        """
+        if self.peek() is None:
+            raise json.JSONDecodeError("Response ended before the JSON was closed", self.buffer, self.pos)
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.exhausted or not self.read_more():
+                    raise
+                continue
+            if not self.exhausted and (end >= len(self.buffer) or self.buffer[end] in _NUMBER_CHARACTERS):
+                # A number cut off at the end of a chunk still decodes, wait for the delimiter before trusting it
+                self.read_more()
+                continue
+            self.pos = end
+            return value
+
+    def iter_array(self):
+        """
+        Elements of the array starting at the next token, decoded one at a time
+        """
+        self.expect("[", "Expected a JSON array")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.decode_value()
+            char = self.peek()
+            if char == "]":
+                self.pos += 1
+                return
+            self.expect(",", "Expected ',' or ']' between array elements")
+
+
+def iter_json_array(chunks, encoding: str = "utf-8-sig"):
+    """
+    Yield each element of a top level JSON array as soon as it has been downloaded
+    chunks is any iterable of bytes (or str), e.g. Response.iter_content(). Only one element plus one chunk of
+    undecoded text is held in memory at a time, whatever the size of the whole array.
+    """
+    yield from _ChunkReader(chunks, encoding=encoding).iter_array()
+
+
+def iter_json_records(chunks, key: str, encoding: str = "utf-8-sig"):
+    """
+    Like iter_json_array, for a body that's either an array of records or an object with the array of records under
+    key ({"form name": [records], "other form": [records]}). Other members are read past one element at a time, so
+    memory stays flat either way. An empty body has no records.
+    """
+    reader = _ChunkReader(chunks, encoding=encoding)
+    char = reader.peek()
+    if char is None:
+        return
+    if char == "[":
+        yield from reader.iter_array()
+        return
+    reader.expect("{", "Expected a JSON array or object")
+    if reader.peek() == "}":
+        return
+    while True:
+        member_key = reader.decode_value()
+        if not isinstance(member_key, str):
+            raise json.JSONDecodeError("Expected an object member name", reader.buffer, reader.pos)
+        reader.expect(":", "Expected ':' after an object member name")
+        if reader.peek() == "[":
+            for element in reader.iter_array():
+                if member_key == key:
+                    yield element
+            if member_key == key:
+                # Nothing after the wanted member needs reading
+                return
+        else:
+            reader.decode_value()
+        if reader.peek() == "}":
+            return
+        reader.expect(",", "Expected ',' or '}' between object members")
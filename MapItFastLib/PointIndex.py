@@ -0,0 +1,115 @@
+from math import asin, ceil, cos, floor, radians, sin, sqrt
+
+# Mean radius of the earth, close enough for pins on a map
+EARTH_RADIUS_M = 6371008.8
+# Length of one degree of latitude
+METRES_PER_DEGREE = 111320.0
+# Grid cell size when the index only does exact matching by default
+DEFAULT_CELL_M = 5.0
+
+
+def haversine_m(lat_1: float, long_1: float, lat_2: float, long_2: float):
+    """
+    Great circle distance between two coordinates in metres
+    """
+    d_lat = radians(lat_2 - lat_1)
+    d_long = radians(long_2 - long_1)
+    a = sin(d_lat / 2) ** 2 + cos(radians(lat_1)) * cos(radians(lat_2)) * sin(d_long / 2) ** 2
+    return 2 * EARTH_RADIUS_M * asin(min(1.0, sqrt(a)))
+
+
+class PointIndex(object):
+    """
+    Grid hash of coordinates for fast duplicate checks
+    - Exact lookups are a single dict hit
+    - Radius lookups only look at the grid cells the radius can reach, then check the real distance
+    Anything with Latitude and Longitude attributes (Points objects) can be added, or pass the coordinates explicitly.
+    tolerance_m is the default search radius, 0 means only exact matches count as duplicates.
+    """
+    def __init__(self, tolerance_m: float = 5.0):
+        if tolerance_m < 0:
+            raise ValueError(f"tolerance_m can't be negative, got {tolerance_m}")
+        self.tolerance_m = tolerance_m
+        # Grid cells are roughly tolerance_m wide, so a default lookup only checks the neighbouring cells
+        self._cell_m = tolerance_m if tolerance_m > 0 else DEFAULT_CELL_M
+        self._cell_deg = self._cell_m / METRES_PER_DEGREE
+        # {(lat, long): [item]}
+        self._exact_dict = dict()
+        # {(lat_cell, long_cell): [(lat, long, item)]}
+        self._grid_dict = dict()
+        self._count = 0
+
+    @classmethod
+    def from_points(cls, points, tolerance_m: float = 5.0):
+        """
+        Build an index from a list of Points objects
+        """
+        index = cls(tolerance_m=tolerance_m)
+        for point in points:
+            index.add(point)
+        return index
+
+    def __len__(self):
+        return self._count
+
+    def _cell(self, lat: float, long: float):
+        return floor(lat / self._cell_deg), floor(long / self._cell_deg)
+
+    def add(self, item, latitude: float = None, longitude: float = None):
+        """
+        Add item to the index. Items without coordinates are ignored
+        """
+        if latitude is None:
+            latitude = item.Latitude
+        if longitude is None:
+            longitude = item.Longitude
+        if latitude is None or longitude is None:
+            return
+        latitude = float(latitude)
+        longitude = float(longitude)
+        self._exact_dict.setdefault((latitude, longitude), list()).append(item)
+        self._grid_dict.setdefault(self._cell(latitude, longitude), list()).append((latitude, longitude, item))
+        self._count += 1
+
+    def find_exact(self, latitude: float, longitude: float):
+        """
+        Every item at exactly these coordinates
+        """
+        return list(self._exact_dict.get((float(latitude), float(longitude)), list()))
+
+    def find_nearby(self, latitude: float, longitude: float, radius_m: float = None):
+        """
+        Every item within radius_m metres (tolerance_m by default), nearest first, as (distance_m, item) tuples
+        """
+        if radius_m is None:
+            radius_m = self.tolerance_m
+        latitude = float(latitude)
+        longitude = float(longitude)
+        lat_cell, long_cell = self._cell(latitude, longitude)
+
+        # A degree of longitude shrinks towards the poles, so more cells have to be checked east and west
+        lat_reach = ceil(radius_m / self._cell_m)
+        long_scale = max(cos(radians(min(89.0, abs(latitude) + lat_reach * self._cell_deg))), 0.01)
+        long_reach = ceil(radius_m / (self._cell_m * long_scale))
+
+        match_list = list()
+        for lat_offset in range(-lat_reach, lat_reach + 1):
+            for long_offset in range(-long_reach, long_reach + 1):
+                for cell_lat, cell_long, item in self._grid_dict.get((lat_cell + lat_offset,
+                                                                      long_cell + long_offset), ()):
+                    distance_m = haversine_m(latitude, longitude, cell_lat, cell_long)
+                    if distance_m <= radius_m:
+                        match_list.append((distance_m, item))
+        match_list.sort(key=lambda match: match[0])
+        return match_list
+
+    def contains(self, latitude: float, longitude: float, radius_m: float = None):
+        """
+        True if anything is within radius_m metres (tolerance_m by default) of these coordinates
+        A radius of 0 is an exact match
+        """
+        if radius_m is None:
+            radius_m = self.tolerance_m
+        if radius_m == 0:
+            return (float(latitude), float(longitude)) in self._exact_dict
+        return len(self.find_nearby(latitude, longitude, radius_m=radius_m)) > 0
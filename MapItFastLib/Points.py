@@ -1,78 +1,99 @@
 from datetime import datetime
+import sys
 
+from .Records import SlottedRecord
 
-class Points(object):
+
+def parse_item_time(item_time: str):
+    """
+    Parse an ItemTime timestamp. Returns None if the point doesn't have one
+    Not all timestamps are represented the same way, some have fractional seconds and some don't.
+    """
+    if item_time is None:
+        return None
+    try:
+        # Fast path, handles both forms in one C call
+        return datetime.fromisoformat(item_time)
+    except ValueError:
+        pass
+    # Older Pythons only accept 3 or 6 fractional digits in fromisoformat
+    if "." in item_time:
+        whole_seconds, fraction = item_time.split(".", 1)
+        return datetime.strptime(f"{whole_seconds}.{fraction[:6]}", "%Y-%m-%dT%H:%M:%S.%f")
+    return datetime.strptime(item_time, "%Y-%m-%dT%H:%M:%S")
+
+# Marks an ItemTime that hasn't been parsed yet, None is a valid parsed value
+_NOT_PARSED = object()
+
+
+class Points(SlottedRecord):
     """
     Class to hold all of the Point objects
+    Only the fields we use get a slot, Forms and DispatchCases stay in the leftover dictionary.
     """
-    def __init__(self, raw_data):
-        self.raw_point_data = raw_data
-
-    @property
-    def CanDelete(self):
-        return self.raw_point_data.get("CanDelete")
-
-    @property
-    def CanEdit(self):
-        return self.raw_point_data.get("CanEdit")
-
-    @property
-    def Creator(self):
-        return self.raw_point_data.get("Creator")
+    _fields = ("PointId", "ProjectId", "Title", "Description", "Latitude", "Longitude", "IconId", "Elevation",
+               "CanDelete", "CanEdit", "Creator", "CreatorResolved", "IconHttpLocation")
+    _field_set = frozenset(_fields + ("ItemTime",))
+    __slots__ = _fields + ("_item_time_raw", "_item_time")
+    # The parsed ItemTime isn't pickled, it's cheaper to parse again than to unpickle a datetime per point
+    _state_slots = ("_extra",) + _fields + ("_item_time_raw",)
+    _legacy_attribute = "raw_point_data"
 
-    @property
-    def CreatorResolved(self):
-        return self.raw_point_data.get("CreatorResolved")
-
-    @property
-    def Description(self):
-        return self.raw_point_data.get("Description")
+    def __init__(self, raw_data):
+        get = raw_data.get
+        self.PointId = get("PointId")
+        self.ProjectId = get("ProjectId")
+        title = get("Title")
+        # The same handful of titles shows up thousands of times across a tenant
+        self.Title = sys.intern(title) if isinstance(title, str) else title
+        self.Description = get("Description")
+        self.Latitude = get("Latitude")
+        self.Longitude = get("Longitude")
+        self.IconId = get("IconId")
+        self.Elevation = get("Elevation")
+        self.CanDelete = get("CanDelete")
+        self.CanEdit = get("CanEdit")
+        self.Creator = get("Creator")
+        self.CreatorResolved = get("CreatorResolved")
+        self.IconHttpLocation = get("IconHttpLocation")
+        self._item_time_raw = get("ItemTime")
+        self._item_time = _NOT_PARSED
+        self._store_extra(raw_data, self._field_set)
+
+    def __setstate__(self, state):
+        self._item_time = _NOT_PARSED
+        super().__setstate__(state)
+
+    @property
+    def raw_point_data(self):
+        """
+        The JSON dictionary the API sent, rebuilt on every access
+        """
+        return self.to_dict()
+
+    def to_dict(self):
+        raw_data = super().to_dict()
+        raw_data.update({"ItemTime": self._item_time_raw})
+        return raw_data
 
     @property
     def DispatchCases(self):
-        return self.raw_point_data.get("DispatchCases")
-
-    @property
-    def Elevation(self):
-        return self.raw_point_data.get("Elevation")
+        return self._from_extra("DispatchCases")
 
     @property
     def Forms(self):
-        return self.raw_point_data.get("Forms")
-
-    @property
-    def IconHttpLocation(self):
-        return self.raw_point_data.get("IconHttpLocation")
+        return self._from_extra("Forms")
 
     @property
-    def IconId(self):
-        return self.raw_point_data.get("IconId")
+    def RawItemTime(self):
+        """
+        ItemTime exactly as the API sent it
+        """
+        return self._item_time_raw
 
     @property
     def ItemTime(self):
-        try:
-            # Not all timestamps are represented in this way. This is bullshit.
-            return datetime.strptime(self.raw_point_data.get("ItemTime"), "%Y-%m-%dT%H:%M:%S.%f")
-        except ValueError:
-            return datetime.strptime(self.raw_point_data.get("ItemTime"), "%Y-%m-%dT%H:%M:%S")
-        # return self.raw_point_data.get("ItemTime")
-
-    @property
-    def Latitude(self):
-        return self.raw_point_data.get("Latitude")
-
-    @property
-    def Longitude(self):
-        return self.raw_point_data.get("Longitude")
-
-    @property
-    def PointId(self):
-        return self.raw_point_data.get("PointId")
-
-    @property
-    def ProjectId(self):
-        return self.raw_point_data.get("ProjectId")
-
-    @property
-    def Title(self):
-        return self.raw_point_data.get("Title")
\ No newline at end of file
+        # Parsed on first access only, sorting a whole tenant by time reads this a lot
+        if self._item_time is _NOT_PARSED:
+            self._item_time = parse_item_time(self._item_time_raw)
+        return self._item_time
@@ -0,0 +1,186 @@
+import sys
+
+import numpy as np
+
+from .PointIndex import EARTH_RADIUS_M
+
+
+class PointsFrame(object):
+    """
+    Columnar container for a lot of points
+    Coordinates, ids, icon ids and timestamps live in NumPy arrays, titles in an object array of interned strings.
+    Filters return a new PointsFrame, so they can be chained:
+    frame.within_bbox(...).modified_since(...).title_contains("Well")
+    Missing ids are -1, missing coordinates NaN and missing timestamps NaT.
+    """
+    def __init__(self, point_id: np.ndarray, project_id: np.ndarray, icon_id: np.ndarray, latitude: np.ndarray,
+                 longitude: np.ndarray, item_time: np.ndarray, title: np.ndarray):
+        self.point_id = point_id
+        self.project_id = project_id
+        self.icon_id = icon_id
+        self.latitude = latitude
+        self.longitude = longitude
+        self.item_time = item_time
+        self.title = title
+
+    @classmethod
+    def from_points(cls, points):
+        """
+        Build a frame from a list of Points objects
+        """
+        points = list(points)
+        count = len(points)
+        point_id = np.fromiter((_int_or_missing(point.PointId) for point in points), dtype=np.int64, count=count)
+        project_id = np.fromiter((_int_or_missing(point.ProjectId) for point in points), dtype=np.int64,
+                                 count=count)
+        icon_id = np.fromiter((_int_or_missing(point.IconId) for point in points), dtype=np.int64, count=count)
+        latitude = np.fromiter((_float_or_nan(point.Latitude) for point in points), dtype=np.float64, count=count)
+        longitude = np.fromiter((_float_or_nan(point.Longitude) for point in points), dtype=np.float64,
+                                count=count)
+        item_time = np.array([_item_time_or_nat(point) for point in points], dtype="datetime64[us]")
+        title = np.empty(count, dtype=object)
+        title[:] = [sys.intern(point.Title) if point.Title is not None else "" for point in points]
+        return cls(point_id=point_id, project_id=project_id, icon_id=icon_id, latitude=latitude,
+                   longitude=longitude, item_time=item_time, title=title)
+
+    @classmethod
+    def concat(cls, frames):
+        """
+        Join several frames (one per project, say) into one
+        """
+        frames = list(frames)
+        if not frames:
+            return cls.from_points([])
+        return cls(point_id=np.concatenate([frame.point_id for frame in frames]),
+                   project_id=np.concatenate([frame.project_id for frame in frames]),
+                   icon_id=np.concatenate([frame.icon_id for frame in frames]),
+                   latitude=np.concatenate([frame.latitude for frame in frames]),
+                   longitude=np.concatenate([frame.longitude for frame in frames]),
+                   item_time=np.concatenate([frame.item_time for frame in frames]),
+                   title=np.concatenate([frame.title for frame in frames]))
+
+    def __len__(self):
+        return len(self.point_id)
+
+    def __getitem__(self, selector):
+        """
+        Select rows with a boolean mask, an index array or a slice
+        """
+        return PointsFrame(point_id=self.point_id[selector], project_id=self.project_id[selector],
+                           icon_id=self.icon_id[selector], latitude=self.latitude[selector],
+                           longitude=self.longitude[selector], item_time=self.item_time[selector],
+                           title=self.title[selector])
+
+    def row(self, index: int):
+        """
+        A single row as a dictionary, keyed like the API's JSON
+        """
+        item_time = self.item_time[index]
+        return {"PointId": int(self.point_id[index]), "ProjectId": int(self.project_id[index]),
+                "IconId": int(self.icon_id[index]), "Latitude": float(self.latitude[index]),
+                "Longitude": float(self.longitude[index]),
+                "ItemTime": None if np.isnat(item_time) else item_time.astype(object),
+                "Title": self.title[index]}
+
+    def distance_m(self, latitude: float, longitude: float):
+        """
+        Haversine distance in metres from (latitude, longitude) to every point
+        """
+        return haversine_m_array(latitude, longitude, self.latitude, self.longitude)
+
+    def within_radius(self, latitude: float, longitude: float, radius_m: float):
+        """
+        Points no more than radius_m metres away
+        """
+        return self[self.distance_m(latitude, longitude) <= radius_m]
+
+    def within_bbox(self, min_lat: float, min_long: float, max_lat: float, max_long: float):
+        """
+        Points inside the bounding box, edges included
+        """
+        return self[(self.latitude >= min_lat) & (self.latitude <= max_lat) &
+                    (self.longitude >= min_long) & (self.longitude <= max_long)]
+
+    def modified_since(self, since):
+        """
+        Points with an ItemTime at or after since (a datetime)
+        """
+        return self[self.item_time >= np.datetime64(since, "us")]
+
+    def in_projects(self, project_ids):
+        """
+        Points belonging to any of the given project IDs
+        """
+        return self[np.isin(self.project_id, np.asarray(list(project_ids), dtype=np.int64))]
+
+    def with_icon(self, icon_ids):
+        """
+        Points using any of the given icon IDs
+        """
+        return self[np.isin(self.icon_id, np.asarray(list(icon_ids), dtype=np.int64))]
+
+    def title_contains(self, search_term: str, case_sensitive: bool = True):
+        """
+        Points whose title contains search_term
+        """
+        if case_sensitive:
+            mask = np.fromiter((search_term in title for title in self.title), dtype=bool, count=len(self))
+        else:
+            search_term = search_term.lower()
+            mask = np.fromiter((search_term in title.lower() for title in self.title), dtype=bool, count=len(self))
+        return self[mask]
+
+    def sort_by_time(self, descending: bool = False):
+        """
+        Frame sorted by ItemTime, missing timestamps last
+        """
+        order = np.argsort(self.item_time, kind="stable")
+        if descending:
+            # NaT sorts last ascending, keep it last when reversed too
+            missing = np.isnat(self.item_time[order])
+            order = np.concatenate([order[~missing][::-1], order[missing]])
+        return self[order]
+
+    def latest_by_project(self):
+        """
+        Newest ItemTime per project as {project_id: numpy.datetime64}
+        """
+        known = ~np.isnat(self.item_time)
+        project_id = self.project_id[known]
+        item_time = self.item_time[known]
+        if len(project_id) == 0:
+            return dict()
+        order = np.lexsort((item_time, project_id))
+        project_id = project_id[order]
+        item_time = item_time[order]
+        # The last row of each project run holds its newest timestamp
+        last_of_run = np.append(project_id[1:] != project_id[:-1], True)
+        return dict(zip(project_id[last_of_run].tolist(), item_time[last_of_run]))
+
+
+def haversine_m_array(latitude: float, longitude: float, latitude_array: np.ndarray, longitude_array: np.ndarray):
+    """
+    Haversine distance in metres from one coordinate to each coordinate in the arrays
+    """
+    lat_1 = np.radians(latitude)
+    lat_2 = np.radians(latitude_array)
+    d_lat = lat_2 - lat_1
+    d_long = np.radians(longitude_array - longitude)
+    a = np.sin(d_lat / 2) ** 2 + np.cos(lat_1) * np.cos(lat_2) * np.sin(d_long / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _int_or_missing(value):
+    return -1 if value is None else int(value)
+
+
+def _float_or_nan(value):
+    return np.nan if value is None else float(value)
+
+
+def _item_time_or_nat(point):
+    try:
+        return point.ItemTime
+    except (TypeError, ValueError):
+        # No ItemTime, or one neither of the known formats can read
+        return None
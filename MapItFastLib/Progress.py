@@ -0,0 +1,47 @@
+from rich.console import Console
+from rich.status import Status
+
+
+class ProgressReporter(object):
+    """
+    Where AgTerraWrapper reports what it's doing
+    - Interactive runs get a Rich Status spinner and console logging, same as always
+    - Headless runs (batch jobs, servers) get no UI at all, console may be None
+    Either way progress_callback, if given, is called as progress_callback(stage, detail_dict) for every step.
+    Use it as a context manager around the work.
+    """
+    def __init__(self, console: Console = None, headless: bool = False, progress_callback=None,
+                 message: str = "[magenta]Working"):
+        self.console = console
+        self.headless = headless or console is None
+        self.progress_callback = progress_callback
+        self.message = message
+        self._status = None
+
+    def __enter__(self):
+        if not self.headless:
+            self._status = Status(self.message, console=self.console, spinner='arrow3')
+            self._status.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._status is not None:
+            self._status.__exit__(exc_type, exc_val, exc_tb)
+            self._status = None
+        return False
+
+    def update(self, stage: str, message: str = None, **detail):
+        """
+        Move on to the next step. message is only shown on the spinner, stage and detail go to the callback
+        """
+        if self._status is not None and message is not None:
+            self._status.update(message)
+        if self.progress_callback is not None:
+            self.progress_callback(stage, detail)
+
+    def log(self, message: str):
+        """
+        console.log that stays quiet in headless mode
+        """
+        if not self.headless:
+            self.console.log(message)
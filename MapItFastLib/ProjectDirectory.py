@@ -0,0 +1,231 @@
+from bisect import bisect_left, insort
+import os
+from pathlib import Path
+from time import monotonic
+
+from rich.console import Console
+
+from .Utils import AgTerraWrapper
+
+# A cached project list younger than this is used without asking the server, a day by default
+DEFAULT_MAX_AGE = 24 * 60 * 60
+# A lookup miss refreshes from the loader at most this often, in seconds, so a typo can't hammer the server
+MISS_REFRESH_INTERVAL = 60
+# Fields that move a project between indexes when they change
+_INDEXED_FIELDS = ("Title", "ProjectFolderId", "LastChildUpdate")
+
+
+def fold_title(title: str):
+    """
+    Title as compared by case-insensitive lookups
+    """
+    return (title or "").casefold()
+
+
+class RefreshReport(object):
+    """
+    Which projects a refresh added, removed or changed
+    """
+    def __init__(self):
+        self.added_ids = list()
+        self.removed_ids = list()
+        self.changed_ids = list()
+
+    @property
+    def changed_anything(self):
+        return bool(self.added_ids or self.removed_ids or self.changed_ids)
+
+    def __repr__(self):
+        return (f"<RefreshReport added={len(self.added_ids)} removed={len(self.removed_ids)} "
+                f"changed={len(self.changed_ids)}>")
+
+
+class ProjectDirectory(object):
+    """
+    Project lookups by ID, title (exact, case-insensitive or prefix) and folder, all dictionary hits or a binary search
+    Build it once from a project list, usually the cached one (see load), and refresh() it with a newer list to only
+    touch the projects that changed.
+    With a loader (a callable returning a fresh project list), a title or ID that isn't found triggers a refresh
+    before giving up, at most once every miss_refresh_interval seconds, so a project created since the cache was
+    written is still found.
+    """
+    def __init__(self, projects=(), loader=None, miss_refresh_interval: float = MISS_REFRESH_INTERVAL):
+        self.loader = loader
+        self.miss_refresh_interval = miss_refresh_interval
+        self._by_id = dict()
+        self._by_title = dict()
+        self._by_folded_title = dict()
+        self._by_folder = dict()
+        # Sorted (folded title, ProjectId) pairs, for prefix lookups
+        self._folded_title_list = list()
+        # monotonic() of the last refresh a miss triggered
+        self._miss_refreshed_at = None
+        for project in projects:
+            self._add(project)
+
+    @classmethod
+    def load(cls, username: str, password: str, console: Console, cache_path: Path,
+             max_cache_age: float = DEFAULT_MAX_AGE, refresh_cache: bool = False, sess=None):
+        """
+        Directory from the project pickle in the cache folder cache_path, downloading the list only if the pickle is
+        missing or older than max_cache_age seconds
+        """
+        project_pickle_path = Path(os.path.join(cache_path, "project_cache.pickle.py"))
+
+        def loader():
+            return AgTerraWrapper.get_projects(username=username, password=password, console=console,
+                                               cache_path=project_pickle_path, refresh_cache=True, headless=True,
+                                               sess=sess)
+
+        projects = AgTerraWrapper.get_projects(username=username, password=password, console=console,
+                                               cache_path=project_pickle_path, refresh_cache=refresh_cache,
+                                               max_cache_age=max_cache_age, headless=True, sess=sess)
+        return cls(projects, loader=loader)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __iter__(self):
+        return iter(self._by_id.values())
+
+    def __contains__(self, project_id):
+        return project_id in self._by_id
+
+    def _add(self, project):
+        self._by_id.update({project.ProjectId: project})
+        self._by_title.setdefault(project.Title, list()).append(project)
+        folded_title = fold_title(project.Title)
+        self._by_folded_title.setdefault(folded_title, list()).append(project)
+        self._by_folder.setdefault(project.ProjectFolderId, list()).append(project)
+        insort(self._folded_title_list, (folded_title, project.ProjectId))
+
+    @staticmethod
+    def _discard(index_dict: dict, key, project):
+        project_list = [other for other in index_dict.get(key, ()) if other.ProjectId != project.ProjectId]
+        if project_list:
+            index_dict.update({key: project_list})
+        else:
+            index_dict.pop(key, None)
+
+    @staticmethod
+    def _swap(index_dict: dict, key, project):
+        index_dict.update({key: [project if other.ProjectId == project.ProjectId else other
+                                 for other in index_dict.get(key, ())]})
+
+    def _replace(self, project):
+        """
+        Swap in a newer object for a project whose indexed fields haven't changed
+        """
+        self._by_id.update({project.ProjectId: project})
+        self._swap(self._by_title, project.Title, project)
+        self._swap(self._by_folded_title, fold_title(project.Title), project)
+        self._swap(self._by_folder, project.ProjectFolderId, project)
+
+    def _remove(self, project):
+        self._by_id.pop(project.ProjectId, None)
+        self._discard(self._by_title, project.Title, project)
+        folded_title = fold_title(project.Title)
+        self._discard(self._by_folded_title, folded_title, project)
+        self._discard(self._by_folder, project.ProjectFolderId, project)
+        position = bisect_left(self._folded_title_list, (folded_title, project.ProjectId))
+        if position < len(self._folded_title_list) and \
+                self._folded_title_list[position] == (folded_title, project.ProjectId):
+            del self._folded_title_list[position]
+
+    def refresh(self, projects=None):
+        """
+        Bring the directory in line with projects (the loader's list if None), only re-indexing what changed
+        """
+        if projects is None:
+            if self.loader is None:
+                raise ValueError(f"Nothing to refresh from, pass projects or give the directory a loader")
+            projects = self.loader()
+        report = RefreshReport()
+        seen_id_set = set()
+        for project in projects:
+            seen_id_set.add(project.ProjectId)
+            current = self._by_id.get(project.ProjectId)
+            if current is None:
+                self._add(project)
+                report.added_ids.append(project.ProjectId)
+            elif any(getattr(current, field) != getattr(project, field) for field in _INDEXED_FIELDS):
+                self._remove(current)
+                self._add(project)
+                report.changed_ids.append(project.ProjectId)
+            elif current is not project:
+                # Nothing indexed moved, but lookups should still hand out the newest object
+                if current.to_dict() != project.to_dict():
+                    report.changed_ids.append(project.ProjectId)
+                self._replace(project)
+        for project_id in [project_id for project_id in self._by_id if project_id not in seen_id_set]:
+            self._remove(self._by_id.get(project_id))
+            report.removed_ids.append(project_id)
+        return report
+
+    def _refresh_on_miss(self):
+        """
+        Refresh from the loader when a lookup misses, unless a miss already did less than miss_refresh_interval
+        seconds ago. True if it did
+        """
+        if self.loader is None:
+            return False
+        if self._miss_refreshed_at is not None and monotonic() - self._miss_refreshed_at < self.miss_refresh_interval:
+            return False
+        self.refresh()
+        self._miss_refreshed_at = monotonic()
+        return True
+
+    def get(self, project_id: int, default=None):
+        project = self._by_id.get(project_id)
+        if project is None and self._refresh_on_miss():
+            project = self._by_id.get(project_id)
+        return default if project is None else project
+
+    def find(self, title: str, ignore_case: bool = False):
+        """
+        Every project with this title
+        """
+        def lookup():
+            if ignore_case:
+                return list(self._by_folded_title.get(fold_title(title), ()))
+            return list(self._by_title.get(title, ()))
+
+        project_list = lookup()
+        if not project_list and self._refresh_on_miss():
+            project_list = lookup()
+        return project_list
+
+    def find_one(self, title: str, ignore_case: bool = False):
+        """
+        The one project with this title. Raises KeyError if there's none, or more than one
+        """
+        project_list = self.find(title, ignore_case=ignore_case)
+        if len(project_list) != 1:
+            raise KeyError(f"{len(project_list)} projects are titled {title!r}")
+        return project_list[0]
+
+    def find_prefix(self, prefix: str, limit: int = None):
+        """
+        Projects whose title starts with prefix, ignoring case, in title order
+        """
+        folded_prefix = fold_title(prefix)
+        project_list = list()
+        position = bisect_left(self._folded_title_list, (folded_prefix,))
+        while position < len(self._folded_title_list):
+            folded_title, project_id = self._folded_title_list[position]
+            if not folded_title.startswith(folded_prefix):
+                break
+            project_list.append(self._by_id.get(project_id))
+            if limit is not None and len(project_list) >= limit:
+                break
+            position += 1
+        return project_list
+
+    def in_folder(self, project_folder_id: int):
+        """
+        Projects directly inside a folder
+        """
+        return list(self._by_folder.get(project_folder_id, ()))
+
+    def titles(self):
+        return [project.Title for project in self._by_id.values()]
@@ -1,121 +1,100 @@
-class Project(object):
+from .Records import SlottedRecord
+
+
+class Project(SlottedRecord):
     """
     Class to hold all of the Project objects
+    GeoLines, GeoPolygons, Pictures, Points, ProjectUserLocations and ActiveUsers stay in the leftover dictionary.
     """
+    _fields = ("ProjectId", "Title", "ProjectTypeId", "Description", "LastChildUpdate", "Creator", "ProjectFolderId",
+               "CanEdit", "CanDelete", "CanContribute", "CreatorName", "UserPermission")
+    _field_set = frozenset(_fields)
+    __slots__ = _fields
+    _state_slots = ("_extra",) + _fields
+    _legacy_attribute = "raw_project_data"
 
     def __init__(self, raw_data):
-        self.raw_project_data = raw_data
-
-    @property
-    def ProjectId(self):
-        return self.raw_project_data.get("ProjectId")
-
-    @property
-    def ProjectTypeId(self):
-        return self.raw_project_data.get("ProjectTypeId")
-
-    @property
-    def Title(self):
-        return self.raw_project_data.get("Title")
-
-    @property
-    def Description(self):
-        return self.raw_project_data.get("Description")
-
-    @property
-    def LastChildUpdate(self):
-        return self.raw_project_data.get("LastChildUpdate")
-
-    @property
-    def Creator(self):
-        return self.raw_project_data.get("Creator")
-
-    @property
-    def ProjectFolderId(self):
-        return self.raw_project_data.get("ProjectFolderId")
+        get = raw_data.get
+        self.ProjectId = get("ProjectId")
+        self.Title = get("Title")
+        self.ProjectTypeId = get("ProjectTypeId")
+        self.Description = get("Description")
+        self.LastChildUpdate = get("LastChildUpdate")
+        self.Creator = get("Creator")
+        self.ProjectFolderId = get("ProjectFolderId")
+        self.CanEdit = get("CanEdit")
+        self.CanDelete = get("CanDelete")
+        self.CanContribute = get("CanContribute")
+        self.CreatorName = get("CreatorName")
+        self.UserPermission = get("UserPermission")
+        self._store_extra(raw_data, self._field_set)
+
+    @property
+    def raw_project_data(self):
+        """
+        The JSON dictionary the API sent, rebuilt on every access
+        """
+        return self.to_dict()
 
     @property
     def ProjectUserLocations(self):
-        return self.raw_project_data.get("ProjectUserLocations")
+        return self._from_extra("ProjectUserLocations")
 
     @property
     def GeoLines(self):
-        return self.raw_project_data.get("GeoLines")
+        return self._from_extra("GeoLines")
 
     @property
     def GeoPolygons(self):
-        return self.raw_project_data.get("GeoPolygons")
+        return self._from_extra("GeoPolygons")
 
     @property
     def Pictures(self):
-        return self.raw_project_data.get("Pictures")
+        return self._from_extra("Pictures")
 
     @property
     def Points(self):
-        return self.raw_project_data.get("Points")
-
-    @property
-    def CanEdit(self):
-        return self.raw_project_data.get("CanEdit")
-
-    @property
-    def CanDelete(self):
-        return self.raw_project_data.get("CanDelete")
-
-    @property
-    def CanContribute(self):
-        return self.raw_project_data.get("CanContribute")
+        return self._from_extra("Points")
 
     @property
     def ActiveUsers(self):
-        return self.raw_project_data.get("ActiveUsers")
-
-    @property
-    def CreatorName(self):
-        return self.raw_project_data.get("CreatorName")
-
-    @property
-    def UserPermission(self):
-        return self.raw_project_data.get("UserPermission")
+        return self._from_extra("ActiveUsers")
 
-class ProjectFolder(object):
+class ProjectFolder(SlottedRecord):
     """
     Class for holding ProjectFolder objects
+    Projects and ChildFolders stay in the leftover dictionary.
     """
-    def __init__(self, raw_data):
-        self.raw_project_folder_data = raw_data
-
-    @property
-    def ProjectFolderId(self):
-        """
-        Method for defining ProjectFolderId
-        """
-        return self.raw_project_folder_data.get("ProjectFolderId")
+    _fields = ("ProjectFolderId", "FolderName", "ParentFolderId")
+    _field_set = frozenset(_fields)
+    __slots__ = _fields
+    _state_slots = ("_extra",) + _fields
+    _legacy_attribute = "raw_project_folder_data"
 
-    @property
-    def ParentFolderId(self):
-        """
-        Method for defining ParentFolderId
-        """
-        return self.raw_project_folder_data.get("ParentFolderId")
+    def __init__(self, raw_data):
+        get = raw_data.get
+        self.ProjectFolderId = get("ProjectFolderId")
+        self.FolderName = get("FolderName")
+        self.ParentFolderId = get("ParentFolderId")
+        self._store_extra(raw_data, self._field_set)
 
     @property
-    def FolderName(self):
+    def raw_project_folder_data(self):
         """
-        Method for defining FolderName
+        The JSON dictionary the API sent, rebuilt on every access
         """
-        return self.raw_project_folder_data.get("FolderName")
+        return self.to_dict()
 
     @property
     def Projects(self):
         """
         Method for defining Projects
         """
-        return self.raw_project_folder_data.get("Projects")
+        return self._from_extra("Projects")
 
     @property
     def ChildFolders(self):
         """
         Method for defining ChildFolders
         """
-        return self.raw_project_folder_data.get("ChildFolders")
+        return self._from_extra("ChildFolders")
@@ -0,0 +1,60 @@
+import pickle
+
+
+class SlottedRecord(object):
+    """
+    Base class for the compact model objects (Points, Project, ProjectFolder)
+    - Fields named in _fields are decoded into slots of the same name when the object is built
+    - Everything else in the raw JSON (nested lists like Forms or GeoLines, keys we don't know about) is kept, by
+      reference, in one leftover dictionary, or None when there's nothing left over
+    - Pickles as a plain tuple of slot values
+    Subclasses set __slots__ to their _fields plus any private slots, and list every slot in _state_slots.
+    """
+    __slots__ = ("_extra",)
+    # JSON keys decoded into slots
+    _fields = ()
+    # Every slot, in the order __getstate__ saves them
+    _state_slots = ("_extra",)
+    # Attribute the raw JSON dictionary lived in before the classes were slotted
+    _legacy_attribute = None
+
+    def _store_extra(self, raw_data: dict, field_set: frozenset):
+        """
+        Keep every key not decoded into a slot. The values aren't copied or serialised, this runs for every point
+        """
+        extra_dict = {key: value for key, value in raw_data.items() if key not in field_set and value is not None}
+        self._extra = extra_dict or None
+
+    def _extra_dict(self):
+        if self._extra is None:
+            return dict()
+        if isinstance(self._extra, bytes):
+            # Caches written when the leftovers were a pickled blob
+            self._extra = pickle.loads(self._extra)
+        return self._extra
+
+    def _from_extra(self, key: str):
+        return self._extra_dict().get(key)
+
+    def to_dict(self):
+        """
+        Rebuild the JSON dictionary the API sent
+        """
+        raw_data = {field: getattr(self, field) for field in self._fields}
+        raw_data.update(self._extra_dict())
+        return raw_data
+
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in self._state_slots)
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            # Pickles written before the classes were slotted hold the raw JSON dictionary
+            self.__init__(raw_data=state.get(self._legacy_attribute))
+            return
+        for slot, value in zip(self._state_slots, state):
+            setattr(self, slot, value)
+
+    def __repr__(self):
+        field_text = ", ".join(f"{field}={getattr(self, field)!r}" for field in self._fields[:2])
+        return f"<{type(self).__name__} {field_text}>"
@@ -0,0 +1,123 @@
+from rich.console import Console
+
+from .Clustering import title_similarity
+from .PointIndex import PointIndex
+from .Uploader import PointUploader
+
+# Fields compared to decide whether a point still in the project was edited since the backup
+COMPARED_FIELDS = ("Title", "Description", "Latitude", "Longitude")
+
+
+class RestorePlan(object):
+    """
+    What restoring a backup over a live project would change
+    - missing: backed up points with no counterpart in the project, these get re-created
+    - changed: (backed up, live) pairs with the same PointId whose title, description or coordinates differ
+    - present: backed up points still in the project as they were, by PointId or, for points re-created by an
+      earlier restore, by coordinates and title
+    """
+    def __init__(self, project_id: int):
+        self.project_id = project_id
+        self.missing = list()
+        self.changed = list()
+        self.present = list()
+
+    def point_dicts(self, include_changed: bool = False):
+        """
+        Form data for every point to upload, in backup order
+        The Points endpoint can only create, so with include_changed an edited point gets a second pin holding the
+        backed up version next to the edited one.
+        """
+        point_list = list(self.missing)
+        if include_changed:
+            point_list += [backup_point for backup_point, live_point in self.changed]
+        for point in point_list:
+            yield PointUploader.build_point_dict(project_id=self.project_id, title=point.Title,
+                                                 latitude=point.Latitude, longitude=point.Longitude,
+                                                 description=point.Description or "",
+                                                 icon_id=point.IconId if point.IconId is not None else 3,
+                                                 elevation=point.Elevation if point.Elevation is not None else 0,
+                                                 itemtime=point.RawItemTime)
+
+    def __repr__(self):
+        return (f"<RestorePlan project={self.project_id} missing={len(self.missing)} changed={len(self.changed)} "
+                f"present={len(self.present)}>")
+
+
+class PointRestorer(object):
+    """
+    Work out which backed up points a project is missing and put them back
+    Every live point accounts for at most one backed up point, so a backup holding two identical pins restores both,
+    and running the same restore twice uploads nothing the second time.
+    tolerance_m and min_title_similarity decide when a live point without the backed up PointId is the same pin
+    re-created by an earlier restore (the API hands out a new PointId on every POST).
+    """
+    def __init__(self, tolerance_m: float = 0.5, min_title_similarity: float = 1.0):
+        if tolerance_m < 0:
+            raise ValueError(f"tolerance_m can't be negative, got {tolerance_m}")
+        self.tolerance_m = tolerance_m
+        self.min_title_similarity = min_title_similarity
+
+    @staticmethod
+    def is_changed(backup_point, live_point):
+        return any(getattr(backup_point, field) != getattr(live_point, field) for field in COMPARED_FIELDS)
+
+    def _find_recreated(self, point_index: PointIndex, used_set: set, backup_point):
+        if backup_point.Latitude is None or backup_point.Longitude is None:
+            return None
+        if self.tolerance_m == 0:
+            candidate_list = point_index.find_exact(backup_point.Latitude, backup_point.Longitude)
+        else:
+            candidate_list = [item for distance_m, item in point_index.find_nearby(backup_point.Latitude,
+                                                                                  backup_point.Longitude)]
+        for live_point in candidate_list:
+            if id(live_point) in used_set:
+                continue
+            if title_similarity(backup_point.Title, live_point.Title) >= self.min_title_similarity:
+                return live_point
+        return None
+
+    def plan(self, backup_points, live_points, project_id: int):
+        """
+        RestorePlan for putting backup_points back into project_id, which currently holds live_points
+        """
+        live_list = list(live_points)
+        live_by_id = {point.PointId: point for point in live_list if point.PointId is not None}
+        restore_plan = RestorePlan(project_id=project_id)
+        used_set = set()
+        unmatched_list = list()
+        for backup_point in backup_points:
+            live_point = live_by_id.get(backup_point.PointId)
+            if live_point is None or id(live_point) in used_set:
+                unmatched_list.append(backup_point)
+                continue
+            used_set.add(id(live_point))
+            if self.is_changed(backup_point, live_point):
+                restore_plan.changed.append((backup_point, live_point))
+            else:
+                restore_plan.present.append(backup_point)
+
+        # Only live points no backed up PointId claimed can be earlier re-creations
+        point_index = PointIndex(tolerance_m=self.tolerance_m)
+        for live_point in live_list:
+            if id(live_point) not in used_set:
+                point_index.add(live_point)
+        for backup_point in unmatched_list:
+            live_point = self._find_recreated(point_index, used_set, backup_point)
+            if live_point is None:
+                restore_plan.missing.append(backup_point)
+            else:
+                used_set.add(id(live_point))
+                restore_plan.present.append(backup_point)
+        return restore_plan
+
+    @staticmethod
+    def restore(sess, console: Console, restore_plan: RestorePlan, include_changed: bool = False,
+                max_in_flight: int = 8, max_per_second: float = None, progress_callback=None, **uploader_kwargs):
+        """
+        Upload the plan's points through a PointUploader, returns one UploadResult per point
+        """
+        uploader = PointUploader(sess=sess, console=console, max_in_flight=max_in_flight,
+                                 max_per_second=max_per_second, **uploader_kwargs)
+        return uploader.upload(restore_plan.point_dicts(include_changed=include_changed),
+                               progress_callback=progress_callback)
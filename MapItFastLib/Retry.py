@@ -0,0 +1,256 @@
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import random
+import threading
+from time import monotonic, sleep
+from urllib.parse import urlparse
+
+import requests
+
+# Status codes that mean "the server is under pressure, try again later"
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# (connect, read) seconds, a socket that stops answering raises Timeout instead of hanging its thread forever
+DEFAULT_TIMEOUT = (10.0, 60.0)
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """
+    Raised instead of sending a request to an endpoint whose circuit breaker is open
+    """
+
+
+def endpoint_for_url(url: str):
+    """
+    Endpoint key for a URL: host and path, without the query string
+    Every project's /api/Points call shares one endpoint
+    """
+    parsed_url = urlparse(url)
+    return f"{parsed_url.netloc}{parsed_url.path}"
+
+
+def parse_retry_after(value: str):
+    """
+    Retry-After is either a number of seconds or an HTTP date. Returns seconds, or None if it can't be read
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class CircuitBreaker(object):
+    """
+    Stop calling an endpoint after failure_threshold failures in a row
+    - closed: requests flow normally
+    - open: requests fail straight away with CircuitOpenError until reset_timeout has passed
+    - half-open: one trial request is let through, success closes the circuit, failure opens it again
+    """
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failure_count = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return "closed"
+        if monotonic() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow_request(self):
+        """
+        True if a request may be sent right now
+        """
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failure_count = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """
+        Give back the half-open trial slot of a request that ended without saying anything about the endpoint
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failure_count += 1
+            if self._trial_in_flight or self._failure_count >= self.failure_threshold:
+                self._opened_at = monotonic()
+            self._trial_in_flight = False
+
+
+class RetryStats(object):
+    """
+    Thread safe counters of calls, retries and failures per endpoint
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        # {endpoint: {"calls": int, "retries": int, "failures": int}}
+        self._stats_dict = dict()
+
+    def record(self, endpoint: str, attempts: int, succeeded: bool):
+        with self._lock:
+            endpoint_stats = self._stats_dict.setdefault(endpoint, {"calls": 0, "retries": 0, "failures": 0})
+            endpoint_stats["calls"] += 1
+            endpoint_stats["retries"] += max(0, attempts - 1)
+            if not succeeded:
+                endpoint_stats["failures"] += 1
+
+    def snapshot(self):
+        """
+        Copy of the counters, safe to read while other threads keep recording
+        """
+        with self._lock:
+            return {endpoint: dict(endpoint_stats) for endpoint, endpoint_stats in self._stats_dict.items()}
+
+
+class RetryPolicy(object):
+    """
+    Decide if, when and how often a failed request is tried again
+    - Exponential backoff with full jitter, capped at max_backoff, Retry-After is honoured when the server sends it
+    - Gives up after max_attempts or once deadline seconds have passed, whichever comes first
+    - Only connection errors, timeouts and retryable_status_codes are retried. Other 4xx errors are raised immediately
+    - One CircuitBreaker per endpoint so a dead endpoint fails fast instead of being hammered
+    - Every attempt gets a (connect, read) timeout, the read timeout never runs past what's left of the deadline
+    """
+    def __init__(self, max_attempts: int = 5, deadline: float = 120.0, backoff_base: float = 0.5,
+                 max_backoff: float = 30.0, jitter: bool = True, retryable_status_codes: set = None,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0, timeout: tuple = DEFAULT_TIMEOUT):
+        if max_attempts < 1:
+            raise ValueError(f"max_attempts must be at least 1, got {max_attempts}")
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        if retryable_status_codes is None:
+            retryable_status_codes = RETRYABLE_STATUS_CODES
+        self.retryable_status_codes = set(retryable_status_codes)
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.stats = RetryStats()
+        self._breaker_lock = threading.Lock()
+        # {endpoint: CircuitBreaker}
+        self._breaker_dict = dict()
+
+    def breaker_for(self, url: str):
+        """
+        CircuitBreaker for the endpoint url belongs to
+        """
+        endpoint = endpoint_for_url(url)
+        with self._breaker_lock:
+            if endpoint not in self._breaker_dict:
+                self._breaker_dict.update({endpoint: CircuitBreaker(failure_threshold=self.failure_threshold,
+                                                                    reset_timeout=self.reset_timeout)})
+            return self._breaker_dict.get(endpoint)
+
+    def backoff(self, attempt: int):
+        """
+        Seconds to wait after the given (1 based) failed attempt
+        """
+        delay = min(self.max_backoff, self.backoff_base * (2 ** (attempt - 1)))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def timeout_for(self, time_left: float):
+        """
+        (connect, read) timeout for an attempt with time_left seconds of the deadline remaining
+        """
+        connect_timeout, read_timeout = self.timeout
+        time_left = max(0.1, time_left)
+        return min(connect_timeout, time_left), min(read_timeout, time_left)
+
+    def is_retryable(self, exception: Exception):
+        """
+        Is this failure worth another attempt
+        """
+        if isinstance(exception, requests.exceptions.HTTPError) and exception.response is not None:
+            return exception.response.status_code in self.retryable_status_codes
+        return isinstance(exception, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+    def call(self, url: str, request_func):
+        """
+        Call request_func (which takes the (connect, read) timeout to send with and returns a Response) under this
+        policy
+        Returns the successful Response or raises the last error once the budget is spent
+        """
+        endpoint = endpoint_for_url(url)
+        breaker = self.breaker_for(url)
+        started_at = monotonic()
+        attempt = 0
+        while True:
+            if not breaker.allow_request():
+                self.stats.record(endpoint=endpoint, attempts=attempt, succeeded=False)
+                raise CircuitOpenError(f"Circuit open for {endpoint}, not sending request")
+            attempt += 1
+            outcome_recorded = False
+            try:
+                resp = request_func(self.timeout_for(self.deadline - (monotonic() - started_at)))
+                resp.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                retryable = self.is_retryable(e)
+                if retryable:
+                    breaker.record_failure()
+                else:
+                    # The server answered, it just didn't like the request
+                    breaker.record_success()
+                outcome_recorded = True
+
+                retry_after = None
+                if isinstance(e, requests.exceptions.HTTPError) and e.response is not None:
+                    retry_after = parse_retry_after(e.response.headers.get("Retry-After"))
+                delay = self.backoff(attempt) if retry_after is None else retry_after
+                time_left = self.deadline - (monotonic() - started_at)
+                if not retryable or attempt >= self.max_attempts or delay >= time_left:
+                    self.stats.record(endpoint=endpoint, attempts=attempt, succeeded=False)
+                    raise
+                if e.response is not None:
+                    # Hand a streamed connection back to the pool before trying again
+                    e.response.close()
+                sleep(delay)
+            else:
+                breaker.record_success()
+                outcome_recorded = True
+                self.stats.record(endpoint=endpoint, attempts=attempt, succeeded=True)
+                return resp
+            finally:
+                if not outcome_recorded:
+                    # request_func raised something that isn't a request error, don't leave a half-open breaker
+                    # waiting on a trial that's never coming back
+                    breaker.release_trial()
+                    self.stats.record(endpoint=endpoint, attempts=attempt, succeeded=False)
+
+
+# Shared by every AgTerraAPI call that doesn't bring its own policy
+DEFAULT_RETRY_POLICY = RetryPolicy()
@@ -0,0 +1,206 @@
+import json
+from pathlib import Path
+import re
+
+from rich.console import Console
+
+from .CsvImport import ColumnMapping, ImportPipeline, build_point_indexes
+from .ProjectDirectory import ProjectDirectory
+from .Utils import AgTerraWrapper
+
+
+def build_predicate(predicate_dict: dict):
+    """
+    Callable taking a row dictionary and returning True or False, from a predicate like
+    {"column": "JOB STATUS", "in": ["SCHEDULED", "AWAITING SCHEDULE"]}
+    Column tests (values are compared after stripping whitespace):
+    - "equals": value, "in": [values], "prefix": prefix or [prefixes], "regex": pattern (matched from the start),
+      "empty": true/false
+    Combinations: {"all": [predicates]}, {"any": [predicates]}, {"not": predicate}
+    An empty predicate matches every row.
+    """
+    if not predicate_dict:
+        return lambda row: True
+    if "all" in predicate_dict:
+        predicate_list = [build_predicate(sub_dict) for sub_dict in predicate_dict.get("all")]
+        return lambda row: all(predicate(row) for predicate in predicate_list)
+    if "any" in predicate_dict:
+        predicate_list = [build_predicate(sub_dict) for sub_dict in predicate_dict.get("any")]
+        return lambda row: any(predicate(row) for predicate in predicate_list)
+    if "not" in predicate_dict:
+        predicate = build_predicate(predicate_dict.get("not"))
+        return lambda row: not predicate(row)
+
+    column = predicate_dict.get("column")
+    if column is None:
+        raise ValueError(f"Predicate {predicate_dict} needs a column, or all/any/not")
+
+    def value_of(row: dict):
+        return (row.get(column) or "").strip()
+
+    if "equals" in predicate_dict:
+        expected = str(predicate_dict.get("equals"))
+        return lambda row: value_of(row) == expected
+    if "in" in predicate_dict:
+        expected_set = frozenset(str(value) for value in predicate_dict.get("in"))
+        return lambda row: value_of(row) in expected_set
+    if "prefix" in predicate_dict:
+        prefix = predicate_dict.get("prefix")
+        prefix_tuple = (prefix,) if isinstance(prefix, str) else tuple(str(value) for value in prefix)
+        return lambda row: value_of(row).startswith(prefix_tuple)
+    if "regex" in predicate_dict:
+        pattern = re.compile(predicate_dict.get("regex"))
+        return lambda row: pattern.match(value_of(row)) is not None
+    if "empty" in predicate_dict:
+        want_empty = bool(predicate_dict.get("empty"))
+        return lambda row: (value_of(row) == "") == want_empty
+    raise ValueError(f"Predicate {predicate_dict} has no test, use equals, in, prefix, regex or empty")
+
+
+class Route(object):
+    """
+    Rows matching when go to a project, given by title or by ID
+    """
+    def __init__(self, when: dict = None, project_title: str = None, project_id: int = None):
+        if (project_title is None) == (project_id is None):
+            raise ValueError(f"A route needs exactly one of project_title or project_id")
+        self.when = when or dict()
+        self.project_title = project_title
+        self.project_id = project_id
+        self.predicate = build_predicate(self.when)
+
+    @classmethod
+    def from_dict(cls, route_dict: dict):
+        return cls(when=route_dict.get("when"), project_title=route_dict.get("project_title"),
+                   project_id=route_dict.get("project_id"))
+
+    @property
+    def destination(self):
+        """
+        Key for the route's project, routes to the same project share one
+        """
+        return self.project_title if self.project_title is not None else self.project_id
+
+    def __repr__(self):
+        return f"<Route when={self.when} destination={self.destination!r}>"
+
+
+class RoutingConfig(object):
+    """
+    Declarative routing of CSV rows to projects
+    {
+        "columns": {"latitude": "LATN83", "longitude": "LONGN83", "title": "LEASE NAME", "description": null},
+        "where": {"column": "JOB STATUS", "in": ["SCHEDULED", "AWAITING SCHEDULE"]},
+        "routes": [
+            {"when": {"column": "REPORT CENTER", "prefix": "4"}, "project_title": "Priority 3"},
+            {"when": {"column": "REPORT CENTER", "prefix": "8"}, "project_id": 1234}
+        ]
+    }
+    Rows failing where are dropped, the rest go to the first route they match. Rows matching no route are dropped.
+    A RoutingConfig is a router, call it with a row dictionary to get its destination.
+    """
+    def __init__(self, routes: list, mapping: ColumnMapping = None, where: dict = None):
+        if not routes:
+            raise ValueError(f"A routing config needs at least one route")
+        self.routes = routes
+        self.mapping = ColumnMapping() if mapping is None else mapping
+        self.where = where or dict()
+        self._where_predicate = build_predicate(self.where)
+
+    @classmethod
+    def from_dict(cls, config_dict: dict):
+        return cls(routes=[Route.from_dict(route_dict) for route_dict in config_dict.get("routes", list())],
+                   mapping=ColumnMapping.from_dict(config_dict.get("columns", dict())),
+                   where=config_dict.get("where"))
+
+    @classmethod
+    def from_json_file(cls, config_path: Path):
+        with open(config_path, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+    def __call__(self, row: dict):
+        if not self._where_predicate(row):
+            return None
+        for route in self.routes:
+            if route.predicate(row):
+                return route.destination
+        return None
+
+    def destinations(self):
+        """
+        Every destination, once, in route order
+        """
+        return list(dict.fromkeys(route.destination for route in self.routes))
+
+    def resolve(self, projects):
+        """
+        {destination: ProjectId} for every route, looking titles up in projects (a ProjectDirectory or a list)
+        Raises KeyError naming every title that isn't there, or is there more than once
+        """
+        directory = projects if isinstance(projects, ProjectDirectory) else ProjectDirectory(projects)
+        project_id_dict = dict()
+        problem_list = list()
+        for route in self.routes:
+            if route.project_id is not None:
+                project_id_dict.update({route.destination: route.project_id})
+                continue
+            project_list = directory.find(route.project_title)
+            if len(project_list) != 1:
+                problem_list.append(f"{route.project_title!r} ({len(project_list)} projects)")
+                continue
+            project_id_dict.update({route.destination: project_list[0].ProjectId})
+        if problem_list:
+            raise KeyError(f"Can't resolve routes to {', '.join(problem_list)}")
+        return project_id_dict
+
+
+class RoutingEngine(object):
+    """
+    Import a CSV into every project a RoutingConfig routes to, in one pass
+    The existing points of all destinations are downloaded at once, each partition of the file is checked against
+    its own destination's index, and the uploads for every destination share one upload window.
+    """
+    def __init__(self, config: RoutingConfig, username: str, password: str, sess, console: Console,
+                 tolerance_m: float = 0.0, max_workers: int = 8, chunk_size: int = 500):
+        self.config = config
+        self.username = username
+        self.password = password
+        self.sess = sess
+        self.console = console
+        self.tolerance_m = tolerance_m
+        self.max_workers = max_workers
+        self.pipeline = ImportPipeline(mapping=config.mapping, router=config, chunk_size=chunk_size)
+
+    def point_indexes(self, destinations: dict):
+        """
+        {destination: PointIndex} of the points already in each destination project
+        """
+        destination_by_project_id = dict()
+        for destination, project_id in destinations.items():
+            destination_by_project_id.setdefault(project_id, list()).append(destination)
+        points_by_destination = dict()
+        for project_id, point_list in AgTerraWrapper.get_points_many(username=self.username,
+                                                                     password=self.password, console=self.console,
+                                                                     project_ids=list(destination_by_project_id),
+                                                                     max_workers=self.max_workers, sess=self.sess):
+            for destination in destination_by_project_id.get(project_id):
+                points_by_destination.update({destination: point_list})
+        point_index_dict = build_point_indexes(points_by_destination, tolerance_m=self.tolerance_m)
+        # Destinations sharing a project share an index, so a row can't be added to it twice
+        for project_id, destination_list in destination_by_project_id.items():
+            for destination in destination_list[1:]:
+                point_index_dict.update({destination: point_index_dict.get(destination_list[0])})
+        return point_index_dict
+
+    def run(self, csv_path: str, projects, dry_run: bool = False, progress_callback=None, on_duplicate=None,
+            **uploader_kwargs):
+        """
+        Route, dedupe and upload every row of csv_path. projects is the ProjectDirectory or project list titles are
+        resolved against
+        Returns the pipeline's ImportReport
+        """
+        destinations = self.config.resolve(projects)
+        return self.pipeline.upload(csv_path, destinations=destinations, sess=self.sess, console=self.console,
+                                    point_indexes=self.point_indexes(destinations), dry_run=dry_run,
+                                    progress_callback=progress_callback, on_duplicate=on_duplicate,
+                                    **uploader_kwargs)
@@ -0,0 +1,436 @@
+from bisect import bisect_left
+import heapq
+from math import log
+import os
+from pathlib import Path
+import pickle
+import re
+
+# Words are runs of letters and digits, "Smith #12-A" is ["smith", "12", "a"]
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# How much a match in each field counts towards the score
+TITLE_WEIGHT = 3.0
+DESCRIPTION_WEIGHT = 1.0
+# How much each kind of match is worth relative to an exact token match
+PREFIX_WEIGHT = 0.6
+FUZZY_WEIGHT = 0.4
+# Score of a title that only contains the query inside a word, "ell" in "Well 4"
+SUBSTRING_SCORE = 0.1
+
+
+def tokenize(text: str):
+    if not text:
+        return []
+    return _TOKEN_RE.findall(text.lower())
+
+
+def trigrams(token: str):
+    """
+    Character trigrams of a token, padded so short tokens and word boundaries still produce some
+    """
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def title_trigrams(lower_title: str):
+    """
+    Trigrams of a whole lowercased title, spaces and punctuation included, for substring lookups
+    """
+    return {lower_title[i:i + 3] for i in range(len(lower_title) - 2)}
+
+
+def max_edits_for(token: str):
+    """
+    Typos allowed for a query token. Short tokens get none, "12" fuzzily matches half the tenant
+    """
+    if len(token) <= 3:
+        return 0
+    if len(token) <= 7:
+        return 1
+    return 2
+
+
+def edit_distance(a: str, b: str, limit: int):
+    """
+    Edit distance between a and b counting a swap of two neighbouring characters as one edit ("Smtih" is one edit
+    from "Smith"), or limit + 1 as soon as it's clear it will be more than limit
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before_previous_row = None
+    previous_row = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current_row = [i]
+        for j, char_b in enumerate(b, start=1):
+            distance = min(previous_row[j] + 1, current_row[j - 1] + 1, previous_row[j - 1] + (char_a != char_b))
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                distance = min(distance, before_previous_row[j - 2] + 1)
+            current_row.append(distance)
+        if min(current_row) > limit:
+            return limit + 1
+        before_previous_row, previous_row = previous_row, current_row
+    return previous_row[-1]
+
+
+class SearchHit(object):
+    """
+    One point matching a query
+    """
+    __slots__ = ("point_id", "project_id", "title", "description", "item_time", "score")
+
+    def __init__(self, point_id: int, project_id: int, title: str, description: str, item_time: str, score: float):
+        self.point_id = point_id
+        self.project_id = project_id
+        self.title = title
+        self.description = description
+        # Raw ItemTime string, see Points.parse_item_time
+        self.item_time = item_time
+        self.score = score
+
+    def __repr__(self):
+        return f"<SearchHit point={self.point_id} project={self.project_id} title={self.title!r} score={self.score:.2f}>"
+
+
+class PointSearchIndex(object):
+    """
+    Inverted index over point titles and descriptions
+    - Every token maps to the points containing it, weighted by field (a title match beats a description match)
+    - The vocabulary is indexed by trigram, so typo'd query tokens only get compared against tokens that share
+      trigrams with them instead of the whole vocabulary
+    - Prefix queries bisect a sorted copy of the vocabulary
+    Projects are added and replaced as a unit, so the index can be kept in step with the points cache one project at
+    a time instead of being rebuilt.
+    """
+    def __init__(self):
+        # {point_id: (project_id, title, description, item_time)}
+        self._doc_dict = dict()
+        # {token: {point_id: weight}}
+        self._posting_dict = dict()
+        # {trigram: set(token)}
+        self._trigram_dict = dict()
+        # {point_id: title.lower()}
+        self._lower_title_dict = dict()
+        # {title trigram: set(point_id)}, see title_trigrams
+        self._title_trigram_dict = dict()
+        # {project_id: set(point_id)}
+        self._project_dict = dict()
+        # {project_id: version}, whatever the caller uses to tell if a project changed
+        self._version_dict = dict()
+        # Rebuilt on the first prefix query after the vocabulary changes
+        self._sorted_vocab = None
+
+    def __len__(self):
+        return len(self._doc_dict)
+
+    @property
+    def project_ids(self):
+        return set(self._project_dict)
+
+    def project_version(self, project_id: int):
+        return self._version_dict.get(project_id)
+
+    def _add_token(self, token: str, point_id: int, weight: float):
+        posting = self._posting_dict.get(token)
+        if posting is None:
+            posting = self._posting_dict[token] = dict()
+            for trigram in trigrams(token):
+                self._trigram_dict.setdefault(trigram, set()).add(token)
+            self._sorted_vocab = None
+        posting[point_id] = posting.get(point_id, 0.0) + weight
+
+    def _remove_token(self, token: str, point_id: int):
+        posting = self._posting_dict.get(token)
+        if posting is None:
+            return
+        posting.pop(point_id, None)
+        if not posting:
+            del self._posting_dict[token]
+            for trigram in trigrams(token):
+                token_set = self._trigram_dict.get(trigram)
+                token_set.discard(token)
+                if not token_set:
+                    del self._trigram_dict[trigram]
+            self._sorted_vocab = None
+
+    def _add_title(self, point_id: int, title: str):
+        if title is None:
+            return
+        lower_title = self._lower_title_dict[point_id] = title.lower()
+        for trigram in title_trigrams(lower_title):
+            self._title_trigram_dict.setdefault(trigram, set()).add(point_id)
+
+    def _remove_title(self, point_id: int):
+        lower_title = self._lower_title_dict.pop(point_id, None)
+        if lower_title is None:
+            return
+        for trigram in title_trigrams(lower_title):
+            point_id_set = self._title_trigram_dict.get(trigram)
+            point_id_set.discard(point_id)
+            if not point_id_set:
+                del self._title_trigram_dict[trigram]
+
+    def _substring_candidates(self, query_text: str):
+        """
+        Points whose lowercased title might contain query_text, those holding every trigram of it. None for queries
+        under three characters, which have no trigrams to look up
+        """
+        trigram_set = title_trigrams(query_text)
+        if not trigram_set:
+            return None
+        posting_list = sorted((self._title_trigram_dict.get(trigram, set()) for trigram in trigram_set), key=len)
+        return posting_list[0].intersection(*posting_list[1:])
+
+    def add_point(self, point):
+        """
+        Index one Points object, replacing it if it's already indexed
+        """
+        if point.PointId in self._doc_dict:
+            self.remove_point(point.PointId)
+        self._doc_dict[point.PointId] = (point.ProjectId, point.Title, point.Description, point.RawItemTime)
+        self._project_dict.setdefault(point.ProjectId, set()).add(point.PointId)
+        self._add_title(point.PointId, point.Title)
+        for token in tokenize(point.Title):
+            self._add_token(token, point.PointId, TITLE_WEIGHT)
+        for token in tokenize(point.Description):
+            self._add_token(token, point.PointId, DESCRIPTION_WEIGHT)
+
+    def remove_point(self, point_id: int):
+        doc = self._doc_dict.pop(point_id, None)
+        if doc is None:
+            return
+        project_id, title, description, item_time = doc
+        for token in set(tokenize(title)) | set(tokenize(description)):
+            self._remove_token(token, point_id)
+        self._remove_title(point_id)
+        point_id_set = self._project_dict.get(project_id)
+        if point_id_set is not None:
+            point_id_set.discard(point_id)
+            if not point_id_set:
+                del self._project_dict[project_id]
+
+    def remove_project(self, project_id: int):
+        for point_id in list(self._project_dict.get(project_id, ())):
+            self.remove_point(point_id)
+        self._project_dict.pop(project_id, None)
+        self._version_dict.pop(project_id, None)
+
+    def update_project(self, project_id: int, points: list, version=None):
+        """
+        Replace everything indexed for a project with points
+        If version is given and matches the version stored last time, nothing is done and False is returned
+        """
+        if version is not None and self._version_dict.get(project_id) == version:
+            return False
+        self.remove_project(project_id)
+        for point in points:
+            self.add_point(point)
+        if version is not None:
+            self._version_dict[project_id] = version
+        return True
+
+    def sync_cache_folder(self, cache_path: Path, project_ids=None):
+        """
+        Bring the index in step with the points pickles in cache_path, only reading projects whose pickle changed
+        since they were indexed. Projects whose pickle is gone are dropped. Returns the IDs that were re-indexed.
+        """
+        # Imported here, Utils pulls in requests and the index is useful without it
+        from .Utils import AgTerraWrapper
+
+        if project_ids is None:
+            project_ids = [int(name[len("points_cache_"):]) for name in os.listdir(cache_path)
+                           if name.startswith("points_cache_") and name[len("points_cache_"):].isdigit()]
+        updated_list = list()
+        for project_id in project_ids:
+            cache_file = AgTerraWrapper.points_cache_path(cache_path=cache_path, project_id=project_id)
+            try:
+                version = os.stat(cache_file).st_mtime_ns
+            except FileNotFoundError:
+                self.remove_project(project_id)
+                continue
+            if self._version_dict.get(project_id) == version:
+                continue
+            try:
+                with open(cache_file, 'rb') as f:
+                    point_obj_list = pickle.load(f)
+            except (EOFError, pickle.UnpicklingError):
+                continue
+            self.update_project(project_id, point_obj_list, version=version)
+            updated_list.append(project_id)
+        return updated_list
+
+    def _vocab_prefixed(self, prefix: str):
+        if self._sorted_vocab is None:
+            self._sorted_vocab = sorted(self._posting_dict)
+        start = bisect_left(self._sorted_vocab, prefix)
+        for token in self._sorted_vocab[start:]:
+            if not token.startswith(prefix):
+                break
+            yield token
+
+    def _vocab_fuzzy(self, token: str, max_edits: int):
+        """
+        (vocab_token, distance) for every indexed token within max_edits of token
+        Each edit (a swap included) can break at most four trigrams, candidates sharing fewer than that are skipped
+        without comparing
+        """
+        token_trigrams = trigrams(token)
+        min_shared = max(1, len(token_trigrams) - 4 * max_edits)
+        shared_dict = dict()
+        for trigram in token_trigrams:
+            for vocab_token in self._trigram_dict.get(trigram, ()):
+                shared_dict[vocab_token] = shared_dict.get(vocab_token, 0) + 1
+        for vocab_token, shared in shared_dict.items():
+            if shared < min_shared or vocab_token == token:
+                continue
+            distance = edit_distance(token, vocab_token, max_edits)
+            if distance <= max_edits:
+                yield vocab_token, distance
+
+    def _match_vocab(self, token: str, prefix: bool, fuzzy: bool):
+        """
+        {vocab_token: match weight} for every indexed token one query token matches
+        """
+        match_dict = dict()
+        if token in self._posting_dict:
+            match_dict[token] = 1.0
+        if prefix:
+            for vocab_token in self._vocab_prefixed(token):
+                match_dict[vocab_token] = max(match_dict.get(vocab_token, 0.0), PREFIX_WEIGHT)
+        if fuzzy:
+            max_edits = max_edits_for(token)
+            if max_edits > 0:
+                for vocab_token, distance in self._vocab_fuzzy(token, max_edits):
+                    weight = FUZZY_WEIGHT * (1 - distance / (len(token) + 1))
+                    match_dict[vocab_token] = max(match_dict.get(vocab_token, 0.0), weight)
+        return match_dict
+
+    def _score_token(self, match_dict: dict, candidate_set=None):
+        """
+        {point_id: score} for one query token, best kind of match per point
+        With candidate_set only those points are scored, whichever side is smaller gets walked
+        """
+        doc_count = max(1, len(self._doc_dict))
+        score_dict = dict()
+        for vocab_token, match_weight in match_dict.items():
+            posting = self._posting_dict.get(vocab_token)
+            # Rare tokens say more about a point than ones on every pin
+            token_weight = match_weight * log(1 + doc_count / len(posting))
+            if candidate_set is None or len(posting) <= len(candidate_set):
+                item_iter = posting.items()
+                if candidate_set is not None:
+                    item_iter = ((point_id, field_weight) for point_id, field_weight in item_iter
+                                 if point_id in candidate_set)
+            else:
+                item_iter = ((point_id, posting[point_id]) for point_id in candidate_set if point_id in posting)
+            for point_id, field_weight in item_iter:
+                score = token_weight * field_weight
+                if score > score_dict.get(point_id, 0.0):
+                    score_dict[point_id] = score
+        return score_dict
+
+    def search(self, query: str, project_ids=None, limit: int = 20, prefix: bool = True, fuzzy: bool = True,
+               substring: bool = True):
+        """
+        Points matching every word of query, best first
+        - An exact word match scores highest, then a word the query word is the start of, then a near miss
+        - With substring, titles containing the query anywhere (ignoring case) are also hits, below every word match,
+          so partial words still find what a plain "in" test would. Only titles holding every trigram of the query
+          are checked, queries under three characters only match words
+        - project_ids, if given, limits the results to those projects
+        """
+        query_token_list = tokenize(query)
+        query_text = query.strip().lower()
+        if not query_token_list and not (substring and query_text):
+            return []
+
+        candidate_set = None
+        if project_ids is not None:
+            candidate_set = set()
+            for project_id in project_ids:
+                candidate_set.update(self._project_dict.get(project_id, ()))
+        project_point_set = candidate_set
+
+        match_dict_list = [self._match_vocab(token, prefix=prefix, fuzzy=fuzzy) for token in query_token_list]
+        # Rarest word first, every later word only has to look at the points still in the running
+        match_dict_list.sort(key=lambda match_dict: sum(len(self._posting_dict.get(vocab_token))
+                                                        for vocab_token in match_dict))
+        combined_dict = dict()
+        for position, match_dict in enumerate(match_dict_list):
+            score_dict = self._score_token(match_dict, candidate_set=candidate_set)
+            if position == 0:
+                combined_dict = score_dict
+            else:
+                combined_dict = {point_id: combined_dict[point_id] + score for point_id, score in score_dict.items()}
+            if not combined_dict:
+                break
+            candidate_set = combined_dict.keys()
+
+        lower_title_dict = self._lower_title_dict
+        if len(query_token_list) > 1:
+            for point_id, score in combined_dict.items():
+                if query_text in lower_title_dict.get(point_id, ""):
+                    # The whole query as typed, in order
+                    combined_dict[point_id] = score * 1.5
+
+        if substring and query_text:
+            substring_set = self._substring_candidates(query_text)
+            if substring_set and project_point_set is not None:
+                substring_set = substring_set & project_point_set
+            for point_id in substring_set or ():
+                if point_id not in combined_dict and query_text in lower_title_dict.get(point_id):
+                    combined_dict[point_id] = SUBSTRING_SCORE
+        if not combined_dict:
+            return []
+
+        scored_list = [(score, point_id) for point_id, score in combined_dict.items()]
+        if limit is None:
+            scored_list.sort(reverse=True)
+        else:
+            scored_list = heapq.nlargest(limit, scored_list)
+        hit_list = list()
+        for score, point_id in scored_list:
+            project_id, title, description, item_time = self._doc_dict.get(point_id)
+            hit_list.append(SearchHit(point_id=point_id, project_id=project_id, title=title,
+                                      description=description, item_time=item_time, score=score))
+        return hit_list
+
+    def save(self, path: Path):
+        """
+        Pickle the index atomically
+        """
+        tmp_path = Path(f"{path}.tmp")
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path):
+        """
+        Load a saved index, or return an empty one if there isn't a usable file at path
+        """
+        try:
+            with open(path, 'rb') as f:
+                index = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return cls()
+        return index if isinstance(index, cls) else cls()
+
+    def __getstate__(self):
+        # The trigram indexes, lowercased titles and sorted vocabulary are rebuilt on load, no point storing them
+        return {"doc_dict": self._doc_dict, "posting_dict": self._posting_dict, "project_dict": self._project_dict,
+                "version_dict": self._version_dict}
+
+    def __setstate__(self, state):
+        self._doc_dict = state.get("doc_dict")
+        self._posting_dict = state.get("posting_dict")
+        self._project_dict = state.get("project_dict")
+        self._version_dict = state.get("version_dict")
+        self._sorted_vocab = None
+        self._trigram_dict = dict()
+        for token in self._posting_dict:
+            for trigram in trigrams(token):
+                self._trigram_dict.setdefault(trigram, set()).add(token)
+        self._lower_title_dict = dict()
+        self._title_trigram_dict = dict()
+        for point_id, (project_id, title, description, item_time) in self._doc_dict.items():
+            self._add_title(point_id, title)
@@ -0,0 +1,155 @@
+from math import cos, floor, radians
+import os
+from pathlib import Path
+import pickle
+
+import numpy as np
+
+from .PointIndex import EARTH_RADIUS_M, METRES_PER_DEGREE
+from .PointsFrame import PointsFrame, haversine_m_array
+
+# Grid cell size, about right for "pins near this well" queries
+DEFAULT_CELL_M = 500.0
+# Half the earth's circumference, nothing is further away than this
+MAX_DISTANCE_M = EARTH_RADIUS_M * np.pi
+
+
+class SpatialIndex(object):
+    """
+    Radius, bounding box and nearest-pin queries over many points at once
+    Points are bucketed into a fixed lat/long grid (a geohash by another name) and stored sorted by cell, so every
+    row of cells a query touches is one contiguous slice found with a binary search. Only the points in those
+    slices get the vectorised haversine check.
+    Queries return PointsFrame objects, so they chain with the frame's own filters.
+    Points without coordinates are left out. Boxes crossing the antimeridian aren't supported.
+    """
+    def __init__(self, frame: PointsFrame, cell_m: float = DEFAULT_CELL_M):
+        if cell_m <= 0:
+            raise ValueError(f"cell_m must be positive, got {cell_m}")
+        self.cell_m = cell_m
+        self._cell_deg = cell_m / METRES_PER_DEGREE
+        self._long_cells = int(np.ceil(360.0 / self._cell_deg)) + 1
+
+        frame = frame[~(np.isnan(frame.latitude) | np.isnan(frame.longitude))]
+        cell_key = self._cell_key(frame.latitude, frame.longitude)
+        order = np.argsort(cell_key, kind="stable")
+        self.frame = frame[order]
+        self._cell_key_sorted = cell_key[order]
+
+    @classmethod
+    def from_points(cls, points, cell_m: float = DEFAULT_CELL_M):
+        return cls(PointsFrame.from_points(points), cell_m=cell_m)
+
+    @classmethod
+    def from_cache(cls, cache_path: Path, project_ids=None, cell_m: float = DEFAULT_CELL_M):
+        """
+        Build an index over the points pickles in cache_path, every cached project unless project_ids is given
+        """
+        # Imported here, Utils pulls in requests and the index is useful without it
+        from .Utils import AgTerraWrapper
+
+        if project_ids is None:
+            project_ids = [int(name[len("points_cache_"):]) for name in os.listdir(cache_path)
+                           if name.startswith("points_cache_") and name[len("points_cache_"):].isdigit()]
+        frame_list = list()
+        for project_id in project_ids:
+            cache_file = AgTerraWrapper.points_cache_path(cache_path=cache_path, project_id=project_id)
+            try:
+                with open(cache_file, 'rb') as f:
+                    frame_list.append(PointsFrame.from_points(pickle.load(f)))
+            except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+                continue
+        return cls(PointsFrame.concat(frame_list), cell_m=cell_m)
+
+    def __len__(self):
+        return len(self.frame)
+
+    def _lat_cell(self, latitude):
+        return np.floor((np.asarray(latitude) + 90.0) / self._cell_deg).astype(np.int64)
+
+    def _long_cell(self, longitude):
+        return np.floor((np.asarray(longitude) + 180.0) / self._cell_deg).astype(np.int64)
+
+    def _cell_key(self, latitude, longitude):
+        return self._lat_cell(latitude) * self._long_cells + self._long_cell(longitude)
+
+    def _candidates(self, min_lat: float, min_long: float, max_lat: float, max_long: float):
+        """
+        Row numbers of every point in a grid cell overlapping the box, a superset of the points inside it
+        """
+        min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+        min_long, max_long = max(min_long, -180.0), min(max_long, 180.0)
+        if min_lat > max_lat or min_long > max_long or len(self.frame) == 0:
+            return np.empty(0, dtype=np.int64)
+        first_long_cell = int(self._long_cell(min_long))
+        last_long_cell = int(self._long_cell(max_long))
+        lat_cells = np.arange(int(self._lat_cell(min_lat)), int(self._lat_cell(max_lat)) + 1, dtype=np.int64)
+        start = np.searchsorted(self._cell_key_sorted, lat_cells * self._long_cells + first_long_cell, side="left")
+        stop = np.searchsorted(self._cell_key_sorted, lat_cells * self._long_cells + last_long_cell, side="right")
+        slice_list = [np.arange(row_start, row_stop) for row_start, row_stop in zip(start, stop)
+                      if row_stop > row_start]
+        if not slice_list:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(slice_list)
+
+    def _radius_box(self, latitude: float, longitude: float, radius_m: float):
+        lat_delta = radius_m / METRES_PER_DEGREE
+        # A degree of longitude shrinks towards the poles, widen the box to match at its widest latitude
+        widest_lat = min(89.9, abs(latitude) + lat_delta)
+        if abs(latitude) + lat_delta >= 90.0:
+            long_delta = 360.0
+        else:
+            long_delta = lat_delta / max(cos(radians(widest_lat)), 1e-6)
+        return latitude - lat_delta, longitude - long_delta, latitude + lat_delta, longitude + long_delta
+
+    def _project_mask(self, rows: np.ndarray, project_ids):
+        if project_ids is None:
+            return rows
+        return rows[np.isin(self.frame.project_id[rows], np.asarray(list(project_ids), dtype=np.int64))]
+
+    def within_bbox(self, min_lat: float, min_long: float, max_lat: float, max_long: float, project_ids=None):
+        """
+        Points inside the bounding box, edges included
+        """
+        rows = self._project_mask(self._candidates(min_lat, min_long, max_lat, max_long), project_ids)
+        latitude = self.frame.latitude[rows]
+        longitude = self.frame.longitude[rows]
+        inside = (latitude >= min_lat) & (latitude <= max_lat) & (longitude >= min_long) & (longitude <= max_long)
+        return self.frame[rows[inside]]
+
+    def within_radius(self, latitude: float, longitude: float, radius_m: float, project_ids=None,
+                      return_distance: bool = False):
+        """
+        Points no more than radius_m metres away, nearest first
+        With return_distance, returns (frame, distances in metres) instead
+        """
+        rows = self._project_mask(self._candidates(*self._radius_box(latitude, longitude, radius_m)), project_ids)
+        distance = haversine_m_array(latitude, longitude, self.frame.latitude[rows], self.frame.longitude[rows])
+        inside = distance <= radius_m
+        rows = rows[inside]
+        distance = distance[inside]
+        order = np.argsort(distance, kind="stable")
+        if return_distance:
+            return self.frame[rows[order]], distance[order]
+        return self.frame[rows[order]]
+
+    def k_nearest(self, latitude: float, longitude: float, k: int = 1, max_radius_m: float = None, project_ids=None,
+                  return_distance: bool = False):
+        """
+        The k points closest to (latitude, longitude), nearest first, optionally no further than max_radius_m
+        The search radius starts at one grid cell and doubles until k points are inside it
+        """
+        if k < 1:
+            raise ValueError(f"k must be at least 1, got {k}")
+        limit_m = MAX_DISTANCE_M if max_radius_m is None else max_radius_m
+        radius_m = min(self.cell_m, limit_m)
+        while True:
+            frame, distance = self.within_radius(latitude, longitude, radius_m, project_ids=project_ids,
+                                                 return_distance=True)
+            # Every point within radius_m is already here, so the first k are the true k nearest
+            if len(frame) >= k or radius_m >= limit_m:
+                break
+            radius_m = min(radius_m * 2, limit_m)
+        if return_distance:
+            return frame[:k], distance[:k]
+        return frame[:k]
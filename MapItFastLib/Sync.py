@@ -0,0 +1,154 @@
+import json
+import os
+from pathlib import Path
+import pickle
+
+from rich.console import Console
+
+from .CacheManager import mark_verified
+from .Utils import AgTerraWrapper
+
+
+class SyncReport(object):
+    """
+    What a DeltaSync run did
+    """
+    def __init__(self):
+        # Projects whose points were downloaded again
+        self.refreshed_project_ids = list()
+        # Projects whose LastChildUpdate hadn't moved
+        self.skipped_project_ids = list()
+        self.points_added = 0
+        self.points_updated = 0
+        self.points_removed = 0
+
+    def __repr__(self):
+        return (f"<SyncReport refreshed={len(self.refreshed_project_ids)} skipped={len(self.skipped_project_ids)} "
+                f"added={self.points_added} updated={self.points_updated} removed={self.points_removed}>")
+
+
+class DeltaSync(object):
+    """
+    Keep the points cache up to date by only downloading projects that changed
+    Each project's LastChildUpdate is stored as a watermark next to the points pickles. On the next run only projects
+    whose LastChildUpdate moved (or that have no cache yet) are fetched, and the fresh points are merged into the
+    cache by PointId so unchanged points keep their existing objects. The pickles of unchanged projects are touched,
+    so the points max age counts from the last sync that checked them.
+    """
+    watermark_file_name = "sync_watermarks.json"
+
+    def __init__(self, username: str, password: str, console: Console, cache_path: Path, max_workers: int = 8,
+                 url: str = f"https://mapitfast.agterra.com/api/Points"):
+        self.username = username
+        self.password = password
+        self.console = console
+        self.cache_path = Path(cache_path)
+        self.max_workers = max_workers
+        self.url = url
+        self.watermark_path = Path(os.path.join(self.cache_path, self.watermark_file_name))
+
+    def load_watermarks(self):
+        """
+        {project_id: LastChildUpdate} from the last sync
+        """
+        if not self.watermark_path.exists():
+            return dict()
+        with open(self.watermark_path, 'r') as f:
+            return {int(project_id): last_update for project_id, last_update in json.load(f).items()}
+
+    def save_watermarks(self, watermark_dict: dict):
+        """
+        Write the watermarks atomically, a crash mid write leaves the previous file in place
+        """
+        _atomic_write(self.watermark_path, json.dumps({str(project_id): last_update
+                                                        for project_id, last_update in watermark_dict.items()},
+                                                       indent=1).encode("utf-8"))
+
+    def changed_projects(self, projects: list, watermark_dict: dict = None):
+        """
+        Projects whose LastChildUpdate differs from the stored watermark or that aren't cached yet
+        """
+        if watermark_dict is None:
+            watermark_dict = self.load_watermarks()
+        changed_list = list()
+        for project in projects:
+            cache_file = AgTerraWrapper.points_cache_path(cache_path=self.cache_path, project_id=project.ProjectId)
+            if project.LastChildUpdate is None or watermark_dict.get(project.ProjectId) != project.LastChildUpdate \
+                    or not cache_file.exists():
+                changed_list.append(project)
+        return changed_list
+
+    def sync(self, projects: list, progress_callback=None):
+        """
+        Bring the cache up to date for the given projects. projects must come fresh from the server, a cached project
+        list has stale LastChildUpdate values.
+        progress_callback, if given, is called with each project ID once it's been merged.
+        """
+        report = SyncReport()
+        watermark_dict = self.load_watermarks()
+        changed_list = self.changed_projects(projects, watermark_dict=watermark_dict)
+        changed_id_set = {project.ProjectId for project in changed_list}
+        report.skipped_project_ids = [project.ProjectId for project in projects
+                                      if project.ProjectId not in changed_id_set]
+        # Their watermark says the pickle is still current, don't let the points max age expire or prune it
+        for project_id in report.skipped_project_ids:
+            mark_verified(AgTerraWrapper.points_cache_path(cache_path=self.cache_path, project_id=project_id))
+        last_update_dict = {project.ProjectId: project.LastChildUpdate for project in changed_list}
+
+        for project_id, fresh_point_list in AgTerraWrapper.get_points_many(username=self.username,
+                                                                           password=self.password,
+                                                                           console=self.console,
+                                                                           project_ids=list(changed_id_set),
+                                                                           max_workers=self.max_workers,
+                                                                           url=self.url):
+            self._merge_project(project_id=project_id, fresh_point_list=fresh_point_list, report=report)
+            report.refreshed_project_ids.append(project_id)
+            if last_update_dict.get(project_id) is not None:
+                watermark_dict.update({project_id: last_update_dict.get(project_id)})
+            # Saved after every project so an interrupted sync doesn't start over
+            self.save_watermarks(watermark_dict)
+            if progress_callback is not None:
+                progress_callback(project_id)
+        return report
+
+    def _merge_project(self, project_id: int, fresh_point_list: list, report: SyncReport):
+        """
+        Merge the freshly downloaded points into the project's pickle by PointId
+        """
+        cache_file = AgTerraWrapper.points_cache_path(cache_path=self.cache_path, project_id=project_id)
+        cached_point_dict = dict()
+        if cache_file.exists():
+            try:
+                with open(cache_file, 'rb') as f:
+                    cached_point_dict = {point.PointId: point for point in pickle.load(f)}
+            except (EOFError, pickle.UnpicklingError):
+                if self.console is not None:
+                    self.console.log(f"[yellow]Points cache for project {project_id} is corrupt, replacing it")
+
+        merged_point_list = list()
+        for fresh_point in fresh_point_list:
+            cached_point = cached_point_dict.pop(fresh_point.PointId, None)
+            if cached_point is None:
+                report.points_added += 1
+                merged_point_list.append(fresh_point)
+            elif cached_point.to_dict() != fresh_point.to_dict():
+                report.points_updated += 1
+                merged_point_list.append(fresh_point)
+            else:
+                merged_point_list.append(cached_point)
+        # Whatever is left in the cache isn't on the server anymore
+        report.points_removed += len(cached_point_dict)
+
+        _atomic_write(cache_file, pickle.dumps(merged_point_list, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def _atomic_write(path: Path, data: bytes):
+    """
+    Write to a temporary file next to path, then swap it into place
+    """
+    tmp_path = Path(f"{path}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
@@ -0,0 +1,188 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+import random
+import threading
+from time import monotonic, sleep
+
+import requests
+from rich.console import Console
+
+from .Retry import DEFAULT_TIMEOUT, RETRYABLE_STATUS_CODES, parse_retry_after
+from .Utils import AgTerraAPI
+
+
+class UploadResult(object):
+    """
+    Outcome of uploading a single point
+    """
+    def __init__(self, index: int, point_dict: dict):
+        self.index = index
+        self.point_dict = point_dict
+        self.status_code = None
+        self.attempts = 0
+        self.error = None
+
+    @property
+    def ok(self):
+        return self.status_code in (200, 201)
+
+    def __repr__(self):
+        return f"<UploadResult index={self.index} status={self.status_code} attempts={self.attempts}>"
+
+
+class PointUploader(object):
+    """
+    Upload engine for many points at once
+    - Keeps up to max_in_flight POSTs running over one session
+    - Halves the in-flight window on 429/5xx responses and pauses for Retry-After (or an exponential backoff)
+    - Grows the window back by one request for each full window of successful uploads
+    - With max_per_second, never starts more than that many POSTs in any second, however big the window is
+    - Returns one UploadResult per point, in the order the points were given
+    """
+    def __init__(self, sess: requests.Session, console: Console, max_in_flight: int = 8, max_attempts: int = 5,
+                 backoff_base: float = 1.0, max_backoff: float = 60.0,
+                 url: str = f"https://mapitfast.agterra.com/api/Points", max_per_second: float = None,
+                 timeout: tuple = DEFAULT_TIMEOUT):
+        if max_in_flight < 1:
+            raise ValueError(f"max_in_flight must be at least 1, got {max_in_flight}")
+        if max_per_second is not None and max_per_second <= 0:
+            raise ValueError(f"max_per_second must be positive, got {max_per_second}")
+        self.sess = sess
+        self.console = console
+        self.max_in_flight = max_in_flight
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.url = url
+        self.max_per_second = max_per_second
+        self.timeout = timeout
+
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._window = max_in_flight
+        self._success_streak = 0
+        self._pause_until = 0.0
+        # When the next POST may start if max_per_second is set
+        self._next_send = 0.0
+
+    @staticmethod
+    def build_point_dict(project_id: int, title: str, latitude: float, longitude: float, description: str = "",
+                         icon_id: int = 3, elevation: int = 0, itemtime: str = None):
+        """
+        Build the form data the Points endpoint expects
+        """
+        if itemtime is None:
+            itemtime = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+        return {"ProjectID": project_id, "IconID": icon_id, "Title": title, "Description": description,
+                "Longitude": longitude, "Latitude": latitude, "ItemTime": itemtime, "Elevation": elevation}
+
+    def upload(self, point_dicts, progress_callback=None, keep_results: bool = True):
+        """
+        Upload every point dict in point_dicts. The iterable is consumed lazily, so it can be a generator
+        progress_callback, if given, is called with each UploadResult as it finishes
+        Without keep_results nothing is collected and an empty list is returned, memory stays flat however many
+        points go through, and progress_callback is the only way to see the results
+        """
+        result_list = list()
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            pending = set()
+            point_iter = iter(enumerate(point_dicts))
+            exhausted = False
+            while not exhausted or pending:
+                # Keep a little more queued than can be in flight so the window never starves
+                while not exhausted and len(pending) < self.max_in_flight * 2:
+                    try:
+                        index, point_dict = next(point_iter)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    result = UploadResult(index=index, point_dict=point_dict)
+                    if keep_results:
+                        result_list.append(result)
+                    pending.add(executor.submit(self._upload_one, result))
+
+                if pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        result = future.result()
+                        if progress_callback is not None:
+                            progress_callback(result)
+        return result_list
+
+    def _upload_one(self, result: UploadResult):
+        """
+        Upload a single point, retrying while the server reports pressure
+        """
+        while result.attempts < self.max_attempts:
+            self._acquire_slot()
+            result.attempts += 1
+            retry_after = None
+            finished = False
+            try:
+                resp = AgTerraAPI.post_points(sess=self.sess, console=self.console, point_dict=result.point_dict,
+                                              url=self.url, timeout=self.timeout)
+                result.status_code = resp.status_code
+                result.error = None
+                if resp.status_code in RETRYABLE_STATUS_CODES:
+                    retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                else:
+                    # Success, or a 4xx other than 429 that won't get better by trying again
+                    finished = True
+                    if not result.ok:
+                        result.error = resp.text
+            except (requests.exceptions.RequestException, ValueError) as e:
+                result.error = str(e)
+            finally:
+                # The slot goes back whatever happened, or the window would shrink for good
+                if finished:
+                    self._release_slot(success=result.ok)
+                else:
+                    self._back_off(attempt=result.attempts, retry_after=retry_after)
+            if finished:
+                return result
+        return result
+
+    def _acquire_slot(self):
+        """
+        Block until the adaptive window has room, any server-requested pause has passed and the rate limit allows
+        another request
+        """
+        with self._condition:
+            while self._in_flight >= self._window:
+                self._condition.wait()
+            self._in_flight += 1
+            now = monotonic()
+            send_at = max(self._pause_until, now)
+            if self.max_per_second is not None:
+                # Requests are spaced evenly, each one books the next free send time
+                send_at = max(send_at, self._next_send)
+                self._next_send = send_at + 1.0 / self.max_per_second
+            delay = send_at - now
+        if delay > 0:
+            sleep(delay)
+
+    def _release_slot(self, success: bool):
+        with self._condition:
+            self._in_flight -= 1
+            if success:
+                self._success_streak += 1
+                # Additive increase: one more slot per full window of successes
+                if self._success_streak >= self._window and self._window < self.max_in_flight:
+                    self._window += 1
+                    self._success_streak = 0
+            self._condition.notify_all()
+
+    def _back_off(self, attempt: int, retry_after: float = None):
+        """
+        Multiplicative decrease of the window and a shared pause before anyone sends again
+        """
+        if retry_after is None:
+            retry_after = min(self.max_backoff, self.backoff_base * (2 ** (attempt - 1)))
+            retry_after = random.uniform(retry_after / 2, retry_after)
+        with self._condition:
+            self._in_flight -= 1
+            self._success_streak = 0
+            self._window = max(1, self._window // 2)
+            self._pause_until = max(self._pause_until, monotonic() + retry_after)
+            self._condition.notify_all()
+        self.console.log(f"[yellow]Server is pushing back, slowing uploads to {self._window} at a time")
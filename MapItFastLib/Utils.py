@@ -1,16 +1,25 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
 import os
 from pathlib import Path
 import pickle
 from time import sleep
-import sys
+import threading
+from urllib.parse import urlparse
 
 import requests
+from requests.adapters import HTTPAdapter
 from rich.console import Console
-from rich.status import Status
 
 from .Projects import Project, ProjectFolder
+from .Cache import CacheBackend
+from .CacheManager import DEFAULT_MAX_AGE_DICT, is_fresh, mark_used
+from .HttpCache import ACCEPT_ENCODING, CachingHTTPAdapter
+from .JsonStream import iter_json_array
 from .Points import Points
+from .Progress import ProgressReporter
+from .Retry import DEFAULT_RETRY_POLICY, DEFAULT_TIMEOUT, RetryPolicy
 
 def validate_cache_folder(ctx, param, value):
     """
@@ -21,17 +30,72 @@ def validate_cache_folder(ctx, param, value):
 
     return Path(value)
 
+@contextmanager
+def session_scope(username: str, password: str, sess: requests.Session = None):
+    """
+    Use sess if the caller has one (an AgTerraClient's, say) and leave it open, otherwise open a throwaway session for
+    the duration of the block
+    """
+    if sess is not None:
+        yield sess
+        return
+    with requests.Session() as new_sess:
+        new_sess.auth = (username, password)
+        yield new_sess
+
+class HostLimiter(object):
+    """
+    Cap the number of concurrent requests sent to any single host
+    """
+    def __init__(self, max_per_host: int = 4):
+        if max_per_host < 1:
+            raise ValueError(f"max_per_host must be at least 1, got {max_per_host}")
+        self.max_per_host = max_per_host
+        self._lock = threading.Lock()
+        # {host: BoundedSemaphore}
+        self._semaphore_dict = dict()
+
+    def for_url(self, url: str):
+        """
+        Semaphore guarding the host url points at. Use it as a context manager around the request
+        """
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._semaphore_dict:
+                self._semaphore_dict.update({host: threading.BoundedSemaphore(self.max_per_host)})
+            return self._semaphore_dict.get(host)
+
 class AgTerraAPI(object):
     """
     Lower level abstractions
     """
     @staticmethod
-    def get_projects(sess: requests.Session, console: Console, url: str = f"https://mapitfast.agterra.com/api/Projects"):
+    def build_session(username: str, password: str, pool_maxsize: int = 10, http_cache_path: Path = None):
+        """
+        Build an authenticated session whose keep-alive pool can hold pool_maxsize connections per host
+        With http_cache_path every GET is revalidated with ETag/Last-Modified against responses kept in that folder,
+        an unchanged resource costs a 304 instead of the whole body
+        """
+        sess = requests.Session()
+        sess.auth = (username, password)
+        sess.headers.update({"Accept-Encoding": ACCEPT_ENCODING})
+        if http_cache_path is None:
+            adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+        else:
+            adapter = CachingHTTPAdapter(cache_path=http_cache_path, pool_connections=pool_maxsize,
+                                         pool_maxsize=pool_maxsize)
+        sess.mount("https://", adapter)
+        sess.mount("http://", adapter)
+        return sess
+
+    @staticmethod
+    def get_projects(sess: requests.Session, console: Console, url: str = f"https://mapitfast.agterra.com/api/Projects",
+                     retry_policy: RetryPolicy = None):
         """
         Helper function to get projects list
         """
         # Get the folder listusername
-        raw_resp = AgTerraAPI.get_url(sess=sess, url=url)
+        raw_resp = AgTerraAPI.get_url(sess=sess, url=url, retry_policy=retry_policy)
 
         json_data = raw_resp.json()
         output_obj_list = list()
@@ -48,16 +112,18 @@ class AgTerraAPI(object):
         return output_obj_list
     @staticmethod
     def get_points(sess: requests.Session, console: Console, projectID: int,
-                   url: str = f"https://mapitfast.agterra.com/api/Points"):
+                   url: str = f"https://mapitfast.agterra.com/api/Points", retry_policy: RetryPolicy = None):
         """
         Get all exisiting points in a project
         """
-        raw_resp = AgTerraAPI.get_url(sess=sess, url=url, params={"projectId": projectID})
+        raw_resp = AgTerraAPI.get_url(sess=sess, url=url, params={"projectId": projectID},
+                                      retry_policy=retry_policy)
         try:
             json_resp = raw_resp.json()
-        except:
-            console.log(f"Error converting Project {projectID} to a dictionary")
-            sys.exit(1)
+        except ValueError as e:
+            # Left to the caller, a library call shouldn't take the whole process down
+            raise ValueError(f"Error converting Project {projectID} to a dictionary, status {raw_resp.status_code} "
+                             f"from {raw_resp.url}") from e
 
         points_obj_list = list()
         for raw_resp in json_resp:
@@ -66,27 +132,35 @@ class AgTerraAPI(object):
         return points_obj_list
 
     @staticmethod
-    def get_url(sess: requests.Session, url: str, params: dict = None):
+    def iter_points(sess: requests.Session, console: Console, projectID: int,
+                    url: str = f"https://mapitfast.agterra.com/api/Points", retry_policy: RetryPolicy = None,
+                    chunk_size: int = 65536):
+        """
+        Generator version of get_points
+        Points are decoded straight off the socket and yielded one at a time, so memory stays flat no matter how big
+        the project is and the caller can start working before the download finishes
+        """
+        raw_resp = AgTerraAPI.get_url(sess=sess, url=url, params={"projectId": projectID},
+                                      retry_policy=retry_policy, stream=True)
+        with raw_resp:
+            for raw_point in iter_json_array(raw_resp.iter_content(chunk_size=chunk_size)):
+                yield Points(raw_data=raw_point)
+
+    @staticmethod
+    def get_url(sess: requests.Session, url: str, params: dict = None, retry_policy: RetryPolicy = None,
+                stream: bool = False):
         """
         Basic function to make getting various URLs easier
+        Failed requests are retried according to retry_policy, DEFAULT_RETRY_POLICY if none is given
+        With stream=True the body isn't downloaded until the caller reads it
         """
-        if params is None:
-            try:
-                resp = sess.get(url=url)
-                resp.raise_for_status()
-            except:
-                resp = AgTerraAPI.get_url(sess=sess, url=url, params=params)
-            return resp
-        else:
-            try:
-                resp = sess.get(url=url, params=params)
-                resp.raise_for_status()
-            except:
-                resp = AgTerraAPI.get_url(sess=sess, url=url, params=params)
-            return resp
+        if retry_policy is None:
+            retry_policy = DEFAULT_RETRY_POLICY
+        return retry_policy.call(url=url, request_func=lambda timeout: sess.get(url=url, params=params, stream=stream,
+                                                                                timeout=timeout))
 
     @staticmethod
-    def get_project_folders(sess: requests.Session):
+    def get_project_folders(sess: requests.Session, retry_policy: RetryPolicy = None):
         """
         Just get the JSON blob of folders and convert them into objects in a dict
         Dict should looks like this:
@@ -96,7 +170,7 @@ class AgTerraAPI(object):
         return_list = list()
 
 
-        raw_resp = sess.get(url).json()
+        raw_resp = AgTerraAPI.get_url(sess=sess, url=url, retry_policy=retry_policy).json()
         for raw_proj_folder in raw_resp:
             project_folder_obj = ProjectFolder(raw_data=raw_proj_folder)
             return_list.append(project_folder_obj)
@@ -104,11 +178,12 @@ class AgTerraAPI(object):
 
     @staticmethod
     def post_points(sess: requests.Session, console: Console, point_dict: dict,
-                    url: str = f"https://mapitfast.agterra.com/api/Points"):
+                    url: str = f"https://mapitfast.agterra.com/api/Points", timeout: tuple = DEFAULT_TIMEOUT):
         """
         Function to post points data to a project
+        timeout is the (connect, read) seconds to wait before giving up with a Timeout
         """
-        return sess.post(url=url, data=point_dict)
+        return sess.post(url=url, data=point_dict, timeout=timeout)
 
 
 class AgTerraWrapper(object):
@@ -120,132 +195,291 @@ class AgTerraWrapper(object):
     def post_points(username: str, password: str, console: Console, project_id: int, data_dict: dict, title: str,
                     description: str, longitude: float, latitude: float,
                     itemtime: datetime = datetime.now().strftime("%Y-%m-%dT%H:%M:%S"), elevation: int = 0,
-                    icon_id: int = 3):
+                    icon_id: int = 3, sess: requests.Session = None):
         """
         Post point to AgTerra.
-        One point at a time for this function
+        One point at a time for this function, pass sess (or use AgTerraClient) to keep the connection between calls
         """
         data_dict = {"ProjectID": project_id, "IconID": icon_id, "Title": title,
                      "Description": description, "Longitude": longitude, "Latitude": latitude,
                      "ItemTime": itemtime, "Elevation": elevation}
-        with requests.Session() as sess:
-            sess.auth = (username, password)
+        with session_scope(username=username, password=password, sess=sess) as sess:
             point_response = AgTerraAPI.post_points(sess=sess, console=console,
                                                     point_dict=data_dict)
             return point_response
 
 
     @staticmethod
-    def get_points(username: str, password: str, console: Console, project_id: int, cache_path: Path,
-                   show_off_mode: bool = True, url: str = f"https://mapitfast.agterra.com/api/Points",
-                   use_pickle_cache: bool = True, refresh_cache: bool = False):
+    def points_cache_path(cache_path: Path, project_id: int):
+        """
+        Where the points pickle for a project lives inside the cache folder
+        """
+        return Path(os.path.join(cache_path, f"points_cache_{project_id}"))
+
+    @staticmethod
+    def get_points(username: str, password: str, console: Console, project_id: int, cache_path: Path = None,
+                   show_off_mode: bool = False, url: str = f"https://mapitfast.agterra.com/api/Points",
+                   use_pickle_cache: bool = True, refresh_cache: bool = False, cache_backend: CacheBackend = None,
+                   cache_ttl: float = None, max_cache_age: float = DEFAULT_MAX_AGE_DICT.get("points"),
+                   headless: bool = False, progress_callback=None, sess: requests.Session = None):
         """
         Wrapper for get_points with caching
+        If cache_backend is given it's used instead of the pickle files in cache_path, if both are None the points
+        always come from the server
+        A pickle older than max_cache_age seconds is treated as a miss, None serves a pickle of any age
+        headless skips all console output, progress_callback(stage, detail_dict) is called either way
         """
-        cache_path = Path(os.path.join(cache_path, f"points_cache_{project_id}"))
+        reporter = ProgressReporter(console=console, headless=headless, progress_callback=progress_callback)
+        if cache_backend is not None:
+            point_obj_list = None if refresh_cache else cache_backend.get_points(project_id=project_id)
+            if point_obj_list is None:
+                reporter.update("requesting", project_id=project_id)
+                with session_scope(username=username, password=password, sess=sess) as sess:
+                    point_obj_list = AgTerraAPI.get_points(sess=sess, console=console, projectID=project_id, url=url)
+                reporter.update("writing_cache", project_id=project_id)
+                cache_backend.put_points(project_id=project_id, points=point_obj_list, ttl=cache_ttl)
+            else:
+                reporter.update("reading_cache", project_id=project_id)
+            reporter.update("done", project_id=project_id, count=len(point_obj_list))
+            return point_obj_list
+
+        if cache_path is None:
+            reporter.update("requesting", project_id=project_id)
+            with session_scope(username=username, password=password, sess=sess) as sess:
+                point_obj_list = AgTerraAPI.get_points(sess=sess, console=console, projectID=project_id, url=url)
+            reporter.update("done", project_id=project_id, count=len(point_obj_list))
+            return point_obj_list
+
+        cache_path = AgTerraWrapper.points_cache_path(cache_path=cache_path, project_id=project_id)
         # console.log(cache_path)
         if refresh_cache:
             point_obj_list = AgTerraWrapper.load_points_cache_pickles(username=username, password=password,
                                                                       console=console, cache_path=cache_path,
                                                                       show_off_mode=show_off_mode, url=url,
                                                                       use_pickle_cache=use_pickle_cache,
-                                                                      project_id=project_id)
-        elif cache_path.exists():
+                                                                      project_id=project_id, headless=headless,
+                                                                      progress_callback=progress_callback, sess=sess)
+        elif is_fresh(cache_path, max_age=max_cache_age):
             # Cache exists, pulling from the cache
+            reporter.update("reading_cache", project_id=project_id)
             with open(cache_path, 'rb') as f:
                 point_obj_list = pickle.load(f)
+            mark_used(cache_path)
         else:
             # Cache doesn't exist, user didn't force a refresh
-            console.log(f"[bold][green]Warming up the cache for project {project_id}")
+            reporter.log(f"[bold][green]Warming up the cache for project {project_id}")
             point_obj_list = AgTerraWrapper.load_points_cache_pickles(username=username, password=password, console=console,
                                                                        cache_path=cache_path, show_off_mode=show_off_mode,
                                                                        use_pickle_cache=use_pickle_cache, url=url,
-                                                                      project_id=project_id)
+                                                                      project_id=project_id, headless=headless,
+                                                                      progress_callback=progress_callback, sess=sess)
 
+        reporter.update("done", project_id=project_id, count=len(point_obj_list))
         return point_obj_list
 
+    @staticmethod
+    def get_points_many(username: str, password: str, console: Console, project_ids: list, cache_path: Path = None,
+                        max_workers: int = 8, max_per_host: int = 4,
+                        url: str = f"https://mapitfast.agterra.com/api/Points", use_pickle_cache: bool = True,
+                        refresh_cache: bool = False, cache_backend: CacheBackend = None, cache_ttl: float = None,
+                        max_cache_age: float = DEFAULT_MAX_AGE_DICT.get("points"), progress_callback=None,
+                        sess: requests.Session = None):
+        """
+        Fetch points for many projects at once
+        Yields (project_id, [Points]) as each project finishes, not in the order given.
+        Every worker shares one session (sess if given, otherwise a pooled one built here) and no more than
+        max_per_host requests hit the server at a time.
+        If cache_backend is given it's used instead of the pickle files in cache_path.
+        If both are None the cache is skipped entirely. Pickles older than max_cache_age seconds are refetched, None
+        serves a pickle of any age.
+        Nothing is drawn on the console. progress_callback, if given, is called from the worker threads as
+        progress_callback(stage, detail_dict).
+        """
+        reporter = ProgressReporter(headless=True, progress_callback=progress_callback)
+        host_limiter = HostLimiter(max_per_host=max_per_host)
+
+        def fetch_project(sess: requests.Session, project_id: int):
+            if cache_backend is not None:
+                point_obj_list = None if refresh_cache else cache_backend.get_points(project_id=project_id)
+                if point_obj_list is None:
+                    reporter.update("requesting", project_id=project_id)
+                    with host_limiter.for_url(url):
+                        point_obj_list = AgTerraAPI.get_points(sess=sess, console=console, projectID=project_id,
+                                                               url=url)
+                    cache_backend.put_points(project_id=project_id, points=point_obj_list, ttl=cache_ttl)
+                else:
+                    reporter.update("reading_cache", project_id=project_id)
+                reporter.update("done", project_id=project_id, count=len(point_obj_list))
+                return project_id, point_obj_list
+
+            if cache_path is not None:
+                project_cache_path = AgTerraWrapper.points_cache_path(cache_path=cache_path, project_id=project_id)
+                if not refresh_cache and is_fresh(project_cache_path, max_age=max_cache_age):
+                    reporter.update("reading_cache", project_id=project_id)
+                    with open(project_cache_path, 'rb') as f:
+                        point_obj_list = pickle.load(f)
+                    mark_used(project_cache_path)
+                    reporter.update("done", project_id=project_id, count=len(point_obj_list))
+                    return project_id, point_obj_list
+
+            reporter.update("requesting", project_id=project_id)
+            with host_limiter.for_url(url):
+                point_obj_list = AgTerraAPI.get_points(sess=sess, console=console, projectID=project_id, url=url)
+
+            if cache_path is not None and use_pickle_cache:
+                reporter.update("writing_cache", project_id=project_id)
+                with open(project_cache_path, 'wb') as f:
+                    pickle.dump(point_obj_list, f)
+            reporter.update("done", project_id=project_id, count=len(point_obj_list))
+            return project_id, point_obj_list
+
+        if sess is None:
+            session_context = AgTerraAPI.build_session(username=username, password=password, pool_maxsize=max_per_host)
+        else:
+            session_context = nullcontext(sess)
+        with session_context as sess:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                future_list = [executor.submit(fetch_project, sess, project_id) for project_id in project_ids]
+                try:
+                    for future in as_completed(future_list):
+                        yield future.result()
+                finally:
+                    # Caller stopped early, don't download projects nobody will read
+                    for future in future_list:
+                        future.cancel()
+
+    @staticmethod
+    def iter_points(username: str, password: str, console: Console, project_id: int,
+                    url: str = f"https://mapitfast.agterra.com/api/Points", sess: requests.Session = None):
+        """
+        Stream the points of a project straight from the server, one Points object at a time
+        Skips the cache, the whole point is to not hold the project in memory
+        """
+        with session_scope(username=username, password=password, sess=sess) as sess:
+            yield from AgTerraAPI.iter_points(sess=sess, console=console, projectID=project_id, url=url)
+
     @staticmethod
     def load_points_cache_pickles(username: str, password: str, console: Console, cache_path: Path, project_id: int,
-                                  show_off_mode: bool = True, url: str = f"https://mapitfast.agterra.com/api/Projects",
-                                  use_pickle_cache: bool = True):
+                                  show_off_mode: bool = False, url: str = f"https://mapitfast.agterra.com/api/Projects",
+                                  use_pickle_cache: bool = True, headless: bool = False, progress_callback=None,
+                                  sess: requests.Session = None):
         """
         Wrapper for get_points with caching
+        This runs once per project, so unlike the project list there's no show_off_mode delay here
         """
-        with requests.Session() as sess:
-            sess.auth = (username, password)
-            # console.log(f"[bold]Requesting Object List From Server")
+        reporter = ProgressReporter(console=console, headless=headless, progress_callback=progress_callback)
+        with session_scope(username=username, password=password, sess=sess) as sess:
+            reporter.update("requesting", project_id=project_id)
             obj_list = AgTerraAPI.get_points(sess=sess, console=console, url=url, projectID=project_id)
-            if show_off_mode:
-                sleep(0.9)
             if use_pickle_cache:
+                reporter.update("writing_cache", project_id=project_id)
                 with open(cache_path, 'wb') as f:
-                    # console.log(f"[bold][green]Writing objects to local cache")
-                    if show_off_mode:
-                        sleep(1.2)
                     pickle.dump(obj_list, f)
         return obj_list
 
     @staticmethod
-    def load_project_cache_pickles(username: str, password: str, console: Console, cache_path: Path, show_off_mode: bool = True,
-                                   url: str = f"https://mapitfast.agterra.com/api/Projects", use_pickle_cache: bool = True):
+    def load_project_cache_pickles(username: str, password: str, console: Console, cache_path: Path, show_off_mode: bool = False,
+                                   url: str = f"https://mapitfast.agterra.com/api/Projects", use_pickle_cache: bool = True,
+                                   headless: bool = False, progress_callback=None, sess: requests.Session = None):
         """
         Wrapper for get_projects with caching
+        show_off_mode slows the spinner down for demos, it's ignored in headless mode
         """
-        with requests.Session() as sess:
-            sess.auth = (username, password)
+        show_off_mode = show_off_mode and not headless
+        with session_scope(username=username, password=password, sess=sess) as sess:
 
-            with Status("[magenta]Connecting", console=console, spinner='arrow3') as status:
+            with ProgressReporter(console=console, headless=headless, progress_callback=progress_callback,
+                                  message="[magenta]Connecting") as reporter:
                 if show_off_mode:
                     sleep(0.7)
-                status.update(f"[bold]Requesting Object List From Server")
-                obj_list = AgTerraAPI.get_projects(sess=sess, console=status.console, url=url)
+                reporter.update("requesting", f"[bold]Requesting Object List From Server")
+                obj_list = AgTerraAPI.get_projects(sess=sess, console=console, url=url)
                 if show_off_mode:
                     sleep(0.9)
                 if use_pickle_cache:
                     with open(cache_path, 'wb') as f:
-                        status.update(f"[bold][green]Writing objects to local cache")
+                        reporter.update("writing_cache", f"[bold][green]Writing objects to local cache")
                         if show_off_mode:
                             sleep(1.2)
                         pickle.dump(obj_list, f)
         return obj_list
 
     @staticmethod
-    def get_projects(username: str, password: str, console: Console, cache_path: Path, show_off_mode: bool = True,
+    def get_projects(username: str, password: str, console: Console, cache_path: Path, show_off_mode: bool = False,
                         url: str = f"https://mapitfast.agterra.com/api/Projects", use_pickle_cache: bool = True,
-                     refresh_cache: bool = False):
+                     refresh_cache: bool = False, cache_backend: CacheBackend = None, cache_ttl: float = None,
+                     max_cache_age: float = DEFAULT_MAX_AGE_DICT.get("projects"), headless: bool = False,
+                     progress_callback=None, sess: requests.Session = None):
         """
         Wrapper to figure out caching or if projects needs to be gotten from the server
+        If cache_backend is given it's used instead of the pickle file at cache_path, if both are None the projects
+        always come from the server
+        A pickle older than max_cache_age seconds is treated as a miss, None serves a pickle of any age
+        headless skips spinners, logging and show_off_mode delays, progress_callback(stage, detail_dict) is called
+        either way
         """
+        reporter = ProgressReporter(console=console, headless=headless, progress_callback=progress_callback)
+        if cache_backend is not None:
+            proj_obj_list = None if refresh_cache else cache_backend.get_projects()
+            if proj_obj_list is None:
+                reporter.update("requesting")
+                with session_scope(username=username, password=password, sess=sess) as sess:
+                    proj_obj_list = AgTerraAPI.get_projects(sess=sess, console=console, url=url)
+                reporter.update("writing_cache")
+                cache_backend.put_projects(projects=proj_obj_list, ttl=cache_ttl)
+            else:
+                reporter.update("reading_cache")
+            reporter.update("done", count=len(proj_obj_list))
+            return proj_obj_list
+
+        if cache_path is None:
+            reporter.update("requesting")
+            with session_scope(username=username, password=password, sess=sess) as sess:
+                proj_obj_list = AgTerraAPI.get_projects(sess=sess, console=console, url=url)
+            reporter.update("done", count=len(proj_obj_list))
+            return proj_obj_list
+
         if refresh_cache:
             proj_obj_list = AgTerraWrapper.load_project_cache_pickles(username=username, password=password, console=console,
                                                                       cache_path=cache_path,
                                                                       show_off_mode=show_off_mode,
-                                                                      use_pickle_cache=use_pickle_cache)
+                                                                      use_pickle_cache=use_pickle_cache, url=url,
+                                                                      headless=headless,
+                                                                      progress_callback=progress_callback, sess=sess)
 
-        elif cache_path.exists():
+        elif is_fresh(cache_path, max_age=max_cache_age):
             # Cache exists, pulling from the cache
-            with Status("[bold][blue]Reading local cache", console=console, spinner='arrow3') as status:
-                if show_off_mode:
+            with ProgressReporter(console=console, headless=headless, progress_callback=progress_callback,
+                                  message="[bold][blue]Reading local cache") as status:
+                status.update("reading_cache")
+                if show_off_mode and not headless:
                     sleep(1.2)
                 with open(cache_path, 'rb') as f:
                     proj_obj_list = pickle.load(f)
+            mark_used(cache_path)
 
         else:
             # Cache doesn't exist, user didn't force a refresh
-            console.log(f"[bold][green]Warming up the cache")
+            reporter.log(f"[bold][green]Warming up the cache")
             proj_obj_list = AgTerraWrapper.load_project_cache_pickles(username=username, password=password, console=console,
                                                                       cache_path=cache_path,
                                                                       show_off_mode=show_off_mode,
-                                                                      use_pickle_cache=use_pickle_cache)
+                                                                      use_pickle_cache=use_pickle_cache, url=url,
+                                                                      headless=headless,
+                                                                      progress_callback=progress_callback, sess=sess)
+        reporter.update("done", count=len(proj_obj_list))
         return proj_obj_list
 
     @staticmethod
-    def get_project_folders(username: str, password: str, console: Console, cache_path: Path, show_off_mode: bool = True,
+    def get_project_folders(username: str, password: str, console: Console, cache_path: Path, show_off_mode: bool = False,
                             url: str = f"https://mapitfast.agterra.com/api/ProjectFolders", use_pickle_cache: bool = True,
-                            refresh_cache: bool = False):
+                            refresh_cache: bool = False, cache_backend: CacheBackend = None, cache_ttl: float = None,
+                            headless: bool = False, progress_callback=None, sess: requests.Session = None):
         """
         Wrapper for getting the project folders and caching them
+        Only cached when a cache_backend is given
         """
+        reporter = ProgressReporter(console=console, headless=headless, progress_callback=progress_callback)
         proj_folder_obj_dict = dict()
         # if refresh_cache:
         #     proj_folder_obj_list = AgTerraWrapper.load_cache_pickles(username=username, password=password,
@@ -261,15 +495,26 @@ class AgTerraWrapper(object):
         #             proj_obj_list = pickle.load(f)
         # else:
 
-        # Cache doesn't exist, user didn't force a refresh
-        console.log(f"[bold][green]Warming up the cache")
-        with requests.Session() as sess:
-            sess.auth = (username, password)
-            proj_folder_obj_list = AgTerraAPI.get_project_folders(sess=sess)
+        proj_folder_obj_list = None
+        if cache_backend is not None and not refresh_cache:
+            proj_folder_obj_list = cache_backend.get_project_folders()
+
+        if proj_folder_obj_list is None:
+            # Cache doesn't exist, user didn't force a refresh
+            reporter.log(f"[bold][green]Warming up the cache")
+            reporter.update("requesting")
+            with session_scope(username=username, password=password, sess=sess) as sess:
+                proj_folder_obj_list = AgTerraAPI.get_project_folders(sess=sess)
+            if cache_backend is not None:
+                reporter.update("writing_cache")
+                cache_backend.put_project_folders(project_folders=proj_folder_obj_list, ttl=cache_ttl)
+        else:
+            reporter.update("reading_cache")
 
         # Make a dictionary of project folder IDs with ProjectFolder objects as value
         # {project_folder_id: project_folder_object}
         for proj_folder in proj_folder_obj_list:
             proj_folder_obj_dict.update({proj_folder.ProjectFolderId: proj_folder})
 
+        reporter.update("done", count=len(proj_folder_obj_dict))
         return proj_folder_obj_dict
\ No newline at end of file
@@ -0,0 +1,61 @@
+import os
+from pathlib import Path
+
+import click
+from rich.console import Console
+from rich.table import Table
+
+from MapItFastLib import Utils
+from MapItFastLib.SpatialQuery import SpatialIndex
+
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+
+
+@click.command("NearbyPins", context_settings=CONTEXT_SETTINGS,
+               help=f"Find the pins near a coordinate across every cached project")
+@click.option("--username", default=lambda: os.environ.get("AGTERRAUSER", ""))
+@click.option("--password", hide_input=True, default=lambda: os.environ.get("AGTERRAPASS", ""), show_default=False)
+@click.option("--cache-path", type=click.Path(exists=False, file_okay=False, dir_okay=True, writable=True,
+                                              readable=True, resolve_path=True), callback=Utils.validate_cache_folder,
+              default="/tmp/agterra/cache/")
+@click.option("--latitude", type=click.FLOAT, required=True)
+@click.option("--longitude", type=click.FLOAT, required=True)
+@click.option("--radius-m", type=click.FLOAT, default=None, help="Every pin within this many metres")
+@click.option("--nearest", "-k", type=click.INT, default=5, show_default=True,
+              help="How many of the closest pins to show when no radius is given")
+@click.option("--project-title", "project_title_list", multiple=True,
+              help="Only search these projects, can be given more than once")
+@click.pass_context
+def main(ctx, username, password, cache_path, latitude, longitude, radius_m, nearest, project_title_list):
+    """
+    Points come from the local points cache, run SyncPoints first to bring it up to date
+    """
+    console = Console()
+    project_pickle_path = Path(os.path.join(cache_path, "project_cache.pickle.py"))
+    proj_obj_list = Utils.AgTerraWrapper.get_projects(username=username, password=password, console=console,
+                                                      cache_path=project_pickle_path)
+    proj_obj_dict = {proj_obj.ProjectId: proj_obj for proj_obj in proj_obj_list}
+    project_ids = None
+    if project_title_list:
+        project_ids = [proj_obj.ProjectId for proj_obj in proj_obj_list if proj_obj.Title in project_title_list]
+
+    spatial_index = SpatialIndex.from_cache(cache_path=cache_path, project_ids=project_ids)
+    if radius_m is None:
+        frame, distance = spatial_index.k_nearest(latitude, longitude, k=nearest, return_distance=True)
+    else:
+        frame, distance = spatial_index.within_radius(latitude, longitude, radius_m, return_distance=True)
+
+    table = Table(title=f"Pins near {latitude}, {longitude}", show_lines=True)
+    table.add_column("Pin Name", justify="left", style="cyan", no_wrap=True)
+    table.add_column("Project Name", style="magenta", justify="center")
+    table.add_column("Distance (m)", justify="right", style="green")
+    table.add_column("Coordinates", justify="right", style="white")
+    for index in range(len(frame)):
+        proj_obj = proj_obj_dict.get(int(frame.project_id[index]))
+        table.add_row(frame.title[index], proj_obj.Title if proj_obj is not None else str(frame.project_id[index]),
+                      f"{distance[index]:.0f}", f"{frame.latitude[index]:.6f}, {frame.longitude[index]:.6f}")
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import os
+
+import click
+from rich.console import Console
+from rich.progress import Progress, BarColumn
+from rich.table import Table
+
+from MapItFastLib import Utils
+from MapItFastLib.Backup import BackupArchive
+from MapItFastLib.Client import AgTerraClient
+from MapItFastLib.Restore import PointRestorer
+
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+
+
+@click.command("RestorePoints", context_settings=CONTEXT_SETTINGS,
+               help=f"Put the points of a project back from a backup archive")
+@click.option("--username", default=lambda: os.environ.get("AGTERRAUSER", ""))
+@click.option("--password", hide_input=True, default=lambda: os.environ.get("AGTERRAPASS", ""), show_default=False)
+@click.option("--cache-path", type=click.Path(exists=False, file_okay=False, dir_okay=True, writable=True,
+                                              readable=True, resolve_path=True), callback=Utils.validate_cache_folder,
+              default="/tmp/agterra/cache/")
+@click.option("--backup-path", type=click.Path(exists=True, file_okay=False, dir_okay=True, resolve_path=True),
+              default="/tmp/agterra/backup/", show_default=True, help="Folder holding the archive and its manifest")
+@click.option("--project-id", type=click.INT, required=True, help="Project to restore from the backup")
+@click.option("--target-project-id", type=click.INT, default=None,
+              help="Project to restore into, the backed up project itself by default")
+@click.option("--run-id", default=None, help="Restore the project as of this backup run, the latest by default")
+@click.option("--tolerance-m", type=click.FLOAT, default=0.5, show_default=True,
+              help="How far a live pin with the same title can be from a backed up one and still count as it")
+@click.option("--include-changed", is_flag=True, default=False,
+              help="Also re-create points edited since the backup. The edited pin stays, the backed up one is added")
+@click.option("--dry-run", is_flag=True, default=False, help="Show what would be restored without uploading")
+@click.option("--max-in-flight", type=click.INT, default=8, show_default=True, help="Uploads to run at the same time")
+@click.option("--max-per-second", type=click.FLOAT, default=10.0, show_default=True,
+              help="Most uploads to start in any one second")
+def main(username, password, cache_path, backup_path, project_id, target_project_id, run_id, tolerance_m,
+         include_changed, dry_run, max_in_flight, max_per_second):
+    """
+    Restore a project
+    - Read the project's points from the backup
+    - Diff them against the live project by PointId, then by coordinates and title
+    - Upload only what's missing, concurrently and rate limited, so re-running never duplicates a pin
+    """
+    console = Console()
+    if target_project_id is None:
+        target_project_id = project_id
+
+    archive = BackupArchive(backup_path)
+    backup_point_list = archive.read_points(project_id, run_id=run_id)
+    if backup_point_list is None:
+        console.log(f"[red]Project {project_id} isn't in the backup at {backup_path}")
+        raise SystemExit(1)
+
+    with AgTerraClient(username=username, password=password, console=console, cache_path=cache_path,
+                       pool_maxsize=max_in_flight) as client:
+        live_point_list = client.get_points(target_project_id, refresh_cache=True)
+        restorer = PointRestorer(tolerance_m=tolerance_m)
+        restore_plan = restorer.plan(backup_point_list, live_point_list, project_id=target_project_id)
+
+        table = Table(title=f"Restore of Project {project_id} into {target_project_id}")
+        table.add_column("Backed Up", justify="center", style="white")
+        table.add_column("Still There", justify="center", style="green")
+        table.add_column("Missing", justify="center", style="red")
+        table.add_column("Changed", justify="center", style="yellow")
+        table.add_row(str(len(backup_point_list)), str(len(restore_plan.present)), str(len(restore_plan.missing)),
+                      str(len(restore_plan.changed)))
+        console.print(table)
+
+        upload_count = len(restore_plan.missing) + (len(restore_plan.changed) if include_changed else 0)
+        if dry_run:
+            for point in restore_plan.missing:
+                console.log(f"Would restore [cyan]{point.Title}[/cyan] at {point.Latitude}, {point.Longitude}")
+            console.log(f"Dry run, {upload_count} points would be uploaded")
+            return
+        if upload_count == 0:
+            console.log(f"[green]Nothing to restore")
+            return
+
+        with Progress("[progress.description]{task.description}", BarColumn(), "{task.completed} of {task.total}",
+                      console=console, transient=True) as progress:
+            task = progress.add_task(f"[green]Restoring Points", total=upload_count)
+            result_list = restorer.restore(client.sess, console=console, restore_plan=restore_plan,
+                                           include_changed=include_changed, max_in_flight=max_in_flight,
+                                           max_per_second=max_per_second,
+                                           progress_callback=lambda result: progress.update(task, advance=1))
+
+    failed_list = [result for result in result_list if not result.ok]
+    console.log(f"{len(result_list) - len(failed_list)} of {len(result_list)} points restored")
+    for result in failed_list:
+        console.log(f"[red]{result.point_dict.get('Title')} failed with status {result.status_code}: {result.error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -22,9 +22,11 @@ from rich.progress import Progress, SpinnerColumn, BarColumn, TextColumn
 from rich.status import Status
 from rich.table import Table
 
+from MapItFastLib.CacheManager import DEFAULT_MAX_AGE_DICT, is_fresh
 from MapItFastLib.Projects import Project
-from MapItFastLib.Points import Points
+from MapItFastLib.Points import Points, parse_item_time
 from MapItFastLib.Pictures import Picture
+from MapItFastLib.SearchIndex import PointSearchIndex
 from MapItFastLib import Utils
 
 
@@ -44,10 +46,14 @@ CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 @click.option("--all-years", "-a", type=click.BOOL, is_flag=True, default=False,
               help="Search of all years, not just the current year")
 @click.option("--search-term", "-s", help="Search term for pin in a project", prompt=True, type=click.STRING)
+@click.option("--limit", "-l", type=click.INT, default=None, help="Most results to show, all of them by default")
+@click.option("--no-fuzzy", type=click.BOOL, is_flag=True, default=False, help="Don't match misspelled words")
 @click.pass_context
-def main(ctx, refresh_cache, password, username, cache_path, picture_path, all_years, search_term):
+def main(ctx, refresh_cache, password, username, cache_path, picture_path, all_years, search_term, limit, no_fuzzy):
     """
     Application to search all points in every project
+    Titles and descriptions are matched through a search index kept next to the points cache, only projects whose
+    cache changed since the last search get re-indexed
     """
     # Create the console
     console = Console()
@@ -57,6 +63,7 @@ def main(ctx, refresh_cache, password, username, cache_path, picture_path, all_y
     picture_pickle_path = Path(os.path.join(picture_path, "picture_cache.pickle.py"))
     point_pickle_path = Path(os.path.join(cache_path, "")) # point_cache.pickle.py
     project_folder_pickle_path = Path(os.path.join(cache_path, "project_folder_cache.pickle.py"))
+    search_index_path = Path(os.path.join(cache_path, "search_index.pickle"))
     use_cache = True
     project_id_search_list = list()
     proj_obj_dict = dict()
@@ -76,6 +83,7 @@ def main(ctx, refresh_cache, password, username, cache_path, picture_path, all_y
     table = Table(title="Pins in Projects", show_lines=True)
     table.add_column("Pin Name", justify="left", style="cyan", no_wrap=True)
     table.add_column("Project Name", style="magenta", justify="center")
+    table.add_column("Description", style="white", justify="left")
     table.add_column("Last Updated Time", justify="right", style="green")
 
     proj_obj_list = Utils.AgTerraWrapper.get_projects(username=username, password=password, console=console,
@@ -91,32 +99,46 @@ def main(ctx, refresh_cache, password, username, cache_path, picture_path, all_y
             project_id_search_list.append(proj_obj.ProjectId)
         elif all_years:
             project_id_search_list.append(proj_obj.ProjectId)
+    # Only download projects without a fresh pickle yet (or all of them when asked to refresh)
+    points_max_age = DEFAULT_MAX_AGE_DICT.get("points")
+    fetch_id_list = [project_id for project_id in project_id_search_list
+                     if refresh_cache or not is_fresh(Utils.AgTerraWrapper.points_cache_path(
+                         cache_path=point_pickle_path, project_id=project_id), max_age=points_max_age)]
     with Progress("[progress.description]{task.description}", BarColumn(), "{task.completed} of {task.total}",
                   console=console, transient=True) as progress:
-        overall_task = progress.add_task(f"[green]Project Points Loaded", total=len(project_id_search_list))
-
-        for proj_id in project_id_search_list:
+        overall_task = progress.add_task(f"[green]Project Points Loaded", total=len(fetch_id_list))
+        for proj_id, proj_points in Utils.AgTerraWrapper.get_points_many(username=username, password=password,
+                                                                         console=progress.console,
+                                                                         project_ids=fetch_id_list,
+                                                                         cache_path=point_pickle_path,
+                                                                         refresh_cache=refresh_cache):
             progress.update(overall_task, advance=1)
-            proj_points = Utils.AgTerraWrapper.get_points(username=username, password=password, console=progress.console,
-                                                          cache_path=point_pickle_path, show_off_mode=show_off_mode,
-                                                          project_id=proj_id, refresh_cache=refresh_cache)
-
-            for point in proj_points:
-                try:
-                    if point.Title is not None and search_term in point.Title:
-                        proj_obj = proj_obj_dict.get(point.ProjectId)
-                        if point.ItemTime.date() == datetime.today().date():
-                            table.add_row(point.Title, proj_obj.Title,
-                                          f"Today at {point.ItemTime.time().strftime('%H:%M:%S')}")
-                        else:
-                            table.add_row(point.Title, proj_obj.Title,
-                                          point.ItemTime.strftime("%m/%d/%Y, %H:%M:%S"))
-                except AttributeError:
-                    console.log(f"Project ID that failed: {point.ProjectId}")
-                    console.log(vars(point))
-                    sys.exit(1)
+
+    with Status("[bold][blue]Updating search index", console=console, spinner='arrow3'):
+        search_index = PointSearchIndex.load(search_index_path)
+        updated_id_list = search_index.sync_cache_folder(cache_path=point_pickle_path,
+                                                         project_ids=project_id_search_list)
+        if updated_id_list:
+            search_index.save(search_index_path)
+    console.log(f"Re-indexed {len(updated_id_list)} of {len(project_id_search_list)} projects")
+
+    today = datetime.today().date()
+    hit_list = search_index.search(search_term, project_ids=project_id_search_list, limit=None, fuzzy=not no_fuzzy)
+    for hit in hit_list[:limit]:
+        proj_obj = proj_obj_dict.get(hit.project_id)
+        item_time = parse_item_time(hit.item_time)
+        if item_time is None:
+            time_text = ""
+        elif item_time.date() == today:
+            time_text = f"Today at {item_time.time().strftime('%H:%M:%S')}"
+        else:
+            time_text = item_time.strftime("%m/%d/%Y, %H:%M:%S")
+        table.add_row(hit.title, proj_obj.Title if proj_obj is not None else str(hit.project_id),
+                      hit.description or "", time_text)
 
     console.log(table)
+    if limit is not None and len(hit_list) > limit:
+        console.log(f"{len(hit_list) - limit} more results not shown, raise --limit to see them")
 
 
 
@@ -1,6 +1,7 @@
 from csv import DictReader
 from datetime import datetime
 import logging
+import os
 from pprint import pprint
 import sys
 from time import sleep
@@ -13,7 +14,10 @@ from rich.prompt import Confirm, Prompt
 from rich.progress import Progress
 from rich.status import Status
 
-from MapItFastLib.Projects import Project
+from MapItFastLib.CsvImport import DEFAULT_DESTINATION, ColumnMapping, ImportPipeline
+from MapItFastLib import Utils
+from MapItFastLib.ProjectDirectory import ProjectDirectory
+from MapItFastLib.Retry import DEFAULT_TIMEOUT
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 
@@ -23,8 +27,11 @@ CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 @click.option("--project-name", type=click.STRING, required=True)
 @click.option("--username", default=lambda: os.environ.get("AGTERRAUSER", ""))
 @click.option("--password", hide_input=True, default=lambda: os.environ.get("AGTERRAPASS", ""), show_default=False)
+@click.option("--cache-path", type=click.Path(exists=False, file_okay=False, dir_okay=True, writable=True,
+                                              readable=True, resolve_path=True), callback=Utils.validate_cache_folder,
+              default="/tmp/agterra/cache/")
 @click.pass_context
-def main(ctx, csv_file, project_name, username, password):
+def main(ctx, csv_file, project_name, username, password, cache_path):
     """
     First pass as the API. This app is a basic bitch version. Will upgrade to a full class and library later on
     - Input:
@@ -38,11 +45,6 @@ def main(ctx, csv_file, project_name, username, password):
     - - LAT, LONG, NAME
     - Append points to project, one at a time
     """
-    # List of projects
-    proj_obj_list = list()
-    # If the given project is found, set to True
-    proj_title_found = False
-
     # Create the console
     console = Console()
 
@@ -64,70 +66,42 @@ def main(ctx, csv_file, project_name, username, password):
     with requests.Session() as sess:
         sess.auth = (username, password)
         with Status("[magenta]Connecting", console=console, spinner='arrow3') as status:
-            status.update(f"Requesting Project List From Server")
-            if show_off_mode:
-                sleep(0.7)
-
-            projects_list = get_projects(sess=sess)
-
-            # Turn each project from JSON into an object we can actually use
-            for raw_proj_dict in projects_list:
-                proj_obj_list.append(Project(raw_data=raw_proj_dict))
-
-            # Look for project by title
-            for proj in proj_obj_list:
-                if proj.Title == project_name:
-                    # Project found, we can move on
-                    # Save the object for later
-                    project_by_name = proj
-                    console.log(f"Project {project_name} has been found")
-                    proj_title_found = True
+            status.update(f"Loading Project List")
+            project_directory = ProjectDirectory.load(username=username, password=password, console=console,
+                                                      cache_path=cache_path, sess=sess)
 
+            # Look for project by title, exactly first, then ignoring case
+            project_list = project_directory.find(project_name) or project_directory.find(project_name,
+                                                                                          ignore_case=True)
             # If project not found, print error and exit
-            if not proj_title_found:
-                console.log(f"Project '{project_name}' wasn't found as an option")
-                for proj in proj_obj_list:
-                    console.log(f"{proj.Title}")
+            if len(project_list) != 1:
+                console.log(f"Project '{project_name}' wasn't found as an option" if not project_list else
+                            f"{len(project_list)} projects are called '{project_name}'")
+                # The ambiguous ones, or the ones starting with the same word, or every project
+                suggestion_list = project_list or project_directory.find_prefix(project_name.split(" ")[0])
+                for proj in suggestion_list or project_directory:
+                    console.log(f"{proj.Title} ({proj.ProjectId})")
                 sys.exit(1)
+            project_by_name = project_list[0]
+            console.log(f"Project {project_name} has been found")
 
             status.update(f"Opening CSV File")
             if show_off_mode:
                 sleep(2)
-            with open(csv_file, 'r') as f:
-                csv_dict = DictReader(f)
-
-                for row_dict in csv_dict:
-                    if "Title" in row_dict:
-                        # If the title column exists, append it to the request
-                        # console.log(f"Found Title!")
-                        title = row_dict.get("Title")
-                    else:
-                        title = ""
-                    if "Latitude" in row_dict:
-                        # Make sure Latitude exists before we try to call against it
-                        lat = row_dict.get("Latitude")
-                    else:
-                        console.log(f"Latitude doesn't exist in the CSV, check the file and try again")
-
-                    if "Longitude" in row_dict:
-                        # Make sure Latitude exists before we try to call against it
-                        long = row_dict.get("Longitude")
-                    else:
-                        console.log(f"Longitude doesn't exist in the CSV, check the file and try again")
-
-                    if "Description" in row_dict:
-                        description = row_dict.get("Description")
-                    else:
-                        description = ""
-
-                    # console.log(f"Lat: {lat}\nLong: {long}")
-
-                    # ToDo: Check if the project already has the points in question
-                    status.update(f"Adding Lat: {lat} and Long: {long}")
-                    post_coordinates(sess=sess, console=console, status=status, lat=lat, long=long,
-                                     projectID=project_by_name.ProjectId, title=title, description=description)
-                    if show_off_mode:
-                        sleep(1)
+            # Title and Description are optional, Latitude and Longitude have to be there
+            pipeline = ImportPipeline(mapping=ColumnMapping())
+            try:
+                report = pipeline.upload(csv_file, destinations={DEFAULT_DESTINATION: project_by_name.ProjectId},
+                                         sess=sess, console=console,
+                                         progress_callback=lambda result: status.update(
+                                             f"Adding Lat: {result.point_dict.get('Latitude')} and Long: "
+                                             f"{result.point_dict.get('Longitude')}"))
+            except ValueError as e:
+                console.log(f"{e}, check the file and try again")
+                sys.exit(1)
+            for row_error in report.errors:
+                console.log(f"[red]Line {row_error.line_number}: {row_error.message}")
+            console.log(f"{report.stats(DEFAULT_DESTINATION).uploaded} points added")
 
 
 
@@ -148,7 +122,7 @@ def post_coordinates(sess: requests.Session, console: Console, status: Status, l
                       "Longitude": long,
                       "Elevation": elevation}
 
-    resp = sess.post(base_url, data=post_data_dict)
+    resp = sess.post(base_url, data=post_data_dict, timeout=DEFAULT_TIMEOUT)
 
     if resp.status_code == 201:
         # console.log(f"Added coordinates to project")
@@ -179,25 +153,6 @@ def get_csv_coordinates(path: str):
         #     logging.warning(f"CSV Warning! Title not found! ")
     return csv_dict
 
-def get_projects(sess: requests.Session, url: str = f"https://mapitfast.agterra.com/api/Projects"):
-    """
-    Helper function to get projects list
-    """
-    # Get the folder list
-    raw_resp = get_url(sess=sess, url=url)
-
-    json_data = raw_resp.json()
-    return json_data
-
-
-def get_url(sess: requests.Session, url: str):
-    """
-    Basic function to make getting various URLs easier
-    """
-    return sess.get(url=url)
-
-
-
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,60 @@
+import os
+from pathlib import Path
+
+import click
+from rich.console import Console
+from rich.progress import Progress, BarColumn
+from rich.table import Table
+
+from MapItFastLib import Utils
+from MapItFastLib.Sync import DeltaSync
+
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+
+
+@click.command("SyncPoints", context_settings=CONTEXT_SETTINGS,
+               help=f"Refresh the points cache, only downloading projects that changed since the last sync")
+@click.option("--username", default=lambda: os.environ.get("AGTERRAUSER", ""))
+@click.option("--password", hide_input=True, default=lambda: os.environ.get("AGTERRAPASS", ""), show_default=False)
+@click.option("--cache-path", type=click.Path(exists=False, file_okay=False, dir_okay=True, writable=True,
+                                              readable=True, resolve_path=True), callback=Utils.validate_cache_folder,
+              default="/tmp/agterra/cache/")
+@click.option("--max-workers", type=click.INT, default=8, show_default=True,
+              help="Projects to download at the same time")
+@click.pass_context
+def main(ctx, username, password, cache_path, max_workers):
+    """
+    Nightly cache refresh
+    - Get a fresh project list, LastChildUpdate is only useful if it's current
+    - Download points only for projects whose LastChildUpdate moved
+    """
+    console = Console()
+    project_pickle_path = Path(os.path.join(cache_path, "project_cache.pickle.py"))
+
+    proj_obj_list = Utils.AgTerraWrapper.get_projects(username=username, password=password, console=console,
+                                                      cache_path=project_pickle_path, show_off_mode=False,
+                                                      refresh_cache=True)
+
+    delta_sync = DeltaSync(username=username, password=password, console=console, cache_path=cache_path,
+                           max_workers=max_workers)
+    changed_proj_list = delta_sync.changed_projects(proj_obj_list)
+    console.log(f"{len(changed_proj_list)} of {len(proj_obj_list)} projects changed since the last sync")
+
+    with Progress("[progress.description]{task.description}", BarColumn(), "{task.completed} of {task.total}",
+                  console=console, transient=True) as progress:
+        task = progress.add_task(f"[green]Syncing Changed Projects", total=len(changed_proj_list))
+        report = delta_sync.sync(proj_obj_list, progress_callback=lambda project_id: progress.update(task, advance=1))
+
+    table = Table(title="Sync Results")
+    table.add_column("Projects Refreshed", justify="center", style="cyan")
+    table.add_column("Projects Skipped", justify="center", style="white")
+    table.add_column("Points Added", justify="center", style="green")
+    table.add_column("Points Updated", justify="center", style="yellow")
+    table.add_column("Points Removed", justify="center", style="red")
+    table.add_row(str(len(report.refreshed_project_ids)), str(len(report.skipped_project_ids)),
+                  str(report.points_added), str(report.points_updated), str(report.points_removed))
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
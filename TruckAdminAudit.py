@@ -16,6 +16,7 @@ from tabulate import tabulate
 
 from MapItFastLib.Projects import Project
 from MapItFastLib.Points import Points
+from MapItFastLib.Retry import DEFAULT_TIMEOUT
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 
@@ -122,7 +123,7 @@ def get_points(sess: requests.Session, console: Console, projectID: int, include
     Get all exisiting points in a project
     """
     base_url = f"https://mapitfast.agterra.com/api/Points"
-    resp = sess.get(base_url, params={"projectId": projectID, "includePoints": includePoints})
+    resp = sess.get(base_url, params={"projectId": projectID, "includePoints": includePoints}, timeout=DEFAULT_TIMEOUT)
 
     points_obj_list = list()
     for raw_resp in resp.json():
@@ -147,7 +148,7 @@ def post_coordinates(sess: requests.Session, console: Console, status: Status, l
                       "Longitude": long,
                       "Elevation": elevation}
 
-    resp = sess.post(base_url, data=post_data_dict)
+    resp = sess.post(base_url, data=post_data_dict, timeout=DEFAULT_TIMEOUT)
 
     if resp.status_code == 201:
         # console.log(f"Added coordinates to project")
@@ -204,7 +205,7 @@ def get_url(sess: requests.Session, url: str):
     """
     Basic function to make getting various URLs easier
     """
-    return sess.get(url=url)
+    return sess.get(url=url, timeout=DEFAULT_TIMEOUT)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,54 @@
+import unittest
+from unittest import mock
+
+from MapItFastLib.Cache import CacheBackend
+from MapItFastLib.Client import AgTerraClient
+from MapItFastLib.Points import Points
+from MapItFastLib.Projects import Project
+from MapItFastLib.Utils import AgTerraAPI
+
+
+class AgTerraClientDefaultsTest(unittest.TestCase):
+    """
+    A client built with nothing but credentials has no cache folder, every call goes to the server
+    """
+    def setUp(self):
+        self.client = AgTerraClient("u", "p")
+        self.addCleanup(self.client.close)
+
+    def test_get_projects_without_cache_path(self):
+        project_list = [Project(raw_data={"ProjectId": 1, "Title": "Wells"})]
+        with mock.patch.object(AgTerraAPI, "get_projects", return_value=project_list) as get_projects:
+            self.assertEqual(self.client.get_projects(), project_list)
+            self.assertEqual(self.client.get_projects(), project_list)
+        self.assertEqual(get_projects.call_count, 2)
+        self.assertIs(get_projects.call_args.kwargs.get("sess"), self.client.sess)
+
+    def test_get_points_without_cache_path(self):
+        point_list = [Points(raw_data={"PointId": 7, "ProjectId": 1, "Title": "Well 4"})]
+        with mock.patch.object(AgTerraAPI, "get_points", return_value=point_list) as get_points:
+            self.assertEqual(self.client.get_points(1), point_list)
+        get_points.assert_called_once()
+        self.assertEqual(get_points.call_args.kwargs.get("projectID"), 1)
+        self.assertIs(get_points.call_args.kwargs.get("sess"), self.client.sess)
+
+
+class AgTerraClientCacheBackendTest(unittest.TestCase):
+    """
+    A client with a cache_backend only hands it to the wrapper calls that cache
+    """
+    def setUp(self):
+        self.client = AgTerraClient("u", "p", cache_backend=mock.Mock(spec=CacheBackend))
+        self.addCleanup(self.client.close)
+
+    def test_iter_points_with_cache_backend(self):
+        point_list = [Points(raw_data={"PointId": 7, "ProjectId": 1, "Title": "Well 4"})]
+        with mock.patch.object(AgTerraAPI, "iter_points", return_value=iter(point_list)) as iter_points:
+            self.assertEqual(list(self.client.iter_points(1)), point_list)
+        iter_points.assert_called_once()
+        self.assertEqual(iter_points.call_args.kwargs.get("projectID"), 1)
+        self.assertIs(iter_points.call_args.kwargs.get("sess"), self.client.sess)
+
+
+if __name__ == "__main__":
+    unittest.main()